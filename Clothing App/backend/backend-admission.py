@@ -0,0 +1,238 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.core.metrics import counter, histogram
+from app.core.profiling import follow_thread
+
+ADMISSION_WAIT_SECONDS = histogram("admission_wait_seconds", "Time spent waiting for a worker slot", ["pool"])
+ADMISSION_REJECTED = counter("admission_rejected", "Requests rejected or timed out waiting for a slot", ["pool"])
+
+# Lanes, lower is served first
+PRIORITY_AUTHENTICATED = 0
+PRIORITY_ANONYMOUS = 1
+
+class _Waiter:
+    __slots__ = ("priority", "sequence", "future")
+
+    def __init__(self, priority: int, sequence: int, future: "asyncio.Future"):
+        self.priority = priority
+        self.sequence = sequence
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+class AdmissionController:
+    """
+    Bounded work queue in front of CPU-bound work such as feature extraction.
+
+    At most `max_concurrency` jobs run at once, on a dedicated thread pool.
+    Up to `max_queue` more wait for a slot, served by lane and then in
+    arrival order. Anything beyond that is rejected straight away with a
+    Retry-After estimate, so an overloaded server sheds load instead of
+    slowing down every request. Anonymous requests may only take up
+    `max_anonymous_queue` of the queue, and an authenticated request that
+    finds the queue full takes the place of the newest anonymous one.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 2,
+        max_queue: int = 32,
+        max_anonymous_queue: Optional[int] = None,
+        deadline: float = 10.0,
+        name: str = "admission",
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_anonymous_queue = max_queue if max_anonymous_queue is None else max_anonymous_queue
+        self.deadline = deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self._active = 0
+        self._waiters: List[_Waiter] = []
+        self._queued = [0, 0]
+        self._sequence = itertools.count()
+        # Moving average of job run time, for Retry-After estimates
+        self._service_time = 0.5
+        self.admitted = 0
+        self.rejected = 0
+        self.preempted = 0
+        self.timed_out = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._queued)
+
+    def retry_after(self) -> int:
+        """Estimate how many seconds it takes to work through the queue"""
+        backlog = self.queue_depth + self._active
+        return max(1, math.ceil(backlog * self._service_time / self.max_concurrency))
+
+    def _reject(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        priority: int = PRIORITY_ANONYMOUS,
+        deadline: Optional[float] = None,
+    ) -> Any:
+        """
+        Run a blocking function once a slot is free.
+
+        Args:
+            func: Function to run on the worker pool
+            *args: Arguments for the function
+            priority: PRIORITY_AUTHENTICATED or PRIORITY_ANONYMOUS
+            deadline: Max seconds to wait for a slot (defaults to the
+                controller deadline)
+
+        Returns:
+            The function's result
+
+        Raises:
+            HTTPException: 429 when the anonymous lane is full, 503 when
+                the queue is full or the deadline passes before a slot
+                frees up. Both carry a Retry-After header.
+        """
+        start = time.monotonic()
+        try:
+            await self._acquire(priority, self.deadline if deadline is None else deadline)
+        except HTTPException:
+            ADMISSION_REJECTED.inc(pool=self.name)
+            raise
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start, pool=self.name)
+        start = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, follow_thread(func), *args)
+        finally:
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.monotonic() - start)
+            self._release()
+
+    async def _acquire(self, priority: int, deadline: float) -> None:
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        if priority == PRIORITY_ANONYMOUS and self._queued[PRIORITY_ANONYMOUS] >= self.max_anonymous_queue:
+            self.rejected += 1
+            raise self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests, please retry later")
+        if self.queue_depth >= self.max_queue and not self._preempt(priority):
+            self.rejected += 1
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Server is busy, please retry later")
+
+        waiter = _Waiter(priority, next(self._sequence), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, waiter)
+        self._queued[priority] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=deadline)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.timed_out += 1
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Request timed out waiting for capacity")
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        self.admitted += 1
+
+    def _preempt(self, priority: int) -> bool:
+        """Drop the newest anonymous waiter to make room for an authenticated request"""
+        if priority != PRIORITY_AUTHENTICATED:
+            return False
+        anonymous = [w for w in self._waiters if w.priority == PRIORITY_ANONYMOUS and not w.future.done()]
+        if not anonymous:
+            return False
+        victim = max(anonymous, key=lambda w: w.sequence)
+        self._remove(victim)
+        victim.future.set_exception(
+            self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Server is busy, please retry later")
+        )
+        self.preempted += 1
+        return True
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Clean up after a waiter that gave up"""
+        if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+            # A slot was handed over just as the wait ended, pass it on
+            self._release()
+            return
+        waiter.future.cancel()
+        self._remove(waiter)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self._queued[waiter.priority] -= 1
+
+    def _release(self) -> None:
+        """Hand the slot to the next waiter, or free it"""
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)
+            self._queued[waiter.priority] -= 1
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue statistics for monitoring"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queued": self.queue_depth,
+            "queued_authenticated": self._queued[PRIORITY_AUTHENTICATED],
+            "queued_anonymous": self._queued[PRIORITY_ANONYMOUS],
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "preempted": self.preempted,
+            "timed_out": self.timed_out,
+            "avg_service_s": self._service_time,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+# Create a singleton instance
+_admission_controller = None
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Get or create the admission controller for feature extraction.
+
+    Returns:
+        AdmissionController instance
+    """
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController(
+            max_concurrency=settings.EXTRACTION_CONCURRENCY,
+            max_queue=settings.EXTRACTION_QUEUE_SIZE,
+            max_anonymous_queue=settings.EXTRACTION_ANONYMOUS_QUEUE_SIZE,
+            deadline=settings.EXTRACTION_DEADLINE,
+            name="extraction",
+        )
+    return _admission_controller
+
+def request_priority(authenticated: bool) -> int:
+    """Get the lane for a request"""
+    if authenticated and settings.EXTRACTION_PRIORITY_AUTHENTICATED:
+        return PRIORITY_AUTHENTICATED
+    return PRIORITY_ANONYMOUS
@@ -3,16 +3,17 @@ from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.security import (
     create_access_token, 
-    get_password_hash, 
+    hash_password, 
     authenticate_user,
     get_current_user
 )
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User
 from pydantic import BaseModel, EmailStr
 
@@ -34,13 +35,13 @@ class UserResponse(BaseModel):
         orm_mode = True
 
 @router.post("/auth/login", response_model=Token)
-def login_access_token(
-    db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
+async def login_access_token(
+    db: AsyncSession = Depends(get_async_db), form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,16 +56,17 @@ def login_access_token(
     }
 
 @router.post("/auth/register", response_model=UserResponse)
-def register_user(
+async def register_user(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user_in: UserCreate,
 ) -> Any:
     """
     Create new user
     """
     # Check if user with this email already exists
-    user = db.query(User).filter(User.email == user_in.email).first()
+    result = await db.execute(select(User).where(User.email == user_in.email))
+    user = result.scalars().first()
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -74,11 +76,11 @@ def register_user(
     # Create new user
     new_user = User(
         email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=await hash_password(user_in.password),
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return new_user
 
@@ -0,0 +1,159 @@
+"""
+Overload test for admission control in front of feature extraction.
+
+Sends one-shot search requests at a fixed arrival rate (open loop), above
+what the server can embed, with a mix of anonymous and logged-in users.
+In-process, the same load runs twice: with effectively unbounded admission
+(every request starts extraction immediately, the old behaviour) and with
+the configured queue. With admission control, p99 latency of the requests
+that are served should stay flat while the excess is rejected quickly with
+429/503 and Retry-After.
+
+Usage (from the backend directory):
+    python -m benchmarks.admission --rate 20 --duration 15
+    python -m benchmarks.admission --url http://localhost:8000/api --rate 20
+"""
+import argparse
+import asyncio
+import io
+import json
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+from PIL import Image
+
+def make_image(size: int) -> bytes:
+    pixels = np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    values = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+async def get_token(client: httpx.AsyncClient) -> str:
+    """Register a throwaway user and log in"""
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    password = uuid.uuid4().hex
+    response = await client.post("/auth/register", json={"email": email, "password": password})
+    response.raise_for_status()
+    response = await client.post("/auth/login", data={"username": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def run_load(client: httpx.AsyncClient, image: bytes, token: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Fire requests at a fixed rate and collect latency by lane and status"""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    retry_after: List[int] = []
+
+    async def fire(index: int, authenticated: bool) -> None:
+        lane = "authenticated" if authenticated else "anonymous"
+        headers = {"Authorization": f"Bearer {token}"} if authenticated else {}
+        files = {"file": (f"load_{index}.jpg", image, "image/jpeg")}
+        start = time.perf_counter()
+        try:
+            response = await client.post("/products/search", files=files, headers=headers)
+            outcome = str(response.status_code)
+            if "retry-after" in response.headers:
+                retry_after.append(int(response.headers["retry-after"]))
+        except httpx.HTTPError:
+            outcome = "error"
+        latencies[f"{lane}_{outcome}"].append(time.perf_counter() - start)
+
+    tasks = []
+    total = int(args.rate * args.duration)
+    start = time.perf_counter()
+    for index in range(total):
+        # Open loop: keep the arrival schedule regardless of response times
+        await asyncio.sleep(max(0.0, start + index / args.rate - time.perf_counter()))
+        tasks.append(asyncio.ensure_future(fire(index, index % 100 < args.authenticated * 100)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": total,
+        "elapsed_s": elapsed,
+        "served_per_s": sum(len(v) for k, v in latencies.items() if k.endswith("_200")) / elapsed,
+        "by_outcome": {key: summarize(values) for key, values in sorted(latencies.items())},
+        "max_retry_after_s": max(retry_after) if retry_after else None,
+    }
+
+async def run_scenario(name: str, limits: Optional[Dict[str, Any]], args: argparse.Namespace) -> Dict[str, Any]:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120.0)
+    else:
+        from app.core.config import settings
+        from app.db.database import init_db
+        from app.services import admission
+        from main import app
+        init_db()
+        for key, value in limits.items():
+            setattr(settings, key, value)
+        if admission._admission_controller is not None:
+            admission._admission_controller.shutdown()
+        admission._admission_controller = None
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://benchmark/api",
+            timeout=120.0,
+        )
+
+    image = make_image(args.image_size)
+    async with client:
+        token = await get_token(client)
+        # Warm up the model and index
+        for _ in range(2):
+            (await client.post("/products/search", files={"file": ("warmup.jpg", image, "image/jpeg")})).raise_for_status()
+        result = await run_load(client, image, token, args)
+    result = {"scenario": name, "limits": limits, **result}
+    print(json.dumps(result, indent=2))
+    return result
+
+async def main(args: argparse.Namespace) -> None:
+    if args.url:
+        scenarios = {"server": None}
+    else:
+        scenarios = {
+            "unbounded": {
+                "EXTRACTION_CONCURRENCY": args.concurrency,
+                "EXTRACTION_QUEUE_SIZE": 1_000_000,
+                "EXTRACTION_ANONYMOUS_QUEUE_SIZE": 1_000_000,
+                "EXTRACTION_DEADLINE": 3600.0,
+            },
+            "admission": {
+                "EXTRACTION_CONCURRENCY": args.concurrency,
+                "EXTRACTION_QUEUE_SIZE": args.queue_size,
+                "EXTRACTION_ANONYMOUS_QUEUE_SIZE": args.queue_size // 2,
+                "EXTRACTION_DEADLINE": args.deadline,
+            },
+        }
+    results = [await run_scenario(name, limits, args) for name, limits in scenarios.items()]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running API (default: in-process)")
+    parser.add_argument("--rate", type=float, default=20.0, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds of load")
+    parser.add_argument("--authenticated", type=float, default=0.3, help="Fraction of logged-in requests")
+    parser.add_argument("--concurrency", type=int, default=2, help="Extraction slots (in-process)")
+    parser.add_argument("--queue-size", type=int, default=8, help="Queue depth (in-process)")
+    parser.add_argument("--deadline", type=float, default=2.0, help="Queue deadline in seconds (in-process)")
+    parser.add_argument("--image-size", type=int, default=640)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,210 @@
+"""
+Recall and speed of approximate FAISS indexes against the exact flat index.
+
+Product vectors come from a saved product index (--index, e.g.
+app/ml/vector_index/product_index.faiss) or are generated: unit vectors
+scattered around random cluster centres, which resembles image embeddings
+far better than uniform noise. A held-out query set is searched with
+IndexFlatIP, the index VectorSearch uses, for the exact top k.
+
+Then each configuration is built from a FAISS factory string and swept
+over its search parameter:
+
+  HNSW{M}              efSearch
+  IVF{nlist},Flat      nprobe
+  IVF{nlist},PQ{m}     nprobe, with m-byte codes
+  PCA{dim},Flat        exact search on reduced dimensions
+
+Each row reports recall@k, QPS one query per call (as the API searches),
+QPS for the whole query batch, build time (train and add), and the size
+of the serialized index. The table is followed by the Pareto frontier
+of recall against QPS; --output also writes everything as JSON.
+
+Usage (from the backend directory):
+    python -m benchmarks.ann_eval --size 100000 --queries 1000 --k 10
+    python -m benchmarks.ann_eval --index app/ml/vector_index/product_index.faiss --hnsw-m 32 --ef-search 64 128
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def clustered_vectors(count: int, dim: int, clusters: int, spread: float, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors around `clusters` random centres"""
+    centres = normalize(rng.standard_normal((clusters, dim)))
+    assignment = rng.integers(0, clusters, count)
+    noise = rng.standard_normal((count, dim)) * spread / np.sqrt(dim)
+    return normalize(centres[assignment] + noise)
+
+def load_dataset(args: argparse.Namespace) -> Tuple[np.ndarray, np.ndarray]:
+    """Database and held-out query vectors"""
+    rng = np.random.default_rng(args.seed)
+    if args.index:
+        index = faiss.read_index(str(args.index))
+        # VectorSearch keys vectors by product ID, so read them by position from the
+        # wrapped index (which the ID map owns, so it stays referenced meanwhile)
+        stored = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        vectors = normalize(stored.reconstruct_n(0, stored.ntotal))
+        order = rng.permutation(len(vectors))
+        if len(vectors) <= args.queries:
+            raise SystemExit(f"The index has {len(vectors)} vectors, fewer than --queries {args.queries}")
+        return vectors[order[args.queries:]], vectors[order[:args.queries]]
+    vectors = clustered_vectors(args.size + args.queries, args.dim, args.clusters, args.spread, rng)
+    return vectors[args.queries:], vectors[:args.queries]
+
+def configurations(args: argparse.Namespace, size: int, dim: int) -> List[Tuple[str, Optional[str], List[int]]]:
+    """(factory string, search parameter, parameter values) to evaluate"""
+    configs: List[Tuple[str, Optional[str], List[int]]] = [("Flat", None, [0])]
+    for m in args.hnsw_m:
+        configs.append((f"HNSW{m}", "efSearch", args.ef_search))
+    for nlist in args.ivf_nlist:
+        if nlist > size // 39:
+            # FAISS needs ~39 training points per centroid
+            print(f"Skipping IVF{nlist}: too few vectors to train it")
+            continue
+        nprobes = [nprobe for nprobe in args.nprobe if nprobe <= nlist]
+        configs.append((f"IVF{nlist},Flat", "nprobe", nprobes))
+        for m in args.pq_m:
+            if dim % m == 0:
+                configs.append((f"IVF{nlist},PQ{m}", "nprobe", nprobes))
+    for reduced in args.pca_dims:
+        if reduced < dim:
+            configs.append((f"PCA{reduced},Flat", None, [0]))
+    return configs
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Fraction of the true top k that was found, averaged over queries"""
+    hits = sum(len(np.intersect1d(row, true_row)) for row, true_row in zip(found, truth))
+    return hits / truth.size
+
+def evaluate(
+    factory: str,
+    parameter: Optional[str],
+    values: List[int],
+    database: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    args: argparse.Namespace,
+) -> List[Dict[str, Any]]:
+    index = faiss.index_factory(database.shape[1], factory, faiss.METRIC_INNER_PRODUCT)
+    start = time.perf_counter()
+    if not index.is_trained:
+        rng = np.random.default_rng(args.seed)
+        train = database[rng.permutation(len(database))[:args.train_size]]
+        index.train(train)
+    index.add(database)
+    build_s = time.perf_counter() - start
+    index_mb = faiss.serialize_index(index).nbytes / (1024 * 1024)
+
+    rows = []
+    single = queries[:args.single_queries]
+    parameter_space = faiss.ParameterSpace()
+    for value in values:
+        if parameter:
+            parameter_space.set_index_parameter(index, parameter, value)
+
+        start = time.perf_counter()
+        _, found = index.search(queries, args.k)
+        batch_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for query in single:
+            index.search(query.reshape(1, -1), args.k)
+        single_s = time.perf_counter() - start
+
+        rows.append({
+            "index": factory,
+            "parameter": f"{parameter}={value}" if parameter else "",
+            f"recall@{args.k}": recall_at_k(found, truth),
+            "qps": len(single) / single_s,
+            "batch_qps": len(queries) / batch_s,
+            "build_s": build_s,
+            "index_mb": index_mb,
+        })
+        print(json.dumps(rows[-1]))
+    return rows
+
+def pareto_frontier(rows: List[Dict[str, Any]], recall_key: str) -> List[Dict[str, Any]]:
+    """Rows no other row beats on both recall and QPS, by descending recall"""
+    frontier = []
+    best_qps = 0.0
+    for row in sorted(rows, key=lambda row: (-row[recall_key], -row["qps"])):
+        if row["qps"] > best_qps:
+            frontier.append(row)
+            best_qps = row["qps"]
+    return frontier
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    columns = list(rows[0])
+    cells = [[f"{value:.4g}" if isinstance(value, float) else str(value) for value in row.values()] for row in rows]
+    widths = [max(len(column), *(len(row[i]) for row in cells)) for i, column in enumerate(columns)]
+    lines = ["  ".join(column.ljust(width) for column, width in zip(columns, widths))]
+    lines.append("  ".join("-" * width for width in widths))
+    lines.extend("  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in cells)
+    return "\n".join(lines)
+
+def main(args: argparse.Namespace) -> None:
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    database, queries = load_dataset(args)
+    print(f"{len(database)} vectors of dimension {database.shape[1]}, {len(queries)} queries")
+
+    # Exact ground truth from the flat index VectorSearch uses
+    exact = faiss.IndexFlatIP(database.shape[1])
+    exact.add(database)
+    _, truth = exact.search(queries, args.k)
+
+    rows: List[Dict[str, Any]] = []
+    for factory, parameter, values in configurations(args, len(database), database.shape[1]):
+        rows.extend(evaluate(factory, parameter, values, database, queries, truth, args))
+
+    recall_key = f"recall@{args.k}"
+    frontier = pareto_frontier(rows, recall_key)
+    print()
+    print(format_table(rows))
+    print(f"\nPareto frontier ({recall_key} against QPS):")
+    print(format_table(frontier))
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({
+            "vectors": len(database),
+            "dimension": int(database.shape[1]),
+            "queries": len(queries),
+            "k": args.k,
+            "source": str(args.index) if args.index else "synthetic",
+            "results": rows,
+            "pareto_frontier": frontier,
+        }, indent=2))
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", type=Path, help="Saved product index to take vectors from (default: synthetic)")
+    parser.add_argument("--size", type=int, default=100_000, help="Synthetic database vectors")
+    parser.add_argument("--dim", type=int, default=512, help="Synthetic vector dimension")
+    parser.add_argument("--clusters", type=int, default=1000, help="Synthetic cluster centres")
+    parser.add_argument("--spread", type=float, default=1.0, help="Synthetic noise around each centre")
+    parser.add_argument("--queries", type=int, default=1000, help="Held-out query vectors")
+    parser.add_argument("--single-queries", type=int, default=200, help="Queries timed one per call")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--hnsw-m", type=int, nargs="*", default=[16, 32])
+    parser.add_argument("--ef-search", type=int, nargs="*", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--ivf-nlist", type=int, nargs="*", default=[256, 1024])
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 4, 16, 64])
+    parser.add_argument("--pq-m", type=int, nargs="*", default=[16, 32, 64], help="PQ code sizes in bytes")
+    parser.add_argument("--pca-dims", type=int, nargs="*", default=[128, 256])
+    parser.add_argument("--train-size", type=int, default=50_000, help="Vectors to train IVF, PQ and PCA on")
+    parser.add_argument("--threads", type=int, help="FAISS OpenMP threads (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file")
+    return parser
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
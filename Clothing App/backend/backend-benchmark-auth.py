@@ -0,0 +1,108 @@
+"""
+Authentication overhead per request, with and without the token cache.
+
+Creates a user in a scratch SQLite database and times:
+  * the get_current_user dependency with a valid token
+  * the optional dependency with no token and with an invalid token
+  * GET /api/auth/me in-process, end to end
+each with the cache disabled (AUTH_CACHE_TTL=0, a JWT decode and a user
+query per request) and enabled. Finally the user is deactivated through
+the ORM to check the next request is rejected without waiting for the TTL.
+
+Usage (from the backend directory):
+    python -m benchmarks.auth --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict
+
+import httpx
+import numpy as np
+
+async def time_calls(func: Callable[[], Awaitable[Any]], requests: int) -> Dict[str, float]:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - start)
+    values = np.array(latencies) * 1e6
+    return {"p50_us": float(np.percentile(values, 50)), "p99_us": float(np.percentile(values, 99))}
+
+async def main(args: argparse.Namespace) -> None:
+    # Point the app at a scratch database before it is imported
+    workdir = Path(tempfile.mkdtemp())
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'auth.db'}"
+
+    from fastapi import HTTPException
+
+    from app.core import security
+    from app.core.config import settings
+    from app.db.database import AsyncSessionLocal, Base, SessionLocal, engine
+    from app.db.models import User
+    from main import app
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(email="bench@example.com", hashed_password="x", is_active=True)
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+    token = security.create_access_token(user_id)
+
+    def configure(ttl: float) -> None:
+        settings.AUTH_CACHE_TTL = ttl
+        for cache in (security._token_cache, security._user_cache):
+            cache.ttl = ttl
+            cache.invalidate()
+
+    results: Dict[str, Any] = {"requests": args.requests}
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark/api") as client:
+        for label, ttl in (("uncached", 0.0), ("cached", args.ttl)):
+            configure(ttl)
+            async with AsyncSessionLocal() as session:
+                results[label] = {
+                    "dependency": await time_calls(lambda: security.get_current_user(session, token), args.requests),
+                    "optional_no_token": await time_calls(
+                        lambda: security.get_current_user_optional(session, None), args.requests
+                    ),
+                    "optional_invalid_token": await time_calls(
+                        lambda: security.get_current_user_optional(session, "not-a-token"), args.requests
+                    ),
+                }
+
+            async def me() -> None:
+                response = await client.get("/auth/me", headers=headers)
+                response.raise_for_status()
+
+            await me()
+            results[label]["http_auth_me"] = await time_calls(me, args.requests // 4)
+
+        # Deactivate through the ORM; the cached user must not be served again
+        db = SessionLocal()
+        db.get(User, user_id).is_active = False
+        db.commit()
+        db.close()
+        async with AsyncSessionLocal() as session:
+            try:
+                await security.get_current_user(session, token)
+                results["rejected_after_deactivation"] = False
+            except HTTPException:
+                results["rejected_after_deactivation"] = True
+
+    results["dependency_speedup"] = results["uncached"]["dependency"]["p50_us"] / results["cached"]["dependency"]["p50_us"]
+    results["cache"] = security.auth_cache_stats()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--ttl", type=float, default=30.0, help="Cache TTL for the cached run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""
+Throughput of batch search versus one search request per image.
+
+For each batch size N, the same N generated images are searched once with
+N sequential one-shot requests to /products/search and once with a single
+request to /products/search/batch, after a warm-up that loads the model
+and index. Reports images per second for both and the speedup.
+
+Usage (from the backend directory):
+    python -m benchmarks.batch_search --sizes 1 2 4 8 16
+    python -m benchmarks.batch_search --url http://localhost:8000/api --sizes 1 4 16
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.one_shot_search import make_images
+
+async def per_image(client: httpx.AsyncClient, images: List[bytes]) -> None:
+    for index, image in enumerate(images):
+        files = {"file": (f"bench_{index}.jpg", image, "image/jpeg")}
+        response = await client.post("/products/search", files=files)
+        response.raise_for_status()
+
+async def batch(client: httpx.AsyncClient, images: List[bytes]) -> None:
+    files = [("files", (f"bench_{index}.jpg", image, "image/jpeg")) for index, image in enumerate(images)]
+    response = await client.post("/products/search/batch", files=files)
+    response.raise_for_status()
+    assert len(response.json()["results"]) == len(images)
+
+async def images_per_second(client: httpx.AsyncClient, flow, images: List[bytes], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await flow(client, images)
+    return len(images) * rounds / (time.perf_counter() - start)
+
+async def main(args: argparse.Namespace) -> None:
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, headers=headers, timeout=120.0)
+    else:
+        from app.db.database import init_db
+        from main import app
+        init_db()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://benchmark/api",
+            headers=headers,
+            timeout=120.0,
+        )
+
+    images = make_images(max(args.sizes), args.image_size)
+    results: List[Dict[str, Any]] = []
+    async with client:
+        # Warm up the model, index and caches
+        await per_image(client, images[:1])
+        await batch(client, images[:2])
+
+        for size in args.sizes:
+            per_image_rate = await images_per_second(client, per_image, images[:size], args.rounds)
+            batch_rate = await images_per_second(client, batch, images[:size], args.rounds)
+            results.append({
+                "images": size,
+                "per_image_images_per_s": per_image_rate,
+                "batch_images_per_s": batch_rate,
+                "speedup": batch_rate / per_image_rate,
+            })
+    print(json.dumps({"image_size": args.image_size, "rounds": args.rounds, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running API (default: in-process)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Images per batch")
+    parser.add_argument("--rounds", type=int, default=3, help="Repetitions per batch size")
+    parser.add_argument("--token", help="Access token to send with every request")
+    parser.add_argument("--image-size", type=int, default=640, help="Width and height of generated images")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,80 @@
+"""
+Benchmark EcommerceService.get_multiple_products against the local stub.
+
+Compares the old serial loop with concurrent per-product fetches and the
+bulk endpoint, with injected per-request latency.
+
+Usage (from the backend directory):
+    python -m benchmarks.bulk_fetch --products 20 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, Any, List
+
+from app.core.config import settings
+from app.services.ecommerce import EcommerceService
+from benchmarks.ecommerce_stub import StubServer, create_app
+
+async def fetch_serially(service: EcommerceService, product_ids: List[str]) -> int:
+    """The old get_multiple_products behaviour"""
+    products = [await service.get_product_by_id(product_id) for product_id in product_ids]
+    return sum(1 for product in products if product)
+
+async def fetch_batched(service: EcommerceService, product_ids: List[str]) -> int:
+    result = await service.get_multiple_products(product_ids)
+    return len(result.products)
+
+async def time_strategy(name: str, fetch, bulk_path: str, product_ids: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    settings.ECOMMERCE_BULK_PATH = bulk_path
+    service = EcommerceService()
+    timings = []
+    for _ in range(args.repeats):
+        # Measure upstream fetches, not cache hits
+        service.product_cache.invalidate()
+        start = time.perf_counter()
+        found = await fetch(service, product_ids)
+        timings.append(time.perf_counter() - start)
+    await service.close()
+
+    result = {
+        "strategy": name,
+        "products": len(product_ids),
+        "found": found,
+        "mean_ms": 1000 * sum(timings) / len(timings),
+        "min_ms": 1000 * min(timings),
+    }
+    print(json.dumps(result))
+    return result
+
+async def main(args: argparse.Namespace) -> None:
+    # Repeat a few IDs to exercise deduplication
+    product_ids = [f"clothing_{i % (args.products - 2) + 1}" for i in range(args.products)]
+
+    app = create_app(catalog_size=args.products, latency=args.latency)
+    with StubServer(app, port=args.port) as stub:
+        settings.ECOMMERCE_API_URL = stub.url
+        settings.ECOMMERCE_FETCH_CONCURRENCY = args.concurrency
+        results = [
+            await time_strategy("serial", fetch_serially, "", product_ids, args),
+            await time_strategy("concurrent", fetch_batched, "", product_ids, args),
+            await time_strategy("bulk", fetch_batched, "/products/bulk", product_ids, args),
+        ]
+
+    serial_ms = results[0]["mean_ms"]
+    for result in results:
+        result["speedup"] = serial_ms / result["mean_ms"]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="Injected latency per request in seconds")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""
+Exercise catalog sync end to end against the local stub API.
+
+Runs an initial sync of the stub catalog into a scratch SQLite database and
+vector index, mutates the upstream catalog, and syncs again. The second run
+should only write the changed rows, re-embed only the changed images, and
+leave the index consistent with the database. Embeddings are generated from
+the image URL, so no model or network access is needed.
+
+Usage (from the backend directory):
+    python -m benchmarks.catalog_sync --size 20000 --changed 500 --image-changed 100 --deleted 50 --added 200
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict
+
+# Point the app at scratch storage before its settings are loaded
+_workdir = tempfile.mkdtemp(prefix="catalog_sync_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/catalog.db")
+os.environ.setdefault("VECTOR_INDEX_PATH", f"{_workdir}/vector_index")
+os.environ.setdefault("CATALOG_SYNC_CHECKPOINT_PATH", f"{_workdir}/checkpoint.json")
+
+import httpx
+import numpy as np
+from sqlalchemy import func
+
+from app.db.database import Base, SessionLocal, engine
+from app.db.models import Product
+from app.ml.vector_search import VectorSearch
+from app.services.catalog_sync import CatalogSync
+from app.services.http_client import ResilientHttpClient
+from benchmarks.ecommerce_stub import StubServer, create_app
+
+async def fake_embedding(image_url: str) -> np.ndarray:
+    """Deterministic unit vector derived from the image URL"""
+    seed = int(hashlib.sha256(image_url.encode()).hexdigest()[:8], 16)
+    vector = np.random.default_rng(seed).standard_normal(512).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+async def timed_sync(name: str, catalog_sync: CatalogSync) -> dict:
+    start = time.perf_counter()
+    stats = await catalog_sync.run()
+    result = {"run": name, "elapsed_s": time.perf_counter() - start, **asdict(stats)}
+    print(json.dumps(result))
+    return result
+
+async def main(args: argparse.Namespace) -> None:
+    Base.metadata.create_all(bind=engine)
+    vector_search = VectorSearch()
+
+    with StubServer(create_app(catalog_size=args.size), port=args.port) as stub:
+        client = ResilientHttpClient(stub.url)
+        catalog_sync = CatalogSync(
+            client,
+            vector_search=vector_search,
+            embed_image=fake_embedding,
+            page_size=args.page_size,
+            rate_limit=args.rate_limit,
+        )
+        results = [await timed_sync("initial", catalog_sync)]
+
+        async with httpx.AsyncClient(base_url=stub.url) as admin:
+            await admin.post("/catalog/mutate", params={
+                "changed": args.changed,
+                "image_changed": args.image_changed,
+                "deleted": args.deleted,
+                "added": args.added,
+            })
+        results.append(await timed_sync("incremental", catalog_sync))
+        await client.aclose()
+
+    db = SessionLocal()
+    product_count = db.query(func.count(Product.id)).scalar()
+    db.close()
+    expected_embedded = args.image_changed + args.added
+    consistency = {
+        "db_products": product_count,
+        "index_vectors": vector_search.index.ntotal,
+        "expected_products": args.size - args.deleted + args.added,
+        "incremental_embedded": results[1]["embedded"],
+        "expected_embedded": expected_embedded,
+    }
+    print(json.dumps(consistency))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": results, "consistency": consistency}, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--changed", type=int, default=500)
+    parser.add_argument("--image-changed", type=int, default=100)
+    parser.add_argument("--deleted", type=int, default=50)
+    parser.add_argument("--added", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--rate-limit", type=float, default=50.0)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,126 @@
+"""
+Concurrency benchmark for the sync and async database sessions.
+
+Simulates request handlers that run one slow query each, first with the
+synchronous SessionLocal called from async code (the old route behaviour)
+and then with the async session. A heartbeat coroutine runs alongside to
+measure how long the event loop is stalled for unrelated requests.
+
+Usage (from the backend directory):
+    python -m benchmarks.db_concurrency --requests 200 --concurrency 50
+    python -m benchmarks.db_concurrency --database-url postgresql://postgres:postgres@db:5432/clothing_app
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import get_async_database_url, get_engine_options
+
+def slow_query(database_url: str, duration: float) -> str:
+    """Get a query that keeps the database busy for roughly `duration` seconds"""
+    if make_url(database_url).get_backend_name() == "postgresql":
+        return f"SELECT pg_sleep({duration})"
+    # SQLite has no sleep, so count through a recursive CTE instead
+    rows = int(duration * 5_000_000)
+    return (
+        "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c "
+        f"WHERE x < {rows}) SELECT count(*) FROM c"
+    )
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples in milliseconds"""
+    values = np.array(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+async def heartbeat(stop: asyncio.Event, interval: float, lags: List[float]) -> None:
+    """Record how late the event loop wakes this coroutine up"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def run_scenario(name: str, handler, requests: int, concurrency: int) -> Dict[str, float]:
+    """Run `requests` handler calls with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    lags: List[float] = []
+    stop = asyncio.Event()
+
+    async def one_request():
+        async with semaphore:
+            start = time.perf_counter()
+            await handler()
+            latencies.append(time.perf_counter() - start)
+
+    monitor = asyncio.create_task(heartbeat(stop, 0.01, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    result = {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": requests / elapsed,
+        "latency": percentiles(latencies),
+        "event_loop_lag": percentiles(lags or [0.0]),
+    }
+    print(json.dumps(result, indent=2))
+    return result
+
+async def main(args: argparse.Namespace) -> None:
+    query = text(slow_query(args.database_url, args.query_seconds))
+
+    sync_engine = create_engine(args.database_url, **get_engine_options(args.database_url))
+    SyncSession = sessionmaker(bind=sync_engine)
+
+    async_url = get_async_database_url(args.database_url)
+    async_engine = create_async_engine(async_url, **get_engine_options(async_url))
+    AsyncSessionLocal = sessionmaker(bind=async_engine, class_=AsyncSession)
+
+    async def sync_handler():
+        # Blocking session inside an async handler, as the routes used to do
+        db = SyncSession()
+        try:
+            db.execute(query)
+        finally:
+            db.close()
+
+    async def async_handler():
+        async with AsyncSessionLocal() as db:
+            await db.execute(query)
+
+    results = [
+        await run_scenario("sync_session", sync_handler, args.requests, args.concurrency),
+        await run_scenario("async_session", async_handler, args.requests, args.concurrency),
+    ]
+
+    await async_engine.dispose()
+    sync_engine.dispose()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--query-seconds", type=float, default=0.02)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    asyncio.run(main(parser.parse_args()))
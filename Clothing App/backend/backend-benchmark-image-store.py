@@ -0,0 +1,145 @@
+"""
+Benchmark the content-addressed upload store.
+
+Three parts:
+  * ingest: store generated photos (with a share of exact duplicates) and
+    report throughput, deduplicated uploads and disk usage of originals
+    versus derivatives
+  * lookup: populate a sharded layout and a single flat directory with the
+    same number of (empty) files and time random existence checks
+  * gc: reference half of the ingested images from SearchHistory in a
+    scratch SQLite database and time a garbage collection sweep
+
+Usage (from the backend directory):
+    python -m benchmarks.image_store --images 500 --files 1000000
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.db.models import SearchHistory
+from app.services.image_store import ImageStore, collect_garbage, make_image_id
+
+def make_photo(rng: np.random.Generator, size: int) -> bytes:
+    """A smooth random image, compressing roughly like a photo"""
+    small = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize((size, size), Image.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+def bench_ingest(store: ImageStore, args: argparse.Namespace) -> Dict[str, Any]:
+    rng = np.random.default_rng(0)
+    photos = [make_photo(rng, args.image_size) for _ in range(args.images)]
+    # Re-upload a share of the photos unchanged
+    uploads = photos + random.Random(0).sample(photos, int(len(photos) * args.duplicates))
+
+    start = time.perf_counter()
+    created = sum(store.put_bytes(content).created for content in uploads)
+    elapsed = time.perf_counter() - start
+
+    usage = store.disk_usage()
+    return {
+        "uploads": len(uploads),
+        "stored": created,
+        "deduplicated": len(uploads) - created,
+        "uploads_per_s": len(uploads) / elapsed,
+        "upload_bytes": sum(len(content) for content in uploads),
+        **usage,
+        "derivative_ratio": usage["derived_bytes"] / usage["originals_bytes"],
+    }
+
+def time_lookups(paths: List[Path]) -> float:
+    start = time.perf_counter()
+    for path in paths:
+        path.is_file()
+    return (time.perf_counter() - start) / len(paths) * 1e6
+
+def bench_lookup(root: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    store = ImageStore(root / "sharded")
+    flat = root / "flat"
+    flat.mkdir()
+    image_ids = [make_image_id(hashlib.sha256(str(i).encode()).hexdigest(), "jpeg") for i in range(args.files)]
+
+    for image_id in image_ids:
+        path = store.original_path(image_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+        (flat / image_id).touch()
+
+    rng = random.Random(1)
+    sample = rng.sample(image_ids, min(args.lookups, len(image_ids)))
+    # Drop the dentry cache where allowed, so lookups hit the directories
+    if os.access("/proc/sys/vm/drop_caches", os.W_OK):
+        os.system("sync; echo 2 > /proc/sys/vm/drop_caches")
+    sharded_us = time_lookups([store.original_path(image_id) for image_id in sample])
+    flat_us = time_lookups([flat / image_id for image_id in sample])
+
+    start = time.perf_counter()
+    listed = sum(1 for _ in os.scandir(flat))
+    flat_list_s = time.perf_counter() - start
+    start = time.perf_counter()
+    shard = store.original_path(sample[0]).parent
+    shard_listed = sum(1 for _ in os.scandir(shard))
+    shard_list_s = time.perf_counter() - start
+
+    return {
+        "files": args.files,
+        "sharded_lookup_us": sharded_us,
+        "flat_lookup_us": flat_us,
+        "flat_directory_entries": listed,
+        "flat_list_ms": flat_list_s * 1000,
+        "shard_directory_entries": shard_listed,
+        "shard_list_ms": shard_list_s * 1000,
+    }
+
+def bench_gc(store: ImageStore, root: Path) -> Dict[str, Any]:
+    engine = create_engine(f"sqlite:///{root / 'gc.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    image_ids = sorted(images for shard in store.iter_shards() for images in shard)
+    db.bulk_insert_mappings(SearchHistory, [{"user_id": 1, "image_path": image_id} for image_id in image_ids[::2]])
+    db.commit()
+
+    start = time.perf_counter()
+    stats = collect_garbage(store, db, retention_hours=0)
+    elapsed = time.perf_counter() - start
+    db.close()
+    return {"sweep_s": elapsed, **stats.__dict__}
+
+def main(args: argparse.Namespace) -> None:
+    root = Path(tempfile.mkdtemp(dir=args.workdir))
+    try:
+        store = ImageStore(root / "uploads")
+        results = {
+            "ingest": bench_ingest(store, args),
+            "lookup": bench_lookup(root, args),
+            "gc": bench_gc(store, root),
+        }
+    finally:
+        shutil.rmtree(root)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=500, help="Distinct photos to ingest")
+    parser.add_argument("--duplicates", type=float, default=0.3, help="Share of photos uploaded again")
+    parser.add_argument("--image-size", type=int, default=1600, help="Width and height of generated photos")
+    parser.add_argument("--files", type=int, default=200_000, help="Files for the lookup comparison")
+    parser.add_argument("--lookups", type=int, default=10_000)
+    parser.add_argument("--workdir", help="Directory to create scratch files in")
+    main(parser.parse_args())
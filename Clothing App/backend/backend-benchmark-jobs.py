@@ -0,0 +1,99 @@
+"""
+Benchmark background image processing jobs against inline processing.
+
+Generates images into a scratch upload store and database, then:
+  * inline: extracts features one request at a time, the way
+    /images/{image_id}/process used to, so each request waits for the model
+  * jobs: submits the same images as jobs and waits for the workers,
+    reporting submit latency, peak queue depth, throughput and the queue
+    wait / run time percentiles from JobQueue.stats()
+
+Usage (from the backend directory):
+    python -m benchmarks.jobs --images 50 --workers 2
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+def main(args: argparse.Namespace) -> None:
+    # Point the app at scratch storage before it is imported
+    workdir = Path(tempfile.mkdtemp())
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'jobs.db'}"
+    os.environ["UPLOAD_FOLDER"] = str(workdir / "uploads")
+
+    from app.db.database import Base, engine
+    from app.services.image_store import get_image_store
+    from app.services.jobs import FINISHED_STATUSES, JobQueue, process_image
+
+    Base.metadata.create_all(bind=engine)
+    rng = np.random.default_rng(0)
+    image_ids = []
+    for _ in range(args.images):
+        buffer = io.BytesIO()
+        pixels = rng.integers(0, 256, (args.image_size, args.image_size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(buffer, format="JPEG")
+        image_ids.append(get_image_store().put_bytes(buffer.getvalue()).image_id)
+
+    # Load the model before timing
+    process_image(image_ids[0])
+
+    start = time.perf_counter()
+    inline_latencies = []
+    for image_id in image_ids:
+        request_start = time.perf_counter()
+        process_image(image_id)
+        inline_latencies.append(time.perf_counter() - request_start)
+    inline_s = time.perf_counter() - start
+
+    job_queue = JobQueue(workers=args.workers, max_queue_size=len(image_ids), poll_interval=0.1)
+    job_queue.start()
+    start = time.perf_counter()
+    submit_latencies = []
+    jobs = []
+    for image_id in image_ids:
+        request_start = time.perf_counter()
+        jobs.extend(job_queue.submit([image_id]))
+        submit_latencies.append(time.perf_counter() - request_start)
+    peak_queued = 0
+    while True:
+        stats = job_queue.stats()
+        peak_queued = max(peak_queued, stats["queued"])
+        if stats["queued"] == 0 and stats["running"] == 0:
+            break
+        time.sleep(0.05)
+    jobs_s = time.perf_counter() - start
+    job_queue.stop()
+
+    statuses = [job_queue.get(job.id).status for job in jobs]
+    results = {
+        "images": args.images,
+        "workers": args.workers,
+        "inline": {
+            "request_p50_ms": float(np.percentile(inline_latencies, 50) * 1000),
+            "request_p95_ms": float(np.percentile(inline_latencies, 95) * 1000),
+            "images_per_s": args.images / inline_s,
+        },
+        "jobs": {
+            "submit_p50_ms": float(np.percentile(submit_latencies, 50) * 1000),
+            "submit_p95_ms": float(np.percentile(submit_latencies, 95) * 1000),
+            "images_per_s": args.images / jobs_s,
+            "peak_queued": peak_queued,
+            "finished": sum(status in FINISHED_STATUSES for status in statuses),
+            **stats,
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--image-size", type=int, default=640)
+    main(parser.parse_args())
@@ -0,0 +1,131 @@
+"""
+Search latency during a login storm.
+
+A few clients search back to back (closed loop) while logins arrive at a
+fixed rate (open loop), half of them for an unknown email. In-process the
+storm runs twice: with password hashing spread over as many threads as
+Starlette's default thread pool (the old run_in_threadpool behaviour), and
+on the bounded password hashing pool. A baseline without logins is run
+first. Reports search p50/p99, login latency and outcome counts, and the
+login latency of unknown emails versus wrong passwords.
+
+Usage (from the backend directory):
+    python -m benchmarks.login_storm --login-rate 20 --duration 15
+"""
+import argparse
+import asyncio
+import io
+import json
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from app.core import security
+from app.services.admission import AdmissionController
+
+# Default size of Starlette's (anyio's) thread pool
+UNBOUNDED_THREADS = 40
+
+def make_image(size: int) -> bytes:
+    pixels = np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    values = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    image: bytes,
+    email: str,
+    password: str,
+    args: argparse.Namespace,
+    login_rate: float,
+) -> Dict[str, Any]:
+    search_latencies: List[float] = []
+    login_latencies: Dict[str, List[float]] = defaultdict(list)
+    outcomes: Dict[str, int] = defaultdict(int)
+    deadline = time.perf_counter() + args.duration
+
+    async def searcher() -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.post("/products/search", files={"file": ("storm.jpg", image, "image/jpeg")})
+            response.raise_for_status()
+            search_latencies.append(time.perf_counter() - start)
+
+    async def login(index: int) -> None:
+        unknown = index % 2 == 0
+        username = f"nobody-{index}@example.com" if unknown else email
+        start = time.perf_counter()
+        response = await client.post("/auth/login", data={"username": username, "password": password + "x"})
+        outcomes[str(response.status_code)] += 1
+        if response.status_code == 401:
+            login_latencies["unknown_email" if unknown else "wrong_password"].append(time.perf_counter() - start)
+
+    tasks = [asyncio.ensure_future(searcher()) for _ in range(args.searchers)]
+    start = time.perf_counter()
+    for index in range(int(login_rate * args.duration)):
+        # Open loop: keep the arrival schedule regardless of response times
+        await asyncio.sleep(max(0.0, start + index / login_rate - time.perf_counter()))
+        tasks.append(asyncio.ensure_future(login(index)))
+    await asyncio.gather(*tasks)
+
+    return {
+        "search": summarize(search_latencies),
+        "login_outcomes": dict(outcomes),
+        "login_unknown_email": summarize(login_latencies["unknown_email"]),
+        "login_wrong_password": summarize(login_latencies["wrong_password"]),
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    from app.db.database import init_db
+    from main import app
+    init_db()
+
+    image = make_image(args.image_size)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark/api", timeout=120.0) as client:
+        email = f"storm-{uuid.uuid4().hex[:12]}@example.com"
+        password = uuid.uuid4().hex
+        response = await client.post("/auth/register", json={"email": email, "password": password})
+        response.raise_for_status()
+        # Warm up the model, index and the dummy hash
+        await client.post("/products/search", files={"file": ("storm.jpg", image, "image/jpeg")})
+        await client.post("/auth/login", data={"username": "nobody@example.com", "password": password})
+
+        results: Dict[str, Any] = {"login_rate": args.login_rate, "duration": args.duration}
+        results["baseline"] = await run_scenario(client, image, email, password, args, login_rate=1e-9)
+        for label, threads in (("unbounded", UNBOUNDED_THREADS), ("bounded", None)):
+            default = security.get_password_hasher()
+            security._password_hasher = AdmissionController(
+                max_concurrency=threads or default.max_concurrency,
+                max_queue=10_000 if threads else default.max_queue,
+                deadline=600.0 if threads else default.deadline,
+            )
+            results[label] = await run_scenario(client, image, email, password, args, args.login_rate)
+            security._password_hasher.shutdown()
+            security._password_hasher = default
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--login-rate", type=float, default=20.0, help="Logins per second")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per scenario")
+    parser.add_argument("--searchers", type=int, default=2, help="Clients searching back to back")
+    parser.add_argument("--image-size", type=int, default=640)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,90 @@
+"""
+Overhead of the metrics layer.
+
+Times a stage timer and a histogram observation in a tight loop, then runs
+one-shot searches in-process with METRICS_ENABLED off and on (alternating
+rounds, so drift affects both equally), and finally times rendering
+/metrics. Prints the per-stage breakdown recorded during the run.
+
+Usage (from the backend directory):
+    python -m benchmarks.metrics_overhead --requests 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import httpx
+
+from app.core import metrics
+from app.core.config import settings
+from benchmarks.one_shot_search import make_images, percentiles
+
+def per_call_us(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+def stage_breakdown() -> Dict[str, Dict[str, float]]:
+    """Mean milliseconds and count per stage recorded so far, slowest total first"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for suffix, _, label_values, value in metrics.STAGE_SECONDS.samples():
+        if suffix in ("_count", "_sum"):
+            totals.setdefault(label_values[0], {})[suffix] = value
+    return {
+        stage: {"count": int(values["_count"]), "mean_ms": values["_sum"] / values["_count"] * 1000}
+        for stage, values in sorted(totals.items(), key=lambda item: -item[1]["_sum"])
+        if values["_count"] and stage != "benchmark"
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    def timed_noop() -> None:
+        with metrics.stage_timer("benchmark"):
+            pass
+
+    histogram = metrics.histogram("benchmark_seconds", "Benchmark histogram", ["label"])
+    results = {
+        "stage_timer_us": per_call_us(timed_noop, args.calls),
+        "histogram_observe_us": per_call_us(lambda: histogram.observe(0.01, label="x"), args.calls),
+    }
+
+    from app.db.database import init_db
+    from main import app
+    init_db()
+    images = make_images(args.requests, args.image_size)
+    samples: Dict[bool, List[float]] = {False: [], True: []}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://benchmark/api", timeout=60.0
+    ) as client:
+        async def search(image: bytes) -> float:
+            start = time.perf_counter()
+            response = await client.post("/products/search", files={"file": ("bench.jpg", image, "image/jpeg")})
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        # Warm up the model, index and caches
+        await search(images[0])
+        for image in images:
+            for enabled in (False, True):
+                settings.METRICS_ENABLED = enabled
+                samples[enabled].append(await search(image))
+
+    results["search_metrics_off"] = percentiles(samples[False])
+    results["search_metrics_on"] = percentiles(samples[True])
+    results["search_p50_overhead_ms"] = results["search_metrics_on"]["p50_ms"] - results["search_metrics_off"]["p50_ms"]
+
+    start = time.perf_counter()
+    text = metrics.render_metrics()
+    results["render_ms"] = (time.perf_counter() - start) * 1000
+    results["render_bytes"] = len(text)
+    results["stages"] = stage_breakdown()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--calls", type=int, default=200_000, help="Iterations of the micro benchmarks")
+    parser.add_argument("--image-size", type=int, default=640)
+    asyncio.run(main(parser.parse_args()))
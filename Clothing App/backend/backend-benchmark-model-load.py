@@ -0,0 +1,126 @@
+"""
+Model load time and memory: clip.load against the memory-mapped artifact.
+
+For each load path, starts --processes fresh interpreters one after
+another. Each imports torch and CLIP (timed apart), loads the model,
+encodes one batch (so every weight page it needs is touched), reports
+its load time and memory, then stays alive until all of them have
+loaded. PSS is then read for each from /proc/<pid>/smaps_rollup: pages
+shared between the processes are split between them, so the total is
+the real footprint of running them side by side. RssFile is memory
+backed by files (the mapped weights), which the kernel shares and can
+drop under pressure; RssAnon is private heap.
+
+The artifact is exported first if MODEL_PATH has none. clip.load reads
+its checkpoint from MODEL_PATH, downloading it if missing; pass a
+checkpoint path as --model to stay offline. Both paths read from a warm
+page cache after the first process. Linux only (/proc).
+
+Usage (from the backend directory):
+    python -m benchmarks.model_load --processes 3
+    python -m benchmarks.model_load --model /models/ViT-B-32.pt --skip-checksum
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from app.core.config import settings
+from app.ml.model_artifact import artifact_exists, export_clip
+
+LOAD_PROBE = """
+import json, sys, time
+def status_mb(*fields):
+    with open("/proc/self/status") as f:
+        values = dict(line.split(":", 1) for line in f)
+    return {field: int(values[field].split()[0]) / 1024 for field in fields}
+start = time.perf_counter()
+import clip
+import torch
+from app.core.config import settings
+from app.ml.model_artifact import load_clip_artifact
+import_s = time.perf_counter() - start
+start = time.perf_counter()
+if %(path)r == "artifact":
+    model = load_clip_artifact(settings.CLIP_MODEL, "cpu", verify=settings.MODEL_VERIFY_CHECKSUM)
+else:
+    model, _ = clip.load(settings.CLIP_MODEL, device="cpu", download_root=str(settings.MODEL_PATH))
+    model.eval()
+load_s = time.perf_counter() - start
+after_load = status_mb("VmRSS")["VmRSS"]
+start = time.perf_counter()
+with torch.no_grad():
+    model.encode_image(torch.zeros(%(batch)d, 3, model.visual.input_resolution, model.visual.input_resolution))
+encode_s = time.perf_counter() - start
+memory = status_mb("VmRSS", "RssAnon", "RssFile")
+print(json.dumps({
+    "import_s": import_s,
+    "load_s": load_s,
+    "first_encode_s": encode_s,
+    "rss_after_load_mb": after_load,
+    "rss_mb": memory["VmRSS"],
+    "rss_anon_mb": memory["RssAnon"],
+    "rss_file_mb": memory["RssFile"],
+}), flush=True)
+sys.stdin.read()
+"""
+
+def pss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def measure(path: str, args: argparse.Namespace, env: Dict[str, str]) -> Dict[str, Any]:
+    """Start the processes, read their memory while all are alive, then stop them"""
+    processes: List[subprocess.Popen] = []
+    samples: List[Dict[str, Any]] = []
+    try:
+        for _ in range(args.processes):
+            process = subprocess.Popen(
+                [sys.executable, "-c", LOAD_PROBE % {"path": path, "batch": args.batch_size}],
+                env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            )
+            processes.append(process)
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"The {path} probe exited with status {process.wait()}")
+            samples.append(json.loads(line))
+        for process, sample in zip(processes, samples):
+            sample["pss_mb"] = pss_mb(process.pid)
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+    result: Dict[str, Any] = {"processes": samples}
+    for key in ("import_s", "load_s", "first_encode_s", "rss_mb", "rss_anon_mb", "rss_file_mb"):
+        result[key] = statistics.median(sample[key] for sample in samples)
+    result["first_load_s"] = samples[0]["load_s"]
+    result["total_pss_mb"] = sum(sample["pss_mb"] for sample in samples)
+    return result
+
+def main(args: argparse.Namespace) -> None:
+    env = dict(os.environ, CLIP_MODEL=args.model, MODEL_VERIFY_CHECKSUM=str(not args.skip_checksum).lower())
+    if not artifact_exists(args.model):
+        print(json.dumps({"exported": export_clip(args.model)}, indent=2))
+
+    results: Dict[str, Any] = {"model": args.model, "checksum": not args.skip_checksum}
+    for path in ("clip_load", "artifact"):
+        results[path] = measure(path, args, env)
+        print(json.dumps({path: {key: value for key, value in results[path].items() if key != "processes"}}))
+    results["load_speedup"] = results["clip_load"]["load_s"] / results["artifact"]["load_s"]
+    results["pss_saved_mb"] = results["clip_load"]["total_pss_mb"] - results["artifact"]["total_pss_mb"]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.CLIP_MODEL, help="CLIP model name or checkpoint path")
+    parser.add_argument("--processes", type=int, default=3, help="Processes holding the model at once")
+    parser.add_argument("--batch-size", type=int, default=8, help="Images in the first encode")
+    parser.add_argument("--skip-checksum", action="store_true", help="Load the artifact without verifying its SHA-256")
+    main(parser.parse_args())
@@ -0,0 +1,104 @@
+"""
+Latency benchmark for upload-then-search versus one-shot search.
+
+The two-step flow uploads the image (written to disk), then searches by
+image ID (read back and decoded from disk). The one-shot flow posts the
+image to /products/search, which decodes and embeds it in memory. Each
+flow is run sequentially for the same set of generated images, after a
+warm-up that loads the model and index.
+
+Usage (from the backend directory):
+    python -m benchmarks.one_shot_search --requests 100
+    python -m benchmarks.one_shot_search --url http://localhost:8000/api --requests 100
+"""
+import argparse
+import asyncio
+import io
+import json
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+from PIL import Image
+
+def make_images(count: int, size: int, seed: int = 0) -> List[bytes]:
+    """Generate random JPEG images"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples in milliseconds"""
+    values = np.array(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+async def two_step(client: httpx.AsyncClient, image: bytes, index: int) -> None:
+    files = {"file": (f"bench_{index}.jpg", image, "image/jpeg")}
+    response = await client.post("/images/upload", files=files)
+    response.raise_for_status()
+    image_id = response.json()["image_id"]
+    response = await client.get(f"/products/search/{image_id}")
+    response.raise_for_status()
+
+async def one_shot(client: httpx.AsyncClient, image: bytes, index: int) -> None:
+    files = {"file": (f"bench_{index}.jpg", image, "image/jpeg")}
+    response = await client.post("/products/search", files=files)
+    response.raise_for_status()
+
+async def run_flow(client: httpx.AsyncClient, flow, images: List[bytes]) -> Dict[str, float]:
+    latencies = []
+    for index, image in enumerate(images):
+        start = time.perf_counter()
+        await flow(client, image, index)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+async def main(args: argparse.Namespace) -> None:
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, headers=headers, timeout=60.0)
+    else:
+        from app.db.database import init_db
+        from main import app
+        init_db()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://benchmark/api",
+            headers=headers,
+            timeout=60.0,
+        )
+
+    images = make_images(args.requests, args.image_size)
+    async with client:
+        # Warm up the model, index and caches
+        await one_shot(client, images[0], 0)
+        await two_step(client, images[0], 0)
+
+        results = {
+            "requests": args.requests,
+            "image_size": args.image_size,
+            "image_kb": float(np.mean([len(image) for image in images]) / 1024),
+            "two_step": await run_flow(client, two_step, images),
+            "one_shot": await run_flow(client, one_shot, images),
+        }
+    results["p50_speedup"] = results["two_step"]["p50_ms"] / results["one_shot"]["p50_ms"]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running API (default: in-process)")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--token", help="Access token to send with every request")
+    parser.add_argument("--image-size", type=int, default=640, help="Width and height of generated images")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,258 @@
+"""
+Multi-garment search: region proposal quality and cost per region.
+
+Generates outfit images with known garment boxes on a plain background:
+flat lays of 2-4 items (some striped) and figures wearing a top and
+trousers. Then:
+
+Proposal: for each proposer in --proposers, the share of garments found
+by a region with IoU >= --iou (recall), the share of regions that found
+one (precision), regions per image and milliseconds per image.
+
+Search: each outfit is searched once with /products/search/regions, and
+once the way users work around a single-garment search today, cropping
+each garment themselves and sending one /products/search per crop.
+Reports milliseconds per image and per region for both, and the stage
+costs the region search reports (proposal, embedding, search).
+
+Embedding (in-process only): the regions of each outfit embedded in one
+batched forward pass versus one forward pass per region.
+
+In-process runs use scratch storage with --catalog-size random vectors.
+
+Usage (from the backend directory):
+    python -m benchmarks.region_search --images 50
+    python -m benchmarks.region_search --url http://localhost:8000/api --images 50
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+import numpy as np
+from PIL import Image, ImageDraw
+
+Box = Tuple[int, int, int, int]
+
+BACKGROUND = (245, 245, 240)
+
+def random_colour(rng: np.random.Generator, avoid: List[Tuple[int, int, int]]) -> Tuple[int, int, int]:
+    """A colour far from the background and from the colours in `avoid`"""
+    while True:
+        colour = tuple(int(value) for value in rng.integers(0, 256, 3))
+        if all(np.linalg.norm(np.subtract(colour, other)) > 120 for other in [BACKGROUND] + avoid):
+            return colour
+
+def flat_lay(rng: np.random.Generator, size: int) -> Tuple[Image.Image, List[Box]]:
+    """Garments side by side, each in its own column"""
+    width, height = size, size * 3 // 4
+    image = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    count = int(rng.integers(2, 5))
+    column = width // count
+    boxes, colours = [], []
+    for index in range(count):
+        left = index * column + int(rng.integers(column // 10, column // 5))
+        right = (index + 1) * column - int(rng.integers(column // 10, column // 5))
+        top = int(rng.integers(height // 12, height // 4))
+        bottom = int(rng.integers(height * 3 // 4, height * 11 // 12))
+        colour = random_colour(rng, colours)
+        colours.append(colour)
+        if rng.random() < 0.5:
+            draw.rectangle((left, top, right, bottom), fill=colour)
+        else:
+            draw.ellipse((left, top, right, bottom), fill=colour)
+        if rng.random() < 0.3:
+            # Stripes in a shade of the garment's colour
+            shade = tuple(min(255, value + 40) for value in colour)
+            for y in range(top, bottom, 16):
+                draw.rectangle((left + 4, y, right - 4, y + 6), fill=shade)
+        boxes.append((left, top, right + 1, bottom + 1))
+    return image, boxes
+
+def figure(rng: np.random.Generator, size: int) -> Tuple[Image.Image, List[Box]]:
+    """A figure wearing a top and trousers"""
+    width, height = size * 2 // 3, size
+    image = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    centre = width // 2
+    top_colour = random_colour(rng, [])
+    bottom_colour = random_colour(rng, [top_colour])
+    draw.ellipse((centre - height // 14, height // 20, centre + height // 14, height // 5), fill=(215, 175, 145))
+    top = (centre - width // 4, height // 5, centre + width // 4, height // 2)
+    bottom = (centre - width // 5, height // 2, centre + width // 5, height * 9 // 10)
+    draw.rectangle(top, fill=top_colour)
+    draw.rectangle(bottom, fill=bottom_colour)
+    return image, [(x0, y0, x1 + 1, y1 + 1) for x0, y0, x1, y1 in (top, bottom)]
+
+def make_outfits(count: int, size: int, seed: int = 0) -> List[Tuple[Image.Image, List[Box]]]:
+    rng = np.random.default_rng(seed)
+    return [flat_lay(rng, size) if index % 3 else figure(rng, size) for index in range(count)]
+
+def iou(a: Box, b: Box) -> float:
+    width = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union else 0.0
+
+def jpeg(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def evaluate_proposers(outfits: List[Tuple[Image.Image, List[Box]]], args: argparse.Namespace) -> Dict[str, Any]:
+    from app.ml.region_proposal import get_region_proposer
+
+    results = {}
+    for name in args.proposers:
+        proposer = get_region_proposer(name)
+        found = garments = matched_regions = regions = 0
+        elapsed = 0.0
+        for image, boxes in outfits:
+            start = time.perf_counter()
+            proposed = proposer(image, args.max_regions)
+            elapsed += time.perf_counter() - start
+            garments += len(boxes)
+            regions += len(proposed)
+            found += sum(any(iou(region.box, box) >= args.iou for region in proposed) for box in boxes)
+            matched_regions += sum(any(iou(region.box, box) >= args.iou for box in boxes) for region in proposed)
+        results[name] = {
+            "recall": found / garments,
+            "precision": matched_regions / regions if regions else 0.0,
+            "regions_per_image": regions / len(outfits),
+            "ms_per_image": elapsed / len(outfits) * 1000,
+        }
+        print(json.dumps({"proposer": name, **results[name]}))
+    return results
+
+def compare_embedding(outfits: List[Tuple[Image.Image, List[Box]]], args: argparse.Namespace) -> Dict[str, Any]:
+    """One batched forward pass per image versus one per region, in-process"""
+    import torch
+    from app.ml.feature_extractor import get_feature_extractor
+    from app.ml.region_proposal import propose_regions
+
+    extractor = get_feature_extractor()
+    extractor.extract_region_features(outfits[0][0], args.max_regions)
+    batched = per_region = 0.0
+    region_count = 0
+    for image, _ in outfits:
+        regions = propose_regions(image, args.max_regions)
+        region_count += len(regions)
+        start = time.perf_counter()
+        extractor.encode_batches(torch.cat([extractor.prepare_region(image, region) for region in regions]))
+        batched += time.perf_counter() - start
+        start = time.perf_counter()
+        for region in regions:
+            extractor.encode_images(extractor.prepare_region(image, region))
+        per_region += time.perf_counter() - start
+    result = {
+        "batched_ms_per_region": batched / region_count * 1000,
+        "per_region_ms_per_region": per_region / region_count * 1000,
+        "speedup": per_region / batched,
+    }
+    print(json.dumps({"embedding": result}))
+    return result
+
+async def compare_search(
+    client: httpx.AsyncClient,
+    outfits: List[Tuple[Image.Image, List[Box]]],
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    """One region search per image versus one search per cropped garment"""
+    payloads = [(jpeg(image), [jpeg(image.crop(box)) for box in boxes]) for image, boxes in outfits]
+
+    # Warm up the model, index and caches
+    response = await client.post("/products/search/regions", files={"file": ("warmup.jpg", payloads[0][0], "image/jpeg")})
+    response.raise_for_status()
+
+    region_latencies, region_counts = [], []
+    costs: Dict[str, List[float]] = {}
+    for index, (outfit, _) in enumerate(payloads):
+        start = time.perf_counter()
+        response = await client.post(
+            "/products/search/regions",
+            params={"max_regions": args.max_regions},
+            files={"file": (f"outfit_{index}.jpg", outfit, "image/jpeg")},
+        )
+        response.raise_for_status()
+        region_latencies.append(time.perf_counter() - start)
+        body = response.json()
+        region_counts.append(len(body["regions"]))
+        for stage, value in body["cost_ms"].items():
+            costs.setdefault(stage, []).append(value)
+
+    crop_latencies, crop_counts = [], []
+    for index, (_, crops) in enumerate(payloads):
+        start = time.perf_counter()
+        for crop in crops:
+            response = await client.post("/products/search", files={"file": (f"crop_{index}.jpg", crop, "image/jpeg")})
+            response.raise_for_status()
+        crop_latencies.append(time.perf_counter() - start)
+        crop_counts.append(len(crops))
+
+    result = {
+        "region_search": {
+            "ms_per_image": statistics.mean(region_latencies) * 1000,
+            "ms_per_region": sum(region_latencies) / sum(region_counts) * 1000,
+            "regions_per_image": statistics.mean(region_counts),
+            "reported_cost_ms": {stage: statistics.mean(values) for stage, values in costs.items()},
+        },
+        "search_per_crop": {
+            "ms_per_image": statistics.mean(crop_latencies) * 1000,
+            "ms_per_region": sum(crop_latencies) / sum(crop_counts) * 1000,
+            "requests_per_image": statistics.mean(crop_counts),
+        },
+    }
+    print(json.dumps(result))
+    return result
+
+async def main(args: argparse.Namespace) -> None:
+    outfits = make_outfits(args.images, args.image_size, args.seed)
+    results: Dict[str, Any] = {"images": args.images, "garments": sum(len(boxes) for _, boxes in outfits)}
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, headers=headers, timeout=120.0)
+    else:
+        # Scratch storage with a synthetic catalog
+        workdir = Path(tempfile.mkdtemp(prefix="benchmark_regions_"))
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'regions.db'}"
+        os.environ["UPLOAD_FOLDER"] = str(workdir / "uploads")
+        os.environ["VECTOR_INDEX_PATH"] = str(workdir / "vector_index")
+        from benchmarks.suite import seed_catalog
+        from main import app
+        results["catalog"] = seed_catalog(args.catalog_size, args.seed)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://benchmark/api",
+            headers=headers,
+            timeout=120.0,
+        )
+
+    results["proposal"] = evaluate_proposers(outfits, args)
+    async with client:
+        results["search"] = await compare_search(client, outfits, args)
+    if not args.url:
+        results["embedding"] = compare_embedding(outfits, args)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="API base URL (default: run the app in-process)")
+    parser.add_argument("--token", help="Bearer token sent with every request")
+    parser.add_argument("--images", type=int, default=30)
+    parser.add_argument("--image-size", type=int, default=800)
+    parser.add_argument("--max-regions", type=int, default=4)
+    parser.add_argument("--proposers", nargs="*", default=["center", "saliency"], help="Registered proposers to evaluate")
+    parser.add_argument("--iou", type=float, default=0.5, help="Min IoU for a region to count as finding a garment")
+    parser.add_argument("--catalog-size", type=int, default=10_000, help="Vectors in the scratch index")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,189 @@
+"""
+Cold start and per-worker memory.
+
+Import: in fresh interpreters, times `import main`, reports the RSS after
+it and which heavy modules it pulled in, and times the first search
+(which loads torch, CLIP and the index on first use).
+
+Workers: starts serve.py with --workers N, preloading and with
+--no-preload, warms every worker up with searches, and reads RSS and PSS
+of the master and each worker from /proc/<pid>/smaps_rollup. PSS splits
+shared pages between the processes sharing them, so the sum over the
+processes is the real memory footprint.
+
+Both use scratch storage, with a synthetic catalog of --catalog-size
+vectors in the index. Linux only (/proc).
+
+Usage (from the backend directory):
+    python -m benchmarks.startup --workers 4 --catalog-size 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.one_shot_search import make_images
+
+HEAVY_MODULES = ["torch", "torchvision", "clip", "faiss"]
+
+IMPORT_PROBE = """
+import json, sys, time
+def rss_mb():
+    # Current RSS; ru_maxrss would include the parent's peak from before exec
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+start = time.perf_counter()
+import main
+import_s = time.perf_counter() - start
+result = {
+    "import_s": import_s,
+    "rss_after_import_mb": rss_mb(),
+    "heavy_modules_loaded": [name for name in %(heavy)r if name in sys.modules],
+}
+if %(search)r:
+    import asyncio, httpx
+    from app.db.database import init_db
+    init_db()
+    async def search():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark/api", timeout=300) as client:
+            start = time.perf_counter()
+            response = await client.post("/products/search", files={"file": ("a.jpg", open(%(image)r, "rb").read(), "image/jpeg")})
+            response.raise_for_status()
+            return time.perf_counter() - start
+    result["first_search_s"] = asyncio.run(search())
+    result["rss_after_first_search_mb"] = rss_mb()
+print(json.dumps(result))
+"""
+
+def memory_mb(pid: int) -> Dict[str, float]:
+    """Rss, Pss and private memory of a process, in MB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": fields.get("Rss", 0.0),
+        "pss_mb": fields.get("Pss", 0.0),
+        "private_mb": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+def child_pids(parent: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, so split after it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == parent:
+            children.append(int(entry))
+    return sorted(children)
+
+def measure_import(env: Dict[str, str], image_path: Path, runs: int) -> Dict[str, Any]:
+    samples = []
+    for run in range(runs):
+        probe = IMPORT_PROBE % {"heavy": HEAVY_MODULES, "search": run == 0, "image": str(image_path)}
+        output = subprocess.run(
+            [sys.executable, "-c", probe], env=env, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    result = dict(samples[0])
+    result["import_s"] = statistics.median(sample["import_s"] for sample in samples)
+    result["rss_after_import_mb"] = statistics.median(sample["rss_after_import_mb"] for sample in samples)
+    return result
+
+async def warm_up(url: str, image: bytes, requests: int) -> None:
+    """Searches from several connections, so every worker loads what it loads lazily"""
+    async def search() -> None:
+        async with httpx.AsyncClient(base_url=url, timeout=300.0) as client:
+            response = await client.post("/products/search", files={"file": ("a.jpg", image, "image/jpeg")})
+            response.raise_for_status()
+    await asyncio.gather(*(search() for _ in range(requests)))
+
+def measure_workers(env: Dict[str, str], image: bytes, args: argparse.Namespace, preload: bool) -> Dict[str, Any]:
+    command = [sys.executable, "serve.py", "--workers", str(args.workers), "--port", str(args.port),
+               "--host", "127.0.0.1", "--log-level", "warning"]
+    if not preload:
+        command.append("--no-preload")
+    start = time.perf_counter()
+    server = subprocess.Popen(command, env=env)
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"serve.py exited with status {server.returncode}")
+            try:
+                httpx.get(url + "/", timeout=1.0).raise_for_status()
+                break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        ready_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        asyncio.run(warm_up(url + "/api", image, args.workers * args.warmup_per_worker))
+        warm_up_s = time.perf_counter() - start
+
+        master = memory_mb(server.pid)
+        workers = [memory_mb(pid) for pid in child_pids(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    return {
+        "ready_s": ready_s,
+        "warm_up_s": warm_up_s,
+        "master": master,
+        "workers": workers,
+        "worker_rss_mb": statistics.mean(worker["rss_mb"] for worker in workers),
+        "worker_private_mb": statistics.mean(worker["private_mb"] for worker in workers),
+        "total_pss_mb": master["pss_mb"] + sum(worker["pss_mb"] for worker in workers),
+    }
+
+def main(args: argparse.Namespace) -> None:
+    # Scratch storage shared by this process and the servers it starts
+    workdir = Path(tempfile.mkdtemp(prefix="benchmark_startup_"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'startup.db'}"
+    os.environ["UPLOAD_FOLDER"] = str(workdir / "uploads")
+    os.environ["VECTOR_INDEX_PATH"] = str(workdir / "vector_index")
+    env = dict(os.environ)
+
+    from benchmarks.suite import seed_catalog
+    catalog = seed_catalog(args.catalog_size, seed=0)
+    image = make_images(1, args.image_size)[0]
+    image_path = workdir / "probe.jpg"
+    image_path.write_bytes(image)
+
+    results: Dict[str, Any] = {"catalog": catalog, "workers": args.workers}
+    results["import"] = measure_import(env, image_path, args.import_runs)
+    print(json.dumps(results["import"]))
+    for label, preload in (("preload", True), ("no_preload", False)):
+        results[label] = measure_workers(env, image, args, preload)
+        print(json.dumps({label: {key: value for key, value in results[label].items() if key != "workers"}}))
+    results["pss_saved_mb"] = results["no_preload"]["total_pss_mb"] - results["preload"]["total_pss_mb"]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--catalog-size", type=int, default=20_000, help="Vectors in the scratch index")
+    parser.add_argument("--import-runs", type=int, default=5, help="Fresh interpreters timing the import")
+    parser.add_argument("--warmup-per-worker", type=int, default=4, help="Warm-up searches per worker")
+    parser.add_argument("--image-size", type=int, default=640)
+    main(parser.parse_args())
@@ -0,0 +1,98 @@
+"""
+Time to first result for streamed versus buffered product search.
+
+Uploads generated images, then searches each one with the buffered
+/products/search/{image_id} endpoint and with its server-sent events
+variant /products/search/{image_id}/stream, reporting when the first
+ranking, the first product card and the final result arrive. With
+--refine the stream also waits for the re-ranking from augmented views.
+
+Usage (from the backend directory):
+    python -m benchmarks.stream_search --requests 50
+    python -m benchmarks.stream_search --url http://localhost:8000/api --requests 50 --refine
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.one_shot_search import make_images, percentiles
+
+async def upload(client: httpx.AsyncClient, image: bytes, index: int) -> str:
+    files = {"file": (f"bench_{index}.jpg", image, "image/jpeg")}
+    response = await client.post("/images/upload", files=files)
+    response.raise_for_status()
+    return response.json()["image_id"]
+
+async def buffered(client: httpx.AsyncClient, image_id: str, refine: bool) -> Dict[str, float]:
+    start = time.perf_counter()
+    response = await client.get(f"/products/search/{image_id}", params={"threshold": 0})
+    response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    return {"first_matches": elapsed, "first_product": elapsed, "done": elapsed}
+
+async def streamed(client: httpx.AsyncClient, image_id: str, refine: bool) -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    params = {"threshold": 0, "refine": refine}
+    start = time.perf_counter()
+    async with client.stream("GET", f"/products/search/{image_id}/stream", params=params) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("event: "):
+                continue
+            event = line[len("event: "):]
+            if event == "error":
+                raise RuntimeError("Search stream failed")
+            key = {"matches": "first_matches", "product": "first_product"}.get(event, event)
+            timings.setdefault(key, time.perf_counter() - start)
+    timings.setdefault("first_product", timings["done"])
+    return timings
+
+async def run_flow(client: httpx.AsyncClient, flow, image_ids: List[str], refine: bool) -> Dict[str, Dict[str, float]]:
+    samples: Dict[str, List[float]] = {}
+    for image_id in image_ids:
+        for key, value in (await flow(client, image_id, refine)).items():
+            samples.setdefault(key, []).append(value)
+    return {key: percentiles(values) for key, values in samples.items()}
+
+async def main(args: argparse.Namespace) -> None:
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, headers=headers, timeout=60.0)
+    else:
+        from app.db.database import init_db
+        from main import app
+        init_db()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://benchmark/api",
+            headers=headers,
+            timeout=60.0,
+        )
+
+    images = make_images(args.requests, args.image_size)
+    async with client:
+        image_ids = [await upload(client, image, index) for index, image in enumerate(images)]
+        # Warm up the model, index and caches
+        await buffered(client, image_ids[0], args.refine)
+        await streamed(client, image_ids[0], args.refine)
+
+        results = {
+            "requests": args.requests,
+            "refine": args.refine,
+            "buffered": await run_flow(client, buffered, image_ids, args.refine),
+            "streamed": await run_flow(client, streamed, image_ids, args.refine),
+        }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running API (default: in-process)")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--refine", action="store_true", help="Request the re-ranking from augmented views")
+    parser.add_argument("--token", help="Access token to send with every request")
+    parser.add_argument("--image-size", type=int, default=640, help="Width and height of generated images")
+    asyncio.run(main(parser.parse_args()))
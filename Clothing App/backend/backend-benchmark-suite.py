@@ -0,0 +1,305 @@
+"""
+End-to-end benchmark suite against a synthetic catalog.
+
+Seeds a scratch database with a generated catalog (products from
+benchmarks.generate_catalog, each with a random unit feature vector),
+builds the VectorSearch index from it, and drives the app in-process or
+a running API over HTTP through these scenarios, in order:
+
+  upload           POST /images/upload with generated images
+  search           GET /products/search/{image_id} for the uploaded images
+  one_shot_search  POST /products/search
+  product_details  GET /products/{product_id} for matched products
+  history          GET /products/history for the benchmark user
+
+Each scenario runs --requests requests from --concurrency clients back to
+back and reports throughput, p50/p95/p99 latency and the peak RSS of the
+process serving it (this process in-process, or --server-pid over HTTP).
+Results are written as JSON with the run's parameters; pass a previous
+results file as --baseline to print the change per scenario.
+
+Usage (from the backend directory):
+    python -m benchmarks.suite --catalog-size 20000 --requests 200 --output results.json
+    python -m benchmarks.suite --catalog-size 20000 --seed-only
+    python -m benchmarks.suite --url http://localhost:8000/api --server-pid 1234 --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.one_shot_search import make_images, percentiles
+
+VECTOR_DIM = 512
+SCENARIOS = ["upload", "search", "one_shot_search", "product_details", "history"]
+
+def read_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Current resident set size of a process (default: this one), None if unknown"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+class RssSampler:
+    """
+    Sample a process's RSS in a background thread and keep the peak. Where
+    /proc is unavailable, falls back to this process's lifetime peak.
+    """
+
+    def __init__(self, pid: Optional[int] = None, interval: float = 0.01):
+        self.pid = pid
+        self.interval = interval
+        self.peak_mb: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> None:
+        rss = read_rss_mb(self.pid)
+        if rss is not None:
+            self.peak_mb = max(self.peak_mb or 0.0, rss)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> "RssSampler":
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        if self.peak_mb is None and self.pid is None:
+            # ru_maxrss is in kilobytes on Linux
+            self.peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def random_unit_vectors(count: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, VECTOR_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def seed_catalog(size: int, seed: int) -> Dict[str, Any]:
+    """
+    Replace the products in the configured database with a synthetic
+    catalog and rebuild the vector index from it.
+    """
+    from app.db.database import Base, SessionLocal, engine
+    from app.db.models import Product
+    from app.ml.vector_search import get_vector_search
+    from benchmarks.generate_catalog import generate_products
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.query(Product).delete()
+        start = time.perf_counter()
+        vectors = random_unit_vectors(size, seed)
+        rows = [
+            {
+                "external_id": product["external_id"],
+                "brand": product["brand"],
+                "name": product["name"],
+                "category": product["category"],
+                "description": product["description"],
+                "price": product["price"],
+                "currency": product["currency"],
+                "image_url": product["image_url"],
+                "product_url": product["product_url"],
+                "feature_vector": json.dumps(vector.tolist()),
+            }
+            for product, vector in zip(generate_products(size, seed), vectors)
+        ]
+        db.bulk_insert_mappings(Product, rows)
+        db.commit()
+        insert_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        get_vector_search().update_index_from_db(db)
+        index_s = time.perf_counter() - start
+    finally:
+        db.close()
+    return {"products": size, "insert_s": insert_s, "index_build_s": index_s}
+
+async def run_scenario(
+    request: Callable[[int], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+    server_pid: Optional[int],
+) -> Dict[str, Any]:
+    """Send `requests` requests from `concurrency` closed-loop clients"""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    next_index = iter(range(requests))
+
+    async def client() -> None:
+        for index in next_index:
+            start = time.perf_counter()
+            try:
+                response = await request(index)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    with RssSampler(server_pid) as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": requests / elapsed,
+        **percentiles(latencies),
+        "peak_rss_mb": rss.peak_mb,
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Relative change per scenario against a previous run (positive: more)"""
+    changes = {}
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        changes[name] = {
+            key: current[key] / previous[key] - 1
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+            if current.get(key) and previous.get(key)
+        }
+    return changes
+
+async def main(args: argparse.Namespace) -> None:
+    results: Dict[str, Any] = {
+        "started_at": datetime.utcnow().isoformat(),
+        "mode": "http" if args.url else "in-process",
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "args": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+    }
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120.0)
+    else:
+        results["catalog"] = seed_catalog(args.catalog_size, args.seed)
+        from main import app
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://benchmark/api", timeout=120.0
+        )
+    results["rss_before_mb"] = read_rss_mb(args.server_pid)
+
+    rng = random.Random(args.seed)
+    images = make_images(args.requests, args.image_size, seed=args.seed)
+    image_ids: List[Optional[str]] = [None] * args.requests
+    product_ids: List[str] = []
+    search_params = {"limit": 10, "threshold": 0}
+
+    async with client:
+        # A fresh user, so searches are recorded and history has pages to read
+        email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+        password = uuid.uuid4().hex
+        response = await client.post("/auth/register", json={"email": email, "password": password})
+        response.raise_for_status()
+        response = await client.post("/auth/login", data={"username": email, "password": password})
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        async def upload(index: int) -> httpx.Response:
+            files = {"file": (f"bench_{index}.jpg", images[index], "image/jpeg")}
+            response = await client.post("/images/upload", files=files)
+            if response.status_code == 200:
+                image_ids[index] = response.json()["image_id"]
+            return response
+
+        async def search(index: int) -> httpx.Response:
+            response = await client.get(f"/products/search/{image_ids[index]}", params=search_params)
+            if response.status_code == 200:
+                product_ids.extend(match["product_id"] for match in response.json()["matches"])
+            return response
+
+        async def one_shot_search(index: int) -> httpx.Response:
+            files = {"file": (f"bench_{index}.jpg", images[index], "image/jpeg")}
+            return await client.post("/products/search", files=files, params=search_params)
+
+        async def product_details(index: int) -> httpx.Response:
+            return await client.get(f"/products/{rng.choice(product_ids)}")
+
+        async def history(index: int) -> httpx.Response:
+            return await client.get("/products/history", params={"limit": 10})
+
+        # Warm up the model, index and caches outside of the measurements
+        warmup = make_images(1, args.image_size, seed=args.seed + 1)[0]
+        await client.post("/products/search", files={"file": ("warmup.jpg", warmup, "image/jpeg")})
+
+        flows = {
+            "upload": upload,
+            "search": search,
+            "one_shot_search": one_shot_search,
+            "product_details": product_details,
+            "history": history,
+        }
+        results["scenarios"] = {}
+        for name in args.scenarios:
+            if name == "search" and not any(image_ids):
+                # Searching by ID needs the uploads; run them unmeasured
+                await asyncio.gather(*(upload(index) for index in range(args.requests)))
+            if name == "product_details" and not product_ids:
+                # External IDs of the synthetic catalog, stable across reseeds
+                product_ids.extend(str(1_000_000 + index) for index in range(1, args.catalog_size + 1))
+            results["scenarios"][name] = await run_scenario(
+                flows[name], args.requests, args.concurrency, args.server_pid
+            )
+            print(f"{name}: {json.dumps(results['scenarios'][name])}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["change_vs_baseline"] = compare(results, json.load(f))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running API (default: in-process)")
+    parser.add_argument("--server-pid", type=int, help="PID of the API server, to sample its RSS over HTTP")
+    parser.add_argument("--catalog-size", type=int, default=20_000, help="Products in the synthetic catalog")
+    parser.add_argument("--seed-only", action="store_true", help="Replace the products in the configured database and index, then exit")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Clients sending requests back to back")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--image-size", type=int, default=640, help="Width and height of generated images")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    if args.seed_only:
+        print(json.dumps(seed_catalog(args.catalog_size, args.seed), indent=2))
+    else:
+        if not args.url:
+            # Point the in-process app at scratch storage before its settings are
+            # loaded, so seeding never replaces the products of a real database
+            workdir = tempfile.mkdtemp(prefix="benchmark_suite_")
+            os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/suite.db"
+            os.environ["UPLOAD_FOLDER"] = f"{workdir}/uploads"
+            os.environ["VECTOR_INDEX_PATH"] = f"{workdir}/vector_index"
+        asyncio.run(main(args))
@@ -0,0 +1,133 @@
+"""
+Peak memory and time per upload, buffered versus streamed.
+
+For each file size, an upload is saved the old way (`await file.read()`
+and then a write of the whole bytes object) and streamed into the
+upload store, measuring the peak of Python allocations with tracemalloc.
+Both start from an UploadFile that already holds the whole file, as
+Starlette's form parser hands it to a route: receiving and spooling the
+request happens before either and is not measured.
+
+Oversized requests are then sent to the app in-process, with and
+without a Content-Length header, to measure how quickly they are
+rejected and how much is allocated before that. That early rejection is
+the body size middleware's, before the form is parsed.
+
+Usage (from the backend directory):
+    python -m benchmarks.upload_memory --sizes 1 4 16
+"""
+import argparse
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+import httpx
+import numpy as np
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+from app.core.config import settings
+from app.services.image_store import ImageStore
+
+MB = 1024 * 1024
+
+def make_upload_bytes(size: int) -> bytes:
+    """A valid JPEG padded to `size` bytes (data after the end marker is ignored)"""
+    buffer = io.BytesIO()
+    pixels = np.random.default_rng(0).integers(0, 256, (512, 512, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(buffer, format="JPEG")
+    data = buffer.getvalue()
+    return data + b"\0" * max(0, size - len(data))
+
+def make_upload_file(data: bytes) -> UploadFile:
+    """An UploadFile spooled like Starlette's multipart parser does"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=MB)
+    spooled.write(data)
+    spooled.seek(0)
+    return UploadFile(spooled, filename="bench.jpg")
+
+async def measure(func: Callable[[], Awaitable[Any]]) -> Dict[str, float]:
+    """Run a coroutine function, reporting wall time and peak allocations"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    await func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": elapsed * 1000, "peak_mb": peak / MB}
+
+async def buffered_save(file: UploadFile) -> None:
+    content = await file.read()
+    with open(settings.UPLOAD_FOLDER / "bench_buffered.jpg", "wb") as f:
+        f.write(content)
+
+async def streamed_save(file: UploadFile) -> None:
+    await ImageStore(settings.UPLOAD_FOLDER).put_upload(file)
+
+MULTIPART_HEAD = (
+    b"--bench\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.jpg\"\r\n"
+    b"Content-Type: image/jpeg\r\n\r\n"
+)
+MULTIPART_TAIL = b"\r\n--bench--\r\n"
+
+async def multipart_body(size: int) -> AsyncIterator[bytes]:
+    """Stream a multipart body, so the benchmark never holds it in memory"""
+    yield MULTIPART_HEAD
+    chunk = b"\0" * MB
+    for _ in range(size // MB):
+        yield chunk
+    yield MULTIPART_TAIL
+
+async def oversized_request(client: httpx.AsyncClient, size: int, declared: bool) -> int:
+    headers = {"Content-Type": "multipart/form-data; boundary=bench"}
+    if declared:
+        headers["Content-Length"] = str(len(MULTIPART_HEAD) + size // MB * MB + len(MULTIPART_TAIL))
+    response = await client.post("/api/images/upload", content=multipart_body(size), headers=headers)
+    return response.status_code
+
+async def main(args: argparse.Namespace) -> None:
+    settings.UPLOAD_FOLDER = Path(tempfile.mkdtemp())
+
+    results: Dict[str, Any] = {"uploads": [], "oversized": []}
+    for size_mb in args.sizes:
+        data = make_upload_bytes(int(size_mb * MB))
+        buffered_file, streamed_file = make_upload_file(data), make_upload_file(data)
+        del data
+        results["uploads"].append({
+            "size_mb": size_mb,
+            "buffered": await measure(lambda: buffered_save(buffered_file)),
+            "streamed": await measure(lambda: streamed_save(streamed_file)),
+        })
+
+    from main import app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120.0) as client:
+        for declared in (True, False):
+            status_codes: List[int] = []
+
+            async def send() -> None:
+                status_codes.append(await oversized_request(client, int(args.oversized * MB), declared))
+
+            result = await measure(send)
+            results["oversized"].append({
+                "size_mb": args.oversized,
+                "content_length": declared,
+                "status": status_codes[0],
+                **result,
+            })
+
+    shutil.rmtree(settings.UPLOAD_FOLDER)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="Upload sizes in MB")
+    parser.add_argument("--oversized", type=float, default=256, help="Oversized request size in MB")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class LoadCancelledError(Exception):
+    """Set on a shared load whose caller was cancelled, so callers waiting on it load again"""
+
+class CacheEntry:
+    __slots__ = ("value", "expires_at", "stale_until")
+
+    def __init__(self, value: Any, expires_at: float, stale_until: float):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+class TTLCache:
+    """
+    Size-bounded LRU cache with per-entry TTLs and stale-while-revalidate.
+
+    Within its TTL an entry is fresh and served directly. For `stale_ttl`
+    seconds after that it is stale: it is still served, while a single
+    background refresh replaces it. Concurrent misses for the same key
+    share one load; if the caller running it is cancelled, one of the
+    waiting callers starts a new load. Expired entries stay available through `peek` as
+    last-resort data until they are evicted.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, stale_ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Hashable, "asyncio.Future"] = {}
+        self._refreshes: Set["asyncio.Task"] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries"""
+        now = time.monotonic()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self._entries[key] = CacheEntry(value, expires_at, expires_at + self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_fresh(self, key: Hashable) -> Optional[Any]:
+        """Get a value only if it is still within its TTL"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry.expires_at:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Get a value regardless of age, without touching statistics"""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one entry, or all of them if no key is given"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """
+        Get a value, loading it on a miss.
+
+        Args:
+            key: Cache key
+            loader: Coroutine function producing the value. None results
+                are returned but not cached.
+            ttl: TTL for a newly loaded value (defaults to the cache TTL)
+
+        Returns:
+            The cached or loaded value
+
+        Raises:
+            Whatever the loader raises on a miss. Failed background
+            refreshes are logged and keep the stale value.
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry.expires_at:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+        if entry is not None and now < entry.stale_until:
+            self.stale_hits += 1
+            self._entries.move_to_end(key)
+            if key not in self._inflight:
+                task = asyncio.ensure_future(self._load(key, loader, ttl))
+                self._refreshes.add(task)
+                task.add_done_callback(self._refresh_done)
+            return entry.value
+
+        self.misses += 1
+        return await self._load(key, loader, ttl)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        """Load a value, collapsing concurrent loads of the same key"""
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except LoadCancelledError:
+                # The caller running the load was cancelled, not this one
+                return await self._load(key, loader, ttl)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.loads += 1
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.set_exception(LoadCancelledError(f"Load of {key!r} was cancelled"))
+            future.exception()
+            raise
+        except Exception as e:
+            self.load_errors += 1
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            if value is not None:
+                self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def _refresh_done(self, task: "asyncio.Task") -> None:
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background cache refresh failed: {task.exception()}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics for monitoring"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+        }
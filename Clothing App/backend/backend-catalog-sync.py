@@ -0,0 +1,353 @@
+"""
+Incremental sync of the e-commerce catalog into Product rows and the vector index.
+
+Usage (from the backend directory):
+    python -m app.services.catalog_sync
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Any, Optional
+
+import numpy as np
+from sqlalchemy import delete, or_, select, update
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import Product
+from app.ml.vector_search import VectorSearch, get_vector_search
+from app.services.http_client import ResilientHttpClient
+from app.services.product_cache import get_product_cache
+
+logger = logging.getLogger(__name__)
+
+# Upstream fields copied onto Product rows; a change to any of them is an update
+SYNCED_FIELDS = ("brand", "name", "category", "description", "price", "currency", "image_url", "product_url")
+
+def content_hash(item: Dict[str, Any]) -> str:
+    """Hash the synced fields of an upstream product"""
+    data = json.dumps({field: item.get(field) for field in SYNCED_FIELDS}, sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp from the upstream API"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+class RateLimiter:
+    """Space calls out to at most `rate` per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_call = 0.0
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        if now < self._next_call:
+            await asyncio.sleep(self._next_call - now)
+        self._next_call = max(now, self._next_call) + self.interval
+
+@dataclass
+class SyncStats:
+    pages: int = 0
+    seen: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    embedded: int = 0
+    embed_failures: int = 0
+
+class CatalogSync:
+    """
+    Pages through the upstream catalog and applies the differences.
+
+    Products are matched by external ID. Unchanged products are detected by
+    their upstream updated_at or, failing that, a content hash, and are only
+    marked as seen. New and changed products are written with bulk inserts and
+    updates, and only those whose image changed are re-embedded; the vector
+    index receives just that delta. A product whose new image cannot be
+    embedded loses its old vector, so it stops matching on the old image and
+    is retried on the next run. Products not seen during a complete pass
+    are deleted. Progress is checkpointed so an interrupted run resumes from
+    its last page.
+
+    The index and product cache updated here are this process's; API
+    processes pick up the saved index (and drop their cached products) within
+    VECTOR_INDEX_RELOAD_INTERVAL of a checkpoint or the end of the run.
+    """
+
+    def __init__(
+        self,
+        client: ResilientHttpClient,
+        vector_search: Optional[VectorSearch] = None,
+        embed_image: Optional[Callable[[str], Awaitable[Optional[np.ndarray]]]] = None,
+        page_size: int = settings.CATALOG_SYNC_PAGE_SIZE,
+        rate_limit: float = settings.CATALOG_SYNC_RATE_LIMIT,
+        checkpoint_path: Path = settings.CATALOG_SYNC_CHECKPOINT_PATH,
+        checkpoint_pages: int = settings.CATALOG_SYNC_CHECKPOINT_PAGES,
+    ):
+        """
+        Args:
+            client: Client for the e-commerce API
+            vector_search: Index to update (defaults to the shared index)
+            embed_image: Coroutine function returning the feature vector for
+                an image URL, or None if it cannot be embedded (defaults to
+                downloading the image and running the feature extractor)
+            page_size: Products requested per page
+            rate_limit: Maximum page requests per second
+            checkpoint_path: File recording the progress of the current run
+            checkpoint_pages: Pages between checkpoints
+        """
+        self.client = client
+        self.vector_search = vector_search or get_vector_search()
+        self.embed_image = embed_image or self._download_and_embed
+        self.page_size = page_size
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.checkpoint_path = Path(checkpoint_path)
+        self.checkpoint_pages = checkpoint_pages
+        self._embed_semaphore = asyncio.Semaphore(settings.CATALOG_SYNC_EMBED_CONCURRENCY)
+
+    async def run(self) -> SyncStats:
+        """Run (or resume) one full sync pass"""
+        checkpoint = self._load_checkpoint()
+        if checkpoint:
+            run_started_at = datetime.fromisoformat(checkpoint["run_started_at"])
+            cursor = checkpoint["cursor"]
+            stats = SyncStats(**checkpoint["stats"])
+            logger.info(f"Resuming catalog sync from page {stats.pages}")
+        else:
+            run_started_at = datetime.utcnow()
+            cursor = None
+            stats = SyncStats()
+
+        while True:
+            await self.rate_limiter.wait()
+            page = await self._fetch_page(cursor)
+            await self._apply_page(page.get("items", []), run_started_at, stats)
+            stats.pages += 1
+
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+            if stats.pages % self.checkpoint_pages == 0:
+                self.vector_search.save_index()
+                self._save_checkpoint(run_started_at, cursor, stats)
+
+        # The pass is complete, so anything not seen was deleted upstream
+        await self._delete_unseen(run_started_at, stats)
+        self.vector_search.save_index()
+        self._clear_checkpoint()
+
+        logger.info(f"Catalog sync finished: {asdict(stats)}")
+        return stats
+
+    async def _fetch_page(self, cursor: Optional[str]) -> Dict[str, Any]:
+        params = {"page_size": self.page_size}
+        if cursor:
+            params["cursor"] = cursor
+        response = await self.client.get(settings.ECOMMERCE_CATALOG_PATH, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def _apply_page(self, items: List[Dict[str, Any]], run_started_at: datetime, stats: SyncStats) -> None:
+        """Diff one page against the database and apply the changes"""
+        items_by_external_id = {
+            str(item.get("external_id") or item["id"]): item for item in items
+        }
+        stats.seen += len(items_by_external_id)
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    Product.id, Product.external_id, Product.content_hash,
+                    Product.source_updated_at, Product.image_url, Product.feature_vector.is_(None),
+                ).where(Product.external_id.in_(list(items_by_external_id)))
+            )
+            existing = {row[1]: row for row in result.all()}
+
+            inserts: List[Dict[str, Any]] = []
+            updates: List[Dict[str, Any]] = []
+            unchanged_ids: List[int] = []
+            to_embed: List[Dict[str, Any]] = []
+
+            for external_id, item in items_by_external_id.items():
+                source_updated_at = parse_timestamp(item.get("updated_at"))
+                row = existing.get(external_id)
+                if row is not None:
+                    product_id, _, old_hash, old_updated_at, old_image_url, missing_vector = row
+                    if source_updated_at and source_updated_at == old_updated_at and old_hash and not missing_vector:
+                        unchanged_ids.append(product_id)
+                        continue
+                    new_hash = content_hash(item)
+                    if new_hash == old_hash and not missing_vector:
+                        unchanged_ids.append(product_id)
+                        continue
+                    # Changed, or an earlier embedding failed and is retried
+                    mapping = self._to_row(external_id, item, new_hash, source_updated_at, run_started_at)
+                    mapping["id"] = product_id
+                    updates.append(mapping)
+                    if missing_vector or item.get("image_url") != old_image_url:
+                        to_embed.append(mapping)
+                else:
+                    mapping = self._to_row(external_id, item, content_hash(item), source_updated_at, run_started_at)
+                    inserts.append(mapping)
+                    to_embed.append(mapping)
+
+            # Only products whose image changed are re-embedded
+            vectors = await asyncio.gather(*(self._embed(mapping["image_url"]) for mapping in to_embed))
+            embedded = []
+            for mapping, vector in zip(to_embed, vectors):
+                if vector is not None:
+                    mapping["feature_vector"] = json.dumps(vector.tolist())
+                    embedded.append((mapping, vector))
+                else:
+                    # Clear any vector of the old image; a missing vector is retried next run
+                    mapping["feature_vector"] = None
+                    stats.embed_failures += 1
+            stats.embedded += len(embedded)
+
+            def write(session) -> None:
+                if inserts:
+                    session.bulk_insert_mappings(Product, inserts, return_defaults=True)
+                if updates:
+                    session.bulk_update_mappings(Product, updates)
+
+            await db.run_sync(write)
+            if unchanged_ids:
+                await db.execute(
+                    update(Product).where(Product.id.in_(unchanged_ids)).values(last_synced_at=run_started_at)
+                )
+            await db.commit()
+
+        # Apply the delta to the vector index and drop stale cached metadata
+        # (inserted mappings received their IDs from the bulk insert)
+        self.vector_search.apply_delta(
+            {mapping["id"]: vector for mapping, vector in embedded},
+            [mapping["id"] for mapping in updates if "feature_vector" in mapping and mapping["feature_vector"] is None],
+        )
+        product_cache = get_product_cache()
+        for mapping in updates:
+            product_cache.invalidate(mapping["id"])
+
+        stats.created += len(inserts)
+        stats.updated += len(updates)
+        stats.unchanged += len(unchanged_ids)
+
+    async def _delete_unseen(self, run_started_at: datetime, stats: SyncStats) -> None:
+        """Delete products that were not seen during the completed pass"""
+        async with AsyncSessionLocal() as db:
+            unseen = or_(Product.last_synced_at.is_(None), Product.last_synced_at < run_started_at)
+            result = await db.execute(
+                select(Product.id).where(Product.external_id.isnot(None), unseen)
+            )
+            removed_ids = [row[0] for row in result.all()]
+            if removed_ids:
+                await db.execute(delete(Product).where(Product.id.in_(removed_ids)))
+                await db.commit()
+
+        self.vector_search.apply_delta({}, removed_ids)
+        product_cache = get_product_cache()
+        for product_id in removed_ids:
+            product_cache.invalidate(product_id)
+        stats.deleted += len(removed_ids)
+
+    @staticmethod
+    def _to_row(
+        external_id: str,
+        item: Dict[str, Any],
+        item_hash: str,
+        source_updated_at: Optional[datetime],
+        run_started_at: datetime,
+    ) -> Dict[str, Any]:
+        row = {field: item.get(field) for field in SYNCED_FIELDS}
+        row.update({
+            "external_id": external_id,
+            "content_hash": item_hash,
+            "source_updated_at": source_updated_at,
+            "last_synced_at": run_started_at,
+        })
+        return row
+
+    async def _embed(self, image_url: Optional[str]) -> Optional[np.ndarray]:
+        if not image_url:
+            return None
+        async with self._embed_semaphore:
+            try:
+                return await self.embed_image(image_url)
+            except Exception as e:
+                logger.warning(f"Error embedding {image_url}: {str(e)}")
+                return None
+
+    async def _download_and_embed(self, image_url: str) -> Optional[np.ndarray]:
+        """Download a product image and extract its clothing features"""
+        from app.ml.feature_extractor import get_feature_extractor
+
+        response = await self.client.get(image_url)
+        if response.status_code != 200:
+            return None
+
+        def extract() -> np.ndarray:
+            with tempfile.NamedTemporaryFile(suffix=Path(image_url).suffix or ".jpg") as f:
+                f.write(response.content)
+                f.flush()
+                return get_feature_extractor().extract_clothing_features(f.name)
+
+        return await run_in_threadpool(extract)
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        if not self.checkpoint_path.exists():
+            return None
+        with open(self.checkpoint_path, "r") as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, run_started_at: datetime, cursor: str, stats: SyncStats) -> None:
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.checkpoint_path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({
+                "run_started_at": run_started_at.isoformat(),
+                "cursor": cursor,
+                "stats": asdict(stats),
+            }, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _clear_checkpoint(self) -> None:
+        self.checkpoint_path.unlink(missing_ok=True)
+
+def create_catalog_sync() -> CatalogSync:
+    """Create a catalog sync for the configured e-commerce API"""
+    if not settings.ECOMMERCE_API_URL:
+        raise ValueError("ECOMMERCE_API_URL must be set to sync the catalog")
+    headers = {"Authorization": f"Bearer {settings.ECOMMERCE_API_KEY}"} if settings.ECOMMERCE_API_KEY else {}
+    client = ResilientHttpClient(
+        settings.ECOMMERCE_API_URL,
+        headers=headers,
+        timeout=settings.ECOMMERCE_TIMEOUT,
+        max_retries=settings.ECOMMERCE_MAX_RETRIES,
+    )
+    return CatalogSync(client)
+
+async def main() -> None:
+    catalog_sync = create_catalog_sync()
+    try:
+        stats = await catalog_sync.run()
+    finally:
+        await catalog_sync.client.aclose()
+    print(json.dumps(asdict(stats), indent=2))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
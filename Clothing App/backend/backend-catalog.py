@@ -0,0 +1,194 @@
+import json
+import logging
+import re
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Products served when no catalog file is available
+DEFAULT_PRODUCTS = [
+    {
+        "id": "clothing_1",
+        "external_id": "12345",
+        "brand": "FashionBrand",
+        "name": "Classic White T-Shirt",
+        "category": "Shirts",
+        "description": "A comfortable classic white t-shirt made from 100% cotton.",
+        "price": 19.99,
+        "currency": "USD",
+        "image_url": "https://example.com/images/white-tshirt.jpg",
+        "product_url": "https://example.com/products/white-tshirt"
+    },
+    {
+        "id": "clothing_2",
+        "external_id": "23456",
+        "brand": "DenimCo",
+        "name": "Slim Fit Jeans",
+        "category": "Pants",
+        "description": "Stylish slim fit jeans in dark blue wash.",
+        "price": 49.99,
+        "currency": "USD",
+        "image_url": "https://example.com/images/slim-jeans.jpg",
+        "product_url": "https://example.com/products/slim-jeans"
+    },
+    {
+        "id": "clothing_3",
+        "external_id": "34567",
+        "brand": "SportyLife",
+        "name": "Athletic Jacket",
+        "category": "Outerwear",
+        "description": "Lightweight athletic jacket perfect for running and workouts.",
+        "price": 59.99,
+        "currency": "USD",
+        "image_url": "https://example.com/images/athletic-jacket.jpg",
+        "product_url": "https://example.com/products/athletic-jacket"
+    },
+    {
+        "id": "clothing_4",
+        "external_id": "45678",
+        "brand": "LuxuryWear",
+        "name": "Cashmere Sweater",
+        "category": "Sweaters",
+        "description": "Premium cashmere sweater in navy blue.",
+        "price": 129.99,
+        "currency": "USD",
+        "image_url": "https://example.com/images/cashmere-sweater.jpg",
+        "product_url": "https://example.com/products/cashmere-sweater"
+    },
+    {
+        "id": "clothing_5",
+        "external_id": "56789",
+        "brand": "StreetStyle",
+        "name": "Graphic Hoodie",
+        "category": "Sweatshirts",
+        "description": "Urban graphic hoodie with street art design.",
+        "price": 39.99,
+        "currency": "USD",
+        "image_url": "https://example.com/images/graphic-hoodie.jpg",
+        "product_url": "https://example.com/products/graphic-hoodie"
+    },
+]
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+class CatalogStore:
+    """
+    In-memory product catalog used as the local stand-in for the e-commerce API.
+    Products are indexed by `id` and `external_id` for constant-time lookups,
+    and by the tokens of their brand, name and description for text search.
+    """
+
+    def __init__(self, products: Optional[Iterable[Dict[str, Any]]] = None):
+        self.products: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, int] = {}
+        self._by_external_id: Dict[str, int] = {}
+        # Token -> positions of matching products, in ascending order
+        self._postings: Dict[str, List[int]] = {}
+        if products:
+            self.add_many(products)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "CatalogStore":
+        """
+        Load a catalog from a JSON Lines or Parquet file.
+
+        Args:
+            path: Path to a .jsonl or .parquet file
+
+        Returns:
+            Loaded catalog store
+        """
+        path = Path(path)
+        if path.suffix == ".parquet":
+            # Optional dependency, only needed for Parquet catalogs
+            import pyarrow.parquet as pq
+            return cls(pq.read_table(path).to_pylist())
+
+        def read_lines():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+        return cls(read_lines())
+
+    def add_many(self, products: Iterable[Dict[str, Any]]) -> None:
+        """Add products to the catalog and its indexes"""
+        for product in products:
+            position = len(self.products)
+            self.products.append(product)
+            if product.get("id"):
+                self._by_id[str(product["id"])] = position
+            if product.get("external_id"):
+                self._by_external_id[str(product["external_id"])] = position
+
+            text = " ".join(product.get(field) or "" for field in ("brand", "name", "description"))
+            for token in set(tokenize(text)):
+                self._postings.setdefault(token, []).append(position)
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """Get a product by ID or external ID"""
+        position = self._by_id.get(product_id)
+        if position is None:
+            position = self._by_external_id.get(product_id)
+        return self.products[position] if position is not None else None
+
+    def head(self, limit: int) -> List[Dict[str, Any]]:
+        """Get the first products of the catalog"""
+        return self.products[:limit]
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Find products whose brand, name or description contain every query token.
+
+        Args:
+            query: Search query
+            limit: Maximum number of results
+
+        Returns:
+            Matching products in catalog order
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+
+        postings = sorted((self._postings.get(token, []) for token in tokens), key=len)
+        if not postings[0]:
+            return []
+
+        # Walk the shortest posting list and binary-search the others
+        results = []
+        for position in postings[0]:
+            if all(self._contains(posting, position) for posting in postings[1:]):
+                results.append(self.products[position])
+                if len(results) >= limit:
+                    break
+        return results
+
+    @staticmethod
+    def _contains(posting: List[int], position: int) -> bool:
+        index = bisect_left(posting, position)
+        return index < len(posting) and posting[index] == position
+
+# Singleton instance of the catalog store
+_catalog_store = None
+
+def get_catalog_store() -> CatalogStore:
+    """Get singleton instance of CatalogStore, loading it on first use"""
+    global _catalog_store
+    if _catalog_store is None:
+        if settings.CATALOG_PATH.exists():
+            _catalog_store = CatalogStore.load(settings.CATALOG_PATH)
+            logger.info(f"Loaded catalog with {len(_catalog_store)} products from {settings.CATALOG_PATH}")
+        else:
+            _catalog_store = CatalogStore(DEFAULT_PRODUCTS)
+    return _catalog_store
@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 from pydantic import BaseSettings
 
 class Settings(BaseSettings):
@@ -14,21 +14,126 @@ class Settings(BaseSettings):
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "developmentsecretkey")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    AUTH_CACHE_TTL: float = 30.0  # Seconds a verified token and its user are trusted (0 to disable)
+    AUTH_CACHE_SIZE: int = 10000  # Max tokens and users cached
+    
+    # Password hashing
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # bcrypt cost; existing hashes are upgraded on login
+    PASSWORD_HASH_CONCURRENCY: int = 1  # Hashes computed at once, each takes a full core
+    PASSWORD_HASH_QUEUE_SIZE: int = 64  # Max logins and registrations waiting to hash
+    PASSWORD_HASH_DEADLINE: float = 5.0  # Max seconds to wait for the hashing pool
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/clothing_app")
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")  # Derived from DATABASE_URL if empty
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # Seconds to wait for a free connection
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
     
     # ML Model
     MODEL_PATH: Path = Path("app/ml/models")
+    CLIP_MODEL: str = "ViT-B/32"  # CLIP model name, or a checkpoint path as clip.load accepts
+    MODEL_OFFLINE: bool = False  # Require the exported artifact in MODEL_PATH instead of downloading
+    MODEL_VERIFY_CHECKSUM: bool = True  # Check the artifact's SHA-256 before loading it
     UPLOAD_FOLDER: Path = Path("uploads")
     MAX_CONTENT_LENGTH: int = 16 * 1024 * 1024  # 16MB max upload size
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bytes read from an upload at a time
+    UPLOAD_HEADER_LIMIT: int = 1024 * 1024  # Max bytes read to find image dimensions
+    UPLOAD_FORM_OVERHEAD: int = 64 * 1024  # Allowance for multipart framing and form fields
+    MIN_IMAGE_SIZE: int = 32  # Min width and height in pixels
+    MAX_IMAGE_PIXELS: int = 40_000_000  # Max width x height, guards against decompression bombs
+    UPLOAD_DERIVATIVE_SIZE: int = 336  # Longest side of the resized copy used for processing
+    UPLOAD_DERIVATIVE_QUALITY: int = 90  # JPEG quality of the resized copy
+    UPLOAD_RETENTION_HOURS: float = 24.0  # Unreferenced uploads are kept this long
+    UPLOAD_ORIGINAL_RETENTION_DAYS: Optional[float] = None  # Drop originals of referenced uploads after this, keeping the resized copy
     
     # Vector Search
     VECTOR_INDEX_PATH: Path = Path("app/ml/vector_index")
+    VECTOR_INDEX_RELOAD_INTERVAL: float = 10.0  # Seconds between checks for an index saved by another process (a catalog sync)
+    
+    # Metrics
+    METRICS_ENABLED: bool = True  # Record stage timings and batch sizes for /metrics
+    
+    # Request profiling
+    PROFILE_SAMPLE_RATE: float = 0.0  # Fraction of requests profiled (0 to profile on request only)
+    PROFILE_HEADER: str = "X-Debug-Profile"  # Profiles the request when it carries PROFILE_TOKEN
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")  # Secret for the header and profile downloads, empty to disable both
+    PROFILE_INTERVAL: float = 0.005  # Seconds between stack samples
+    PROFILE_DIR: Path = Path("profiles")
+    PROFILE_MAX_STORED: int = 200  # Oldest profiles are deleted beyond this
+    
+    # Batched feature extraction and search
+    FEATURE_BATCH_SIZE: int = 16  # Max images per CLIP forward pass
+    PREPROCESS_WORKERS: int = 4  # Threads preparing the images of a batch
+    SEARCH_BATCH_MAX_IMAGES: int = 16  # Max images per batch search request
+    
+    # Multi-garment search
+    REGION_PROPOSER: str = "saliency"  # Registered region proposer, "saliency" or "center"
+    REGION_MAX: int = 4  # Max garment regions searched per image
+    REGION_MIN_AREA: float = 0.02  # Min region area as a fraction of the image
     
     # E-commerce API
     ECOMMERCE_API_KEY: str = os.getenv("ECOMMERCE_API_KEY", "")
     ECOMMERCE_API_URL: str = os.getenv("ECOMMERCE_API_URL", "")
+    ECOMMERCE_TIMEOUT: float = 5.0  # Seconds per call
+    ECOMMERCE_CONNECT_TIMEOUT: float = 2.0
+    ECOMMERCE_MAX_RETRIES: int = 2
+    ECOMMERCE_BACKOFF_BASE: float = 0.1  # Seconds, doubled on each retry
+    ECOMMERCE_BACKOFF_MAX: float = 2.0
+    ECOMMERCE_MAX_CONNECTIONS: int = 100
+    ECOMMERCE_MAX_KEEPALIVE: int = 20
+    ECOMMERCE_BREAKER_FAILURES: int = 5  # Consecutive failures before failing fast
+    ECOMMERCE_BREAKER_RESET: float = 30.0  # Seconds before retrying the upstream
+    ECOMMERCE_FETCH_CONCURRENCY: int = 10  # Max concurrent product fetches per batch
+    ECOMMERCE_BULK_PATH: str = os.getenv("ECOMMERCE_BULK_PATH", "")  # e.g. /products/bulk, empty if unsupported
+    ECOMMERCE_BULK_MAX_IDS: int = 100  # Max IDs per bulk request
+    ECOMMERCE_CACHE_SIZE: int = 10000  # Max entries per cache
+    ECOMMERCE_PRODUCT_TTL: float = 600.0  # Seconds a product stays fresh
+    ECOMMERCE_SEARCH_TTL: float = 120.0  # Seconds a search result stays fresh
+    ECOMMERCE_STALE_TTL: float = 3600.0  # Seconds stale entries are served while refreshing
+    ECOMMERCE_CATALOG_PATH: str = "/catalog"  # Paged catalog listing used by catalog sync
+    
+    # Catalog sync
+    CATALOG_SYNC_PAGE_SIZE: int = 500
+    CATALOG_SYNC_RATE_LIMIT: float = 5.0  # Max page requests per second
+    CATALOG_SYNC_EMBED_CONCURRENCY: int = 4  # Max images downloaded and embedded at once
+    CATALOG_SYNC_CHECKPOINT_PAGES: int = 10  # Pages between checkpoints
+    CATALOG_SYNC_CHECKPOINT_PATH: Path = Path("app/data/catalog_sync_checkpoint.json")
+    
+    # Local product catalog (JSON Lines or Parquet), used when no e-commerce API is configured
+    CATALOG_PATH: Path = Path(os.getenv("CATALOG_PATH", "app/data/catalog.jsonl"))
+    
+    # Product metadata cache
+    PRODUCT_CACHE_SIZE: int = 10000  # Max products kept in memory
+    
+    # Search history write-behind queue
+    HISTORY_QUEUE_SIZE: int = 10000  # Max searches waiting to be written
+    HISTORY_BATCH_SIZE: int = 200
+    HISTORY_FLUSH_INTERVAL: float = 1.0  # Seconds
+    HISTORY_ENQUEUE_TIMEOUT: float = 0.5  # Seconds to wait when the queue is full
+    HISTORY_WRITE_RETRIES: int = 2  # Retries of a batch the database failed to write
+    HISTORY_RETRY_BACKOFF: float = 1.0  # Seconds before the first retry, doubled per retry
+    
+    # Admission control for feature extraction
+    EXTRACTION_CONCURRENCY: int = 2  # Images embedded at once
+    EXTRACTION_QUEUE_SIZE: int = 32  # Max requests waiting for a slot
+    EXTRACTION_ANONYMOUS_QUEUE_SIZE: int = 16  # Queue slots open to anonymous requests
+    EXTRACTION_DEADLINE: float = 10.0  # Max seconds a request waits for a slot
+    EXTRACTION_PRIORITY_AUTHENTICATED: bool = True  # Serve logged-in users first
+    
+    # Web server (serve.py)
+    WEB_WORKERS: int = 2  # Worker processes forked from the preloading master
+    
+    # Background image processing jobs
+    JOB_WORKERS: int = 1  # Worker threads in the API process (0 to use a separate worker process)
+    JOB_QUEUE_SIZE: int = 1000  # Max jobs waiting to run
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 2.0  # Seconds before the first retry, doubled per attempt
+    JOB_POLL_INTERVAL: float = 1.0  # Seconds between checks for jobs from other processes
+    JOB_LEASE_SECONDS: float = 30.0  # Running jobs not renewed for this long are requeued
+    JOB_BATCH_MAX_IMAGES: int = 100  # Max images per batch request
     
     class Config:
         case_sensitive = True
@@ -36,7 +141,8 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
-# Ensure directories exist
-os.makedirs(settings.MODEL_PATH, exist_ok=True)
-os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(settings.VECTOR_INDEX_PATH, exist_ok=True)
+def ensure_directories() -> None:
+    """Create the model, upload and index directories if missing (at startup, not on import)"""
+    os.makedirs(settings.MODEL_PATH, exist_ok=True)
+    os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(settings.VECTOR_INDEX_PATH, exist_ok=True)
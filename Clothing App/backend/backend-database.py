@@ -1,17 +1,68 @@
+from typing import Any, Dict
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-# Create SQLAlchemy engine
-engine = create_engine(settings.DATABASE_URL)
+# Async drivers used for each database backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(database_url: str) -> str:
+    """Convert a database URL to the equivalent URL for its async driver"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return str(url.set(drivername=ASYNC_DRIVERS[backend]))
+
+def get_engine_options(database_url: str) -> Dict[str, Any]:
+    """Get connection pool options for an engine"""
+    if make_url(database_url).get_backend_name() == "sqlite":
+        # SQLite (used for local development and tests) has no server-side pool
+        return {"connect_args": {"check_same_thread": False}}
+
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+# Create SQLAlchemy engine (used for schema creation and background writers)
+engine = create_engine(settings.DATABASE_URL, **get_engine_options(settings.DATABASE_URL))
 
 # Create sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create async engine and sessionmaker (used by request handlers)
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or get_async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **get_engine_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 # Create base class for models
 Base = declarative_base()
 
+# Set once the schema exists; workers forked by serve.py inherit it from the master
+_schema_ready = False
+
+def init_db() -> None:
+    """Create missing tables, once per process rather than on every import"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    from app.db import models  # noqa: F401 (registers the tables on Base)
+    Base.metadata.create_all(bind=engine)
+    _schema_ready = True
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -19,3 +70,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
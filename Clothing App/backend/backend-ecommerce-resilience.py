@@ -0,0 +1,88 @@
+"""
+Exercise EcommerceService against the local stub API under injected faults.
+
+Each scenario starts the stub with a fault profile and fetches products
+concurrently, reporting answer rate, latency, upstream request count and
+the final circuit breaker state. With the upstream down, calls should
+fail fast to local data once the breaker opens instead of hanging.
+
+Usage (from the backend directory):
+    python -m benchmarks.ecommerce_resilience --requests 300
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, Any, List
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.services.ecommerce import EcommerceService
+from benchmarks.ecommerce_stub import StubServer, create_app
+
+SCENARIOS = {
+    "healthy": {"latency": 0.01},
+    "slow": {"latency": 0.2, "latency_jitter": 0.2},
+    "flaky": {"latency": 0.01, "error_rate": 0.3},
+    "hanging": {"latency": 0.01, "hang_rate": 0.2, "hang_seconds": 10.0},
+    "down": {"error_rate": 1.0},
+}
+
+async def run_scenario(name: str, faults: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    with StubServer(create_app(catalog_size=args.catalog_size, **faults), port=args.port) as stub:
+        settings.ECOMMERCE_API_URL = stub.url
+        settings.ECOMMERCE_TIMEOUT = args.timeout
+        service = EcommerceService()
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies: List[float] = []
+        answered = 0
+
+        async def fetch(index: int):
+            nonlocal answered
+            async with semaphore:
+                start = time.perf_counter()
+                product = await service.get_product_by_id(f"clothing_{index % args.catalog_size + 1}")
+                latencies.append(time.perf_counter() - start)
+                if product:
+                    answered += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(fetch(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        await service.close()
+
+        async with httpx.AsyncClient() as client:
+            upstream_requests = (await client.get(f"{stub.url}/stats")).json()["requests"]
+
+    values = np.array(latencies) * 1000
+    result = {
+        "scenario": name,
+        "requests": args.requests,
+        "answered": answered,
+        "elapsed_s": elapsed,
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+        "upstream_requests": upstream_requests,
+        "breaker_state": service.client.breaker.state,
+    }
+    print(json.dumps(result, indent=2))
+    return result
+
+async def main(args: argparse.Namespace) -> None:
+    results = [await run_scenario(name, faults, args) for name, faults in SCENARIOS.items()]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--catalog-size", type=int, default=200)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--timeout", type=float, default=1.0, help="Per-call upstream timeout in seconds")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    asyncio.run(main(parser.parse_args()))
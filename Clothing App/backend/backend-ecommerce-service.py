@@ -1,12 +1,31 @@
+import asyncio
 import json
-import requests
+from dataclasses import dataclass, field
 from typing import Dict, List, Any, Optional
 import logging
 
+import httpx
+
 from app.core.config import settings
+from app.core.metrics import counter, observe_batch, register_cache, stage_timer
+from app.services.cache import TTLCache
+from app.services.catalog import get_catalog_store
+from app.services.http_client import CircuitBreaker, CircuitOpenError, ResilientHttpClient
 
 logger = logging.getLogger(__name__)
 
+UPSTREAM_CALLS = counter("ecommerce_upstream_calls", "Requests sent to the e-commerce API", ["kind"])
+
+class UpstreamError(Exception):
+    """Raised when the e-commerce API answers with an unexpected status"""
+
+@dataclass
+class BulkFetchResult:
+    """Result of fetching several products at once"""
+    products: List[Dict[str, Any]] = field(default_factory=list)  # In input order
+    missing: List[str] = field(default_factory=list)  # Not found upstream
+    failed: List[str] = field(default_factory=list)  # Upstream lookup failed
+
 class EcommerceService:
     """
     Service for interacting with e-commerce APIs.
@@ -17,8 +36,41 @@ class EcommerceService:
     def __init__(self):
         self.api_key = settings.ECOMMERCE_API_KEY
         self.api_url = settings.ECOMMERCE_API_URL
+        self.client = None
+        if self.api_url:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self.client = ResilientHttpClient(
+                self.api_url,
+                headers=headers,
+                timeout=settings.ECOMMERCE_TIMEOUT,
+                connect_timeout=settings.ECOMMERCE_CONNECT_TIMEOUT,
+                max_retries=settings.ECOMMERCE_MAX_RETRIES,
+                backoff_base=settings.ECOMMERCE_BACKOFF_BASE,
+                backoff_max=settings.ECOMMERCE_BACKOFF_MAX,
+                max_connections=settings.ECOMMERCE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ECOMMERCE_MAX_KEEPALIVE,
+                breaker=CircuitBreaker(
+                    failure_threshold=settings.ECOMMERCE_BREAKER_FAILURES,
+                    reset_timeout=settings.ECOMMERCE_BREAKER_RESET,
+                ),
+            )
+        # Product and search caches. Expired entries double as last-known
+        # data when the upstream is degraded.
+        self.product_cache = TTLCache(
+            max_size=settings.ECOMMERCE_CACHE_SIZE,
+            ttl=settings.ECOMMERCE_PRODUCT_TTL,
+            stale_ttl=settings.ECOMMERCE_STALE_TTL,
+        )
+        self.search_cache = TTLCache(
+            max_size=settings.ECOMMERCE_CACHE_SIZE,
+            ttl=settings.ECOMMERCE_SEARCH_TTL,
+            stale_ttl=settings.ECOMMERCE_STALE_TTL,
+        )
+        self.upstream_calls = 0
+        register_cache("ecommerce_products", self.product_cache.stats)
+        register_cache("ecommerce_searches", self.search_cache.stats)
     
-    def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
+    async def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
         """
         Get product details by ID from the e-commerce API.
         
@@ -32,27 +84,18 @@ class EcommerceService:
         # In a real app, this would make an API call to the e-commerce platform
         
         try:
-            # If the API_URL is set, make a real request
-            if self.api_url:
-                headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
-                response = requests.get(
-                    f"{self.api_url}/products/{product_id}",
-                    headers=headers
-                )
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"Failed to get product {product_id}: {response.status_code}")
-                    return None
-            
-            # Mock implementation for MVP
-            return self._mock_get_product(product_id)
+            return await self.product_cache.get_or_load(
+                product_id, lambda: self._load_product(product_id)
+            )
             
+        except (CircuitOpenError, httpx.HTTPError, UpstreamError) as e:
+            logger.warning(f"E-commerce API unavailable for product {product_id}: {str(e)}")
+            return self._fallback_product(product_id)
         except Exception as e:
             logger.error(f"Error getting product {product_id}: {str(e)}")
             return None
     
-    def search_products(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def search_products(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
         Search for products using a text query.
         
@@ -63,143 +106,180 @@ class EcommerceService:
         Returns:
             List of product dictionaries
         """
+        key = (query.strip().lower(), limit)
         try:
-            # If the API_URL is set, make a real request
-            if self.api_url:
-                headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
-                response = requests.get(
-                    f"{self.api_url}/products/search",
-                    params={"q": query, "limit": limit},
-                    headers=headers
-                )
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"Failed to search products: {response.status_code}")
-                    return []
-            
-            # Mock implementation for MVP
-            return self._mock_search_products(query, limit)
+            return await self.search_cache.get_or_load(
+                key, lambda: self._load_search(query, limit)
+            )
             
+        except (CircuitOpenError, httpx.HTTPError, UpstreamError) as e:
+            logger.warning(f"E-commerce API unavailable for search: {str(e)}")
+            results = self.search_cache.peek(key)
+            if results is not None:
+                return results
+            return self._catalog_search_products(query, limit)
         except Exception as e:
             logger.error(f"Error searching products: {str(e)}")
             return []
     
-    def get_multiple_products(self, product_ids: List[str]) -> List[Dict[str, Any]]:
+    async def get_multiple_products(self, product_ids: List[str]) -> BulkFetchResult:
         """
         Get details for multiple products by their IDs.
+        Uses the upstream bulk endpoint when one is configured, otherwise
+        fetches products concurrently with bounded concurrency.
         
         Args:
-            product_ids: List of product IDs
+            product_ids: List of product IDs (duplicates are fetched once)
             
         Returns:
-            List of product dictionaries
+            Products in input order, plus the IDs that were not found and
+            the IDs whose upstream lookup failed
         """
-        products = []
-        for product_id in product_ids:
-            product = self.get_product_by_id(product_id)
-            if product:
-                products.append(product)
-        return products
-    
-    def _mock_get_product(self, product_id: str) -> Optional[Dict[str, Any]]:
-        """Mock implementation for product retrieval"""
-        # This is a simplified mock database for the MVP
-        # In a real app, this would be replaced with actual API calls
-        products = self._get_mock_products()
+        unique_ids = list(dict.fromkeys(product_ids))
+        result = BulkFetchResult()
+        
+        # Only fetch products without a fresh cache entry
+        found: Dict[str, Dict[str, Any]] = {}
+        for product_id in unique_ids:
+            product = self.product_cache.get_fresh(product_id)
+            if product is not None:
+                found[product_id] = product
+        to_fetch = [product_id for product_id in unique_ids if product_id not in found]
         
-        # Find product by ID
-        for product in products:
-            if product.get("id") == product_id:
-                return product
+        if to_fetch:
+            observe_batch("ecommerce_fetch", len(to_fetch))
+            if not self.client:
+                found.update({product_id: self._catalog_get_product(product_id) for product_id in to_fetch})
+            elif settings.ECOMMERCE_BULK_PATH:
+                found.update(await self._fetch_bulk(to_fetch, result.failed))
+            else:
+                found.update(await self._fetch_concurrently(to_fetch, result.failed))
         
-        return None
+        for product_id in unique_ids:
+            product = found.get(product_id)
+            if product is None and product_id in result.failed:
+                product = self._fallback_product(product_id)
+            if product is not None:
+                result.products.append(product)
+            elif product_id not in result.failed:
+                result.missing.append(product_id)
+        
+        if result.failed:
+            logger.warning(f"Failed to fetch {len(result.failed)} of {len(unique_ids)} products")
+        return result
+    
+    async def _load_product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """Load one product from the API if configured, else from the local catalog"""
+        if self.client:
+            return await self._fetch_product(product_id)
+        return self._catalog_get_product(product_id)
     
-    def _mock_search_products(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Mock implementation for product search"""
-        products = self._get_mock_products()
+    async def _fetch_product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch one product upstream, raising if the upstream misbehaves"""
+        self.upstream_calls += 1
+        UPSTREAM_CALLS.inc(kind="product")
+        with stage_timer("ecommerce_product"):
+            response = await self.client.get(f"/products/{product_id}")
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise UpstreamError(f"Failed to get product {product_id}: {response.status_code}")
+        return response.json()
+    
+    async def _load_search(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Run a search on the API if configured, else on the local catalog"""
+        if not self.client:
+            return self._catalog_search_products(query, limit)
+        self.upstream_calls += 1
+        UPSTREAM_CALLS.inc(kind="search")
+        with stage_timer("ecommerce_search"):
+            response = await self.client.get(
+                "/products/search",
+                params={"q": query, "limit": limit}
+            )
+        if response.status_code != 200:
+            raise UpstreamError(f"Failed to search products: {response.status_code}")
+        return response.json()
+    
+    async def _fetch_concurrently(self, product_ids: List[str], failed: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch products one request each, with at most ECOMMERCE_FETCH_CONCURRENCY in flight"""
+        semaphore = asyncio.Semaphore(settings.ECOMMERCE_FETCH_CONCURRENCY)
+        found: Dict[str, Dict[str, Any]] = {}
         
-        # Simple search by brand, name, and description
-        query = query.lower()
-        results = []
+        async def fetch(product_id: str) -> None:
+            async with semaphore:
+                try:
+                    product = await self._fetch_product(product_id)
+                except (CircuitOpenError, httpx.HTTPError, UpstreamError) as e:
+                    logger.debug(f"Error fetching product {product_id}: {str(e)}")
+                    failed.append(product_id)
+                    return
+            if product is not None:
+                found[product_id] = product
+                self.product_cache.set(product_id, product)
         
-        for product in products:
-            brand = product.get("brand", "").lower()
-            name = product.get("name", "").lower()
-            description = product.get("description", "").lower()
-            
-            if query in brand or query in name or query in description:
-                results.append(product)
-                
-                if len(results) >= limit:
-                    break
+        await asyncio.gather(*(fetch(product_id) for product_id in product_ids))
+        return found
+    
+    async def _fetch_bulk(self, product_ids: List[str], failed: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch products through the upstream bulk endpoint, one request per chunk"""
+        semaphore = asyncio.Semaphore(settings.ECOMMERCE_FETCH_CONCURRENCY)
+        chunk_size = settings.ECOMMERCE_BULK_MAX_IDS
+        found: Dict[str, Dict[str, Any]] = {}
         
-        return results
+        async def fetch(chunk: List[str]) -> None:
+            async with semaphore:
+                try:
+                    self.upstream_calls += 1
+                    UPSTREAM_CALLS.inc(kind="bulk")
+                    with stage_timer("ecommerce_bulk"):
+                        response = await self.client.get(
+                            settings.ECOMMERCE_BULK_PATH,
+                            params={"ids": ",".join(chunk)}
+                        )
+                    if response.status_code != 200:
+                        raise UpstreamError(f"Bulk product fetch failed: {response.status_code}")
+                    products = response.json()
+                except (CircuitOpenError, httpx.HTTPError, UpstreamError) as e:
+                    logger.debug(f"Error fetching {len(chunk)} products: {str(e)}")
+                    failed.extend(chunk)
+                    return
+            for product in products:
+                product_id = product.get("id")
+                found[product_id] = product
+                self.product_cache.set(product_id, product)
+        
+        chunks = [product_ids[i:i + chunk_size] for i in range(0, len(product_ids), chunk_size)]
+        await asyncio.gather(*(fetch(chunk) for chunk in chunks))
+        return found
+    
+    async def close(self) -> None:
+        """Close pooled upstream connections"""
+        if self.client:
+            await self.client.aclose()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get cache hit ratios and upstream call counts for monitoring"""
+        return {
+            "products": self.product_cache.stats(),
+            "searches": self.search_cache.stats(),
+            "upstream_calls": self.upstream_calls,
+        }
+    
+    def _fallback_product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """Serve a product from the last good response or the local catalog"""
+        product = self.product_cache.peek(product_id)
+        if product is not None:
+            return product
+        return self._catalog_get_product(product_id)
+    
+    def _catalog_get_product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """Get a product from the local catalog"""
+        return get_catalog_store().get(product_id)
     
-    def _get_mock_products(self) -> List[Dict[str, Any]]:
-        """Get mock product data for MVP"""
-        return [
-            {
-                "id": "clothing_1",
-                "external_id": "12345",
-                "brand": "FashionBrand",
-                "name": "Classic White T-Shirt",
-                "category": "Shirts",
-                "description": "A comfortable classic white t-shirt made from 100% cotton.",
-                "price": 19.99,
-                "currency": "USD",
-                "image_url": "https://example.com/images/white-tshirt.jpg",
-                "product_url": "https://example.com/products/white-tshirt"
-            },
-            {
-                "id": "clothing_2",
-                "external_id": "23456",
-                "brand": "DenimCo",
-                "name": "Slim Fit Jeans",
-                "category": "Pants",
-                "description": "Stylish slim fit jeans in dark blue wash.",
-                "price": 49.99,
-                "currency": "USD",
-                "image_url": "https://example.com/images/slim-jeans.jpg",
-                "product_url": "https://example.com/products/slim-jeans"
-            },
-            {
-                "id": "clothing_3",
-                "external_id": "34567",
-                "brand": "SportyLife",
-                "name": "Athletic Jacket",
-                "category": "Outerwear",
-                "description": "Lightweight athletic jacket perfect for running and workouts.",
-                "price": 59.99,
-                "currency": "USD",
-                "image_url": "https://example.com/images/athletic-jacket.jpg",
-                "product_url": "https://example.com/products/athletic-jacket"
-            },
-            {
-                "id": "clothing_4",
-                "external_id": "45678",
-                "brand": "LuxuryWear",
-                "name": "Cashmere Sweater",
-                "category": "Sweaters",
-                "description": "Premium cashmere sweater in navy blue.",
-                "price": 129.99,
-                "currency": "USD",
-                "image_url": "https://example.com/images/cashmere-sweater.jpg",
-                "product_url": "https://example.com/products/cashmere-sweater"
-            },
-            {
-                "id": "clothing_5",
-                "external_id": "56789",
-                "brand": "StreetStyle",
-                "name": "Graphic Hoodie",
-                "category": "Sweatshirts",
-                "description": "Urban graphic hoodie with street art design.",
-                "price": 39.99,
-                "currency": "USD",
-                "image_url": "https://example.com/images/graphic-hoodie.jpg",
-                "product_url": "https://example.com/products/graphic-hoodie"
-            },
-        ]
+    def _catalog_search_products(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Search products in the local catalog"""
+        return get_catalog_store().search(query, limit)
 
 # Singleton instance of the e-commerce service
 _ecommerce_service = None
@@ -0,0 +1,167 @@
+"""
+Local stub of the e-commerce API with latency and error injection.
+
+Serves a generated catalog with the same endpoints EcommerceService calls,
+so the client can be exercised without the real partner API.
+
+Usage (from the backend directory):
+    python -m benchmarks.ecommerce_stub --port 9100 --latency 0.05 --error-rate 0.1
+    ECOMMERCE_API_URL=http://127.0.0.1:9100 uvicorn main:app
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Any, Optional
+
+import uvicorn
+from datetime import datetime
+from fastapi import FastAPI, HTTPException, Query
+
+def make_product(index: int) -> Dict[str, Any]:
+    """Generate a catalog product"""
+    return {
+        "id": f"clothing_{index}",
+        "external_id": str(100000 + index),
+        "brand": f"Brand{index % 50}",
+        "name": f"Stub Product {index}",
+        "category": ["Shirts", "Pants", "Outerwear", "Sweaters", "Sweatshirts"][index % 5],
+        "description": f"Generated stub product number {index}.",
+        "price": round(10 + (index % 200) * 0.75, 2),
+        "currency": "USD",
+        "image_url": f"https://example.com/images/stub-{index}.jpg",
+        "product_url": f"https://example.com/products/stub-{index}",
+        "updated_at": "2024-01-01T00:00:00",
+    }
+
+def create_app(
+    catalog_size: int = 1000,
+    latency: float = 0.0,
+    latency_jitter: float = 0.0,
+    error_rate: float = 0.0,
+    hang_rate: float = 0.0,
+    hang_seconds: float = 30.0,
+) -> FastAPI:
+    """
+    Create the stub API.
+
+    Args:
+        catalog_size: Number of generated products
+        latency: Base delay added to every response, in seconds
+        latency_jitter: Extra random delay of up to this many seconds
+        error_rate: Fraction of requests answered with a 503
+        hang_rate: Fraction of requests that stall for `hang_seconds`
+        hang_seconds: How long a stalled request takes
+    """
+    app = FastAPI(title="E-commerce API stub")
+    app.state.catalog = {f"clothing_{i}": make_product(i) for i in range(1, catalog_size + 1)}
+    app.state.requests = 0
+    app.state.next_index = catalog_size + 1
+
+    async def inject_faults() -> None:
+        app.state.requests += 1
+        if hang_rate and random.random() < hang_rate:
+            await asyncio.sleep(hang_seconds)
+        delay = latency + random.uniform(0, latency_jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if error_rate and random.random() < error_rate:
+            raise HTTPException(status_code=503, detail="Injected failure")
+
+    @app.get("/catalog")
+    async def list_catalog(cursor: int = 0, page_size: int = Query(500, ge=1, le=5000)):
+        await inject_faults()
+        items = list(app.state.catalog.values())[cursor:cursor + page_size]
+        next_cursor = cursor + page_size
+        return {
+            "items": items,
+            "next_cursor": str(next_cursor) if next_cursor < len(app.state.catalog) else None,
+        }
+
+    @app.post("/catalog/mutate")
+    async def mutate_catalog(changed: int = 0, image_changed: int = 0, deleted: int = 0, added: int = 0):
+        """Simulate upstream catalog changes, for exercising catalog sync"""
+        catalog = app.state.catalog
+        now = datetime.utcnow().isoformat()
+        products = list(catalog.values())
+        for product in products[:changed]:
+            product.update(price=round(product["price"] + 1, 2), updated_at=now)
+        for product in products[changed:changed + image_changed]:
+            product.update(image_url=product["image_url"].replace(".jpg", "-v2.jpg"), updated_at=now)
+        for product in products[len(products) - deleted:]:
+            del catalog[product["id"]]
+        for index in range(app.state.next_index, app.state.next_index + added):
+            catalog[f"clothing_{index}"] = make_product(index)
+        app.state.next_index += added
+        return {"size": len(catalog)}
+
+    @app.get("/products/search")
+    async def search_products(q: str = "", limit: int = Query(10, ge=1, le=100)):
+        await inject_faults()
+        q = q.lower()
+        results = [p for p in app.state.catalog.values() if q in p["name"].lower() or q in p["brand"].lower()]
+        return results[:limit]
+
+    @app.get("/products/bulk")
+    async def get_products_bulk(ids: str = ""):
+        await inject_faults()
+        catalog = app.state.catalog
+        return [catalog[product_id] for product_id in ids.split(",") if product_id in catalog]
+
+    @app.get("/products/{product_id}")
+    async def get_product(product_id: str):
+        await inject_faults()
+        product = app.state.catalog.get(product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return product
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+class StubServer:
+    """Run the stub API on a background thread, for use from benchmarks"""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 9100):
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.should_exit = True
+        self._thread.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--catalog-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(
+            catalog_size=args.catalog_size,
+            latency=args.latency,
+            latency_jitter=args.latency_jitter,
+            error_rate=args.error_rate,
+            hang_rate=args.hang_rate,
+            hang_seconds=args.hang_seconds,
+        ),
+        host=args.host,
+        port=args.port,
+    )
@@ -1,88 +1,195 @@
-import torch
-import clip
+import time
 import numpy as np
-from typing import Union, List
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from PIL import Image
 
 from app.core.config import settings
-from app.ml.image_processor import preprocess_image, extract_region_of_interest, normalize_image, augment_image
+from app.core.metrics import observe_batch, stage_timer
+from app.core.profiling import torch_profile
+from app.ml.image_processor import ImageSource, load_image, preprocess_image, extract_region_of_interest, normalize_image, augment_image
+from app.ml.model_artifact import load_clip
+from app.ml.region_proposal import Region, propose_regions
+
+# torch and CLIP are imported when the model is first loaded, not with the app
+if TYPE_CHECKING:
+    import torch
 
 class FeatureExtractor:
     def __init__(self):
         """Initialize the CLIP model for feature extraction"""
-        # Load CLIP model
+        import torch
+        
+        # Load CLIP model, memory-mapped from the exported artifact when there is one
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model, _ = clip.load("ViT-B/32", device=self.device)
-        self.model.eval()  # Set to evaluation mode
+        self.model = load_clip(self.device)
+        # Threads for preparing the images of a batch in parallel
+        self.preprocess_pool = ThreadPoolExecutor(
+            max_workers=settings.PREPROCESS_WORKERS,
+            thread_name_prefix="preprocess"
+        )
         print(f"Loaded CLIP model on {self.device}")
 
-    def extract_features(self, image_path: Union[str, Path]) -> np.ndarray:
+    @stage_timer("encode")
+    def encode_images(self, image_tensor: "torch.Tensor") -> np.ndarray:
         """
-        Extract visual features from an image using CLIP.
+        Run a batch of preprocessed images through CLIP in one forward pass.
         
         Args:
-            image_path: Path to the image file
+            image_tensor: Preprocessed images with shape (N, 3, 224, 224)
             
         Returns:
-            Feature vector as a numpy array
+            Unit length feature vectors with shape (N, vector_dim)
         """
-        # Preprocess the image
-        image_tensor = preprocess_image(image_path)
+        import torch
+        
+        observe_batch("encode", len(image_tensor))
         image_tensor = image_tensor.to(self.device)
         
-        # Extract features
-        with torch.no_grad():
+        # Extract features, recording operator timings if the request is profiled
+        with torch.no_grad(), torch_profile("encode_image"):
             features = self.model.encode_image(image_tensor)
             
-        # Normalize feature vector to unit length
+        # Normalize feature vectors to unit length
         features = features / features.norm(dim=-1, keepdim=True)
         
-        # Convert to numpy array
-        features_np = features.cpu().numpy().astype(np.float32).flatten()
+        return features.cpu().numpy().astype(np.float32)
+
+    def extract_features(self, image: ImageSource) -> np.ndarray:
+        """
+        Extract visual features from an image using CLIP.
+        
+        Args:
+            image: Path to the image file or PIL Image
+            
+        Returns:
+            Feature vector as a numpy array
+        """
+        # Preprocess the image
+        image_tensor = preprocess_image(image)
         
-        return features_np
+        # Extract features as a flat numpy array
+        return self.encode_images(image_tensor).flatten()
 
-    def extract_clothing_features(self, image_path: Union[str, Path]) -> np.ndarray:
+    def extract_clothing_features(self, image: ImageSource) -> np.ndarray:
         """
         Extract features from the main clothing item in the image.
         
         Args:
-            image_path: Path to the image file
+            image: Path to the image file or PIL Image
             
         Returns:
             Feature vector as a numpy array
         """
         # Extract region of interest
-        clothing_item, _ = extract_region_of_interest(image_path)
+        clothing_item, _ = extract_region_of_interest(image)
         
         # Normalize image lighting
         normalized_img = normalize_image(clothing_item)
         
-        # Create temporary file to save normalized image
-        temp_path = settings.UPLOAD_FOLDER / "temp_clothing_item.jpg"
-        normalized_img.save(temp_path)
+        # Extract features from the normalized image in memory
+        return self.extract_features(normalized_img)
+
+    def prepare_clothing_image(self, image: ImageSource) -> "torch.Tensor":
+        """
+        Crop, normalize and preprocess the main clothing item in an image.
         
-        # Extract features
-        features = self.extract_features(temp_path)
+        Args:
+            image: Path to the image file or PIL Image
+            
+        Returns:
+            Preprocessed image tensor with a batch dimension of 1
+        """
+        clothing_item, _ = extract_region_of_interest(image)
+        return preprocess_image(normalize_image(clothing_item))
+
+    def extract_clothing_features_batch(self, images: List[ImageSource]) -> np.ndarray:
+        """
+        Extract clothing features from several images at once. The images
+        are prepared in parallel, then embedded in batched forward passes
+        of up to FEATURE_BATCH_SIZE images.
         
-        # Clean up
-        temp_path.unlink(missing_ok=True)
+        Args:
+            images: Paths to image files or PIL Images
+            
+        Returns:
+            Feature vectors with shape (len(images), vector_dim), in input order
+        """
+        import torch
         
-        return features
+        image_tensor = torch.cat(list(self.preprocess_pool.map(self.prepare_clothing_image, images)))
+        return self.encode_batches(image_tensor)
 
-    def extract_features_with_augmentation(self, image_path: Union[str, Path]) -> List[np.ndarray]:
+    def encode_batches(self, image_tensor: "torch.Tensor") -> np.ndarray:
+        """
+        Embed preprocessed images in forward passes of up to
+        FEATURE_BATCH_SIZE images.
+        
+        Args:
+            image_tensor: Preprocessed images with shape (N, 3, 224, 224)
+            
+        Returns:
+            Feature vectors with shape (N, vector_dim), in input order
+        """
+        batch_size = settings.FEATURE_BATCH_SIZE
+        return np.vstack([
+            self.encode_images(image_tensor[start:start + batch_size])
+            for start in range(0, len(image_tensor), batch_size)
+        ])
+
+    def prepare_region(self, image: Image.Image, region: Region) -> "torch.Tensor":
+        """Crop, normalize and preprocess one region of an image"""
+        return preprocess_image(normalize_image(image.crop(region.box)))
+
+    def extract_region_features(
+        self,
+        image: ImageSource,
+        max_regions: Optional[int] = None,
+    ) -> Tuple[List[Region], np.ndarray, Dict[str, float]]:
+        """
+        Find the garments in an image and extract features from each. The
+        regions are prepared in parallel and embedded in one batched
+        forward pass.
+        
+        Args:
+            image: Path to the image file or PIL Image
+            max_regions: Max regions (default: REGION_MAX)
+            
+        Returns:
+            The regions, their feature vectors with shape
+            (len(regions), vector_dim), and the seconds spent proposing
+            regions ("proposal") and embedding them ("embedding")
+        """
+        import torch
+        
+        image = load_image(image)
+        start = time.perf_counter()
+        regions = propose_regions(image, max_regions)
+        proposed = time.perf_counter()
+        
+        image_tensor = torch.cat(list(self.preprocess_pool.map(
+            lambda region: self.prepare_region(image, region),
+            regions
+        )))
+        features = self.encode_batches(image_tensor)
+        
+        seconds = {"proposal": proposed - start, "embedding": time.perf_counter() - proposed}
+        return regions, features, seconds
+
+    def extract_features_with_augmentation(self, image: ImageSource) -> List[np.ndarray]:
         """
         Extract features from original and augmented versions of the image.
         
         Args:
-            image_path: Path to the image file
+            image: Path to the image file or PIL Image
             
         Returns:
             List of feature vectors
         """
+        import torch
+        
         # Extract region of interest
-        clothing_item, _ = extract_region_of_interest(image_path)
+        clothing_item, _ = extract_region_of_interest(image)
         
         # Normalize image
         normalized_img = normalize_image(clothing_item)
@@ -90,21 +197,24 @@ class FeatureExtractor:
         # Generate augmentations
         augmented_images = augment_image(normalized_img, num_augmentations=3)
         
-        # Extract features from each augmentation
-        feature_vectors = []
-        for i, aug_img in enumerate(augmented_images):
-            # Save temporary image
-            temp_path = settings.UPLOAD_FOLDER / f"temp_aug_{i}.jpg"
-            aug_img.save(temp_path)
-            
-            # Extract features
-            features = self.extract_features(temp_path)
-            feature_vectors.append(features)
-            
-            # Clean up
-            temp_path.unlink(missing_ok=True)
+        # Extract features from all augmentations in one forward pass
+        image_tensor = torch.cat([preprocess_image(aug_img) for aug_img in augmented_images])
+        return list(self.encode_images(image_tensor))
+
+    def extract_fused_clothing_features(self, image: ImageSource) -> np.ndarray:
+        """
+        Extract a feature vector fused from the original and augmented
+        views of the main clothing item, which is slower but more robust to
+        lighting and framing than a single view.
         
-        return feature_vectors
+        Args:
+            image: Path to the image file or PIL Image
+            
+        Returns:
+            Unit length feature vector as a numpy array
+        """
+        fused = np.mean(self.extract_features_with_augmentation(image), axis=0)
+        return (fused / np.linalg.norm(fused)).astype(np.float32)
 
 # Singleton instance of the feature extractor
 _feature_extractor = None
@@ -0,0 +1,126 @@
+"""
+Generate a synthetic product catalog for the local CatalogStore.
+
+Writes realistic-looking clothing products to JSON Lines (or Parquet) so the
+local catalog can stand in for the e-commerce API and serve as a benchmark
+dataset. With --benchmark, also reports load time, memory, and lookup and
+search throughput against a linear scan.
+
+Usage (from the backend directory):
+    python -m benchmarks.generate_catalog --size 300000 --output app/data/catalog.jsonl
+    python -m benchmarks.generate_catalog --size 300000 --output /tmp/catalog.jsonl --benchmark
+"""
+import argparse
+import json
+import random
+import resource
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterator
+
+from app.services.catalog import CatalogStore
+
+COLORS = ["white", "black", "navy", "red", "olive", "grey", "beige", "blue", "green", "pink", "brown", "cream"]
+MATERIALS = ["cotton", "linen", "wool", "cashmere", "denim", "leather", "silk", "polyester", "fleece", "corduroy"]
+FITS = ["slim", "regular", "relaxed", "oversized", "cropped", "tailored"]
+GARMENTS = {
+    "Shirts": ["t-shirt", "oxford shirt", "polo", "henley", "flannel shirt"],
+    "Pants": ["jeans", "chinos", "joggers", "cargo pants", "trousers"],
+    "Outerwear": ["jacket", "parka", "trench coat", "bomber jacket", "windbreaker"],
+    "Sweaters": ["sweater", "cardigan", "turtleneck", "crewneck", "vest"],
+    "Sweatshirts": ["hoodie", "sweatshirt", "zip hoodie", "quarter zip"],
+    "Dresses": ["midi dress", "maxi dress", "shirt dress", "slip dress"],
+    "Shoes": ["sneakers", "boots", "loafers", "sandals"],
+}
+BRANDS = [
+    "FashionBrand", "DenimCo", "SportyLife", "LuxuryWear", "StreetStyle", "NorthPeak", "UrbanThread",
+    "CoastLine", "HeritageMill", "MonoLab", "TrailForm", "Atelier9", "BasicsCo", "RunWell", "Loomcraft",
+]
+
+def generate_products(size: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Generate `size` catalog products deterministically"""
+    rng = random.Random(seed)
+    categories = list(GARMENTS)
+    for index in range(1, size + 1):
+        category = rng.choice(categories)
+        garment = rng.choice(GARMENTS[category])
+        color = rng.choice(COLORS)
+        material = rng.choice(MATERIALS)
+        fit = rng.choice(FITS)
+        brand = rng.choice(BRANDS)
+        slug = f"{color}-{garment.replace(' ', '-')}-{index}"
+        yield {
+            "id": f"clothing_{index}",
+            "external_id": str(1_000_000 + index),
+            "brand": brand,
+            "name": f"{fit.capitalize()} {color.capitalize()} {garment.title()}",
+            "category": category,
+            "description": f"A {fit} fit {garment} in {color} {material}.",
+            "price": round(rng.uniform(9.99, 299.99), 2),
+            "currency": "USD",
+            "image_url": f"https://example.com/images/{slug}.jpg",
+            "product_url": f"https://example.com/products/{slug}",
+            "updated_at": "2024-01-01T00:00:00",
+        }
+
+def write_catalog(path: Path, size: int, seed: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pylist(list(generate_products(size, seed))), path)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        for product in generate_products(size, seed):
+            f.write(json.dumps(product) + "\n")
+
+def benchmark(path: Path, queries: int) -> Dict[str, Any]:
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    store = CatalogStore.load(path)
+    load_s = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    rng = random.Random(1)
+    ids = [f"clothing_{rng.randint(1, len(store))}" for _ in range(queries)]
+    terms = [f"{rng.choice(COLORS)} {rng.choice(list(GARMENTS.values()))[0]}" for _ in range(queries)]
+
+    start = time.perf_counter()
+    for product_id in ids:
+        store.get(product_id)
+    lookup_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for term in terms:
+        store.search(term, limit=10)
+    search_s = time.perf_counter() - start
+
+    # The previous implementation: a linear scan per lookup
+    sample = ids[: max(1, queries // 100)]
+    start = time.perf_counter()
+    for product_id in sample:
+        next((p for p in store.products if p.get("id") == product_id), None)
+    linear_lookup_s = (time.perf_counter() - start) * len(ids) / len(sample)
+
+    return {
+        "products": len(store),
+        "load_s": load_s,
+        "max_rss_increase_mb": (rss_after - rss_before) / 1024,
+        "lookups_per_s": queries / lookup_s,
+        "searches_per_s": queries / search_s,
+        "linear_lookups_per_s": queries / linear_lookup_s,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=300_000)
+    parser.add_argument("--output", type=Path, default=Path("app/data/catalog.jsonl"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark loading and querying the catalog")
+    parser.add_argument("--queries", type=int, default=10_000)
+    args = parser.parse_args()
+
+    write_catalog(args.output, args.size, args.seed)
+    print(f"Wrote {args.size} products to {args.output}")
+    if args.benchmark:
+        print(json.dumps(benchmark(args.output, args.queries), indent=2))
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Any, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limiting and server-side failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised when a request is refused because the circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream service.
+    After `failure_threshold` consecutive failures the circuit opens and
+    requests fail fast. Once `reset_timeout` seconds have passed a single
+    trial request is let through; its outcome closes or re-opens the circuit.
+    A trial that ends without an outcome (cancelled, or failed before
+    reaching the upstream) is released, and one that never ends is replaced
+    by another after `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started_at = 0.0
+
+    def allow_request(self) -> bool:
+        """Check whether a request may be sent upstream"""
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if (
+            (self.state == self.OPEN and now - self.opened_at >= self.reset_timeout)
+            or (self.state == self.HALF_OPEN and now - self.trial_started_at >= self.reset_timeout)
+        ):
+            # Let one trial request through
+            self.state = self.HALF_OPEN
+            self.trial_started_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_trial(self, trial_started_at: float) -> None:
+        """Let the next request be a trial when the one started at `trial_started_at` ended without an outcome"""
+        if self.state == self.HALF_OPEN and self.trial_started_at == trial_started_at:
+            # opened_at is unchanged, so the reset timeout has already passed
+            self.state = self.OPEN
+
+class ResilientHttpClient:
+    """
+    Pooled async HTTP client with per-call timeouts, bounded retries with
+    jittered exponential backoff, and a circuit breaker.
+    The underlying connection pool is created lazily and shared by all calls.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 5.0,
+        connect_timeout: float = 2.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.1,
+        backoff_max: float = 2.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url
+        self.headers = headers or {}
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.breaker = breaker or CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=self.limits,
+            )
+        return self._client
+
+    async def request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request, retrying transient failures.
+
+        Args:
+            method: HTTP method
+            path: Path relative to the base URL
+            timeout: Overall timeout for this call in seconds (optional)
+            **kwargs: Extra arguments passed to httpx
+
+        Returns:
+            The final response. Non-retryable error statuses are returned
+            as-is for the caller to handle.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            httpx.HTTPError: If every attempt failed at the transport level
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {self.base_url}")
+
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+
+        trial_started_at = self.breaker.trial_started_at if self.breaker.state == CircuitBreaker.HALF_OPEN else None
+        try:
+            return await self._send_with_retries(method, path, **kwargs)
+        except BaseException:
+            # Cancelled, or an error that says nothing about the upstream's health;
+            # a trial request must not leave the circuit half open
+            if trial_started_at is not None:
+                self.breaker.release_trial(trial_started_at)
+            raise
+
+    async def _send_with_retries(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        last_error: Optional[Exception] = None
+        response: Optional[httpx.Response] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                # Full jitter keeps retries from many workers from synchronizing
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                await asyncio.sleep(delay)
+            try:
+                response = await self.client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                last_error = e
+                response = None
+                continue
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                self.breaker.record_success()
+                return response
+
+        self.breaker.record_failure()
+        if response is not None:
+            return response
+        raise last_error
+
+    async def get(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self) -> None:
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,77 +1,116 @@
 import io
-import os
 from pathlib import Path
-from typing import Tuple, Union
+from typing import TYPE_CHECKING, Tuple, Union
 
 import numpy as np
 from PIL import Image
-import torch
-from torchvision import transforms
-from app.core.config import settings
+
+from app.core.metrics import stage_timer
+
+# torch and torchvision are imported on first use, so importing the app stays fast
+if TYPE_CHECKING:
+    import torch
 
 # Image preprocessing constants
 IMAGE_SIZE = 224  # CLIP model expects 224x224 images
 MEAN = [0.48145466, 0.4578275, 0.40821073]
 STD = [0.26862954, 0.26130258, 0.27577711]
 
-# Set up image transformations for CLIP model
-preprocess = transforms.Compose([
-    transforms.Resize(IMAGE_SIZE, interpolation=transforms.InterpolationMode.BICUBIC),
-    transforms.CenterCrop(IMAGE_SIZE),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=MEAN, std=STD)
-])
+# Image transformations for CLIP model, built on first use
+_preprocess = None
+
+def get_preprocess():
+    """Get the CLIP preprocessing transform"""
+    global _preprocess
+    if _preprocess is None:
+        from torchvision import transforms
+        _preprocess = transforms.Compose([
+            transforms.Resize(IMAGE_SIZE, interpolation=transforms.InterpolationMode.BICUBIC),
+            transforms.CenterCrop(IMAGE_SIZE),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=MEAN, std=STD)
+        ])
+    return _preprocess
+
+# An image file on disk or an already decoded image
+ImageSource = Union[str, Path, Image.Image]
 
-def save_uploaded_image(file_bytes: bytes, filename: str) -> Path:
+@stage_timer("decode")
+def decode_image(file_bytes: bytes) -> Image.Image:
     """
-    Save an uploaded image file to disk.
+    Decode image bytes in memory.
     
     Args:
         file_bytes: Image file bytes
-        filename: Original filename
         
     Returns:
-        Path to the saved file
+        RGB image
     """
-    # Create unique filename to avoid collisions
-    timestamp = int(os.path.getmtime(settings.UPLOAD_FOLDER) if os.path.exists(settings.UPLOAD_FOLDER) else 0)
-    unique_filename = f"{timestamp}_{filename}"
-    file_path = settings.UPLOAD_FOLDER / unique_filename
-    
-    # Save the file
-    with open(file_path, "wb") as f:
-        f.write(file_bytes)
+    return Image.open(io.BytesIO(file_bytes)).convert("RGB")
+
+def load_image(image: ImageSource) -> Image.Image:
+    """
+    Open an image file, or pass through an already decoded image, as RGB.
     
-    return file_path
+    Args:
+        image: Path to the image file or PIL Image
+        
+    Returns:
+        RGB image
+    """
+    if isinstance(image, Image.Image):
+        return image if image.mode == "RGB" else image.convert("RGB")
+    with stage_timer("load"):
+        return Image.open(image).convert("RGB")
 
-def preprocess_image(image_path: Union[str, Path]) -> torch.Tensor:
+@stage_timer("preprocess")
+def preprocess_image(image: ImageSource) -> "torch.Tensor":
     """
     Preprocess an image for use with the CLIP model.
     
     Args:
-        image_path: Path to the image file
+        image: Path to the image file or PIL Image
         
     Returns:
         Preprocessed image tensor
     """
     # Open and convert the image
-    image = Image.open(image_path).convert("RGB")
+    image = load_image(image)
     
     # Apply preprocessing
-    image_tensor = preprocess(image)
+    image_tensor = get_preprocess()(image)
     
     # Add batch dimension
     image_tensor = image_tensor.unsqueeze(0)
     
     return image_tensor
 
-def extract_region_of_interest(image_path: Union[str, Path]) -> Tuple[Image.Image, Tuple[int, int, int, int]]:
+def center_crop_box(width: int, height: int, crop_percentage: float = 0.6) -> Tuple[int, int, int, int]:
+    """
+    Bounding box of the centre of an image.
+    
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        crop_percentage: Share of each side kept
+        
+    Returns:
+        Bounding box (left, top, right, bottom)
+    """
+    left = width * (1 - crop_percentage) // 2
+    top = height * (1 - crop_percentage) // 2
+    right = left + width * crop_percentage
+    bottom = top + height * crop_percentage
+    return (int(left), int(top), int(right), int(bottom))
+
+@stage_timer("roi_crop")
+def extract_region_of_interest(image: ImageSource) -> Tuple[Image.Image, Tuple[int, int, int, int]]:
     """
     Extract the main clothing item from an image (simplified version).
     In a real app, this would use object detection to identify clothing items.
     
     Args:
-        image_path: Path to the image file
+        image: Path to the image file or PIL Image
         
     Returns:
         Cropped image and bounding box (left, top, right, bottom)
@@ -79,21 +118,15 @@ def extract_region_of_interest(image_path: Union[str, Path]) -> Tuple[Image.Imag
     # In a real app, this would use a clothing detection model
     # For MVP, we'll just use the center crop as a simplification
     
-    image = Image.open(image_path).convert("RGB")
-    width, height = image.size
+    image = load_image(image)
     
     # Simple center crop (60% of the image)
-    crop_percentage = 0.6
-    left = width * (1 - crop_percentage) // 2
-    top = height * (1 - crop_percentage) // 2
-    right = left + width * crop_percentage
-    bottom = top + height * crop_percentage
-    
-    bbox = (int(left), int(top), int(right), int(bottom))
+    bbox = center_crop_box(*image.size)
     cropped_img = image.crop(bbox)
     
     return cropped_img, bbox
 
+@stage_timer("normalize")
 def normalize_image(image: Image.Image) -> Image.Image:
     """
     Apply normalization to handle varied lighting conditions.
@@ -130,6 +163,8 @@ def augment_image(image: Image.Image, num_augmentations: int = 3) -> list:
     Returns:
         List of augmented images
     """
+    from torchvision import transforms
+    
     augmentations = [image]  # Start with the original image
     
     # Basic augmentations
@@ -1,17 +1,19 @@
 import os
-from typing import List, Optional
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status
-from sqlalchemy.orm import Session
+import json
+from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status, Query
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 import numpy as np
 from pydantic import BaseModel
 
 from app.core.config import settings
-from app.db.database import get_db
-from app.db.models import User, SearchHistory
+from app.db.database import get_async_db
+from app.db.models import User, SearchHistory, ImageJob
 from app.core.security import get_current_user, get_current_user_optional
-from app.ml.image_processor import save_uploaded_image
-from app.ml.feature_extractor import get_feature_extractor
 from app.ml.vector_search import get_vector_search
+from app.services.image_store import get_image_store
+from app.services.jobs import FINISHED_STATUSES, QueueFullError, get_job_queue
 
 router = APIRouter()
 
@@ -24,7 +26,7 @@ class ImageUploadResponse(BaseModel):
 @router.post("/images/upload", response_model=ImageUploadResponse)
 async def upload_image(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional),
 ):
     """
@@ -39,41 +41,24 @@ async def upload_image(
         Response with image ID and message
     """
     try:
-        # Check file size
-        file_size = 0
-        file_content = await file.read()
-        file_size = len(file_content)
-        
-        if file_size > settings.MAX_CONTENT_LENGTH:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File size exceeds maximum limit of {settings.MAX_CONTENT_LENGTH / (1024 * 1024)}MB"
-            )
-        
-        # Check file type
-        if not file.content_type.startswith("image/"):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File must be an image"
-            )
-        
-        # Save the image
-        image_path = save_uploaded_image(file_content, file.filename)
+        # Copy the (already spooled) upload into the store in chunks. Type,
+        # dimensions and size are checked first, so bad uploads are not copied.
+        stored_image = await get_image_store().put_upload(file)
         
         # Record search history if user is logged in
         search_id = None
         if current_user:
             search_history = SearchHistory(
                 user_id=current_user.id,
-                image_path=str(image_path.relative_to(settings.UPLOAD_FOLDER))
+                image_path=stored_image.image_id
             )
             db.add(search_history)
-            db.commit()
-            db.refresh(search_history)
+            await db.commit()
+            await db.refresh(search_history)
             search_id = search_history.id
         
         return {
-            "image_id": os.path.basename(image_path),
+            "image_id": stored_image.image_id,
             "search_id": search_id,
             "message": "Image uploaded successfully"
         }
@@ -88,53 +73,121 @@ async def upload_image(
             detail=f"Error uploading image: {str(e)}"
         )
 
-class ImageProcessingResponse(BaseModel):
-    """Response model for image processing endpoint"""
-    features_extracted: bool
-    vector_dimension: int
-    message: str
+class ImageJobResponse(BaseModel):
+    """Response model for image processing jobs"""
+    job_id: str
+    image_id: str
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    vector_dimension: Optional[int] = None
+    embedding: Optional[List[float]] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+class BatchProcessRequest(BaseModel):
+    """Request model for batch image processing"""
+    image_ids: List[str]
 
-@router.post("/images/{image_id}/process", response_model=ImageProcessingResponse)
+def _job_response(job: ImageJob, include_embedding: bool = False) -> Dict[str, Any]:
+    """Convert a job row to an ImageJobResponse"""
+    return {
+        "job_id": job.id,
+        "image_id": job.image_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "vector_dimension": (job.result or {}).get("vector_dimension"),
+        "embedding": json.loads(job.embedding) if include_embedding and job.embedding else None,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+async def _submit_jobs(image_ids: List[str], current_user: User) -> List[ImageJob]:
+    """Check that the images exist and queue a processing job for each"""
+    image_store = get_image_store()
+    missing = [image_id for image_id in image_ids if not image_store.exists(image_id)]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Image not found: {missing[0]}"
+        )
+    try:
+        return await run_in_threadpool(get_job_queue().submit, image_ids, current_user.id)
+    except QueueFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Processing queue is full, please retry later",
+            headers={"Retry-After": str(int(settings.JOB_RETRY_BACKOFF * 5))}
+        )
+
+async def _get_own_job(job_id: str, current_user: User) -> ImageJob:
+    job = await run_in_threadpool(get_job_queue().get, job_id)
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@router.post("/images/{image_id}/process", response_model=ImageJobResponse, status_code=status.HTTP_202_ACCEPTED)
 async def process_image(
     image_id: str,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """
-    Process an uploaded image to extract features (admin only).
-    This is separate from the search endpoint for demonstration purposes.
+    Queue an uploaded image for feature extraction (admin only).
+    The features are extracted by a background worker; poll
+    /images/jobs/{job_id} for the result.
     
     Args:
-        image_id: Image ID (filename)
-        db: Database session
+        image_id: Image ID
         current_user: Current user (must be admin in a real app)
         
     Returns:
-        Response with processing status
+        The queued job
     """
     try:
         # In a real app, check if user is admin
         # For MVP, we'll skip this check
+        jobs = await _submit_jobs([image_id], current_user)
+        return _job_response(jobs[0])
         
-        # Check if image exists
-        image_path = settings.UPLOAD_FOLDER / image_id
-        if not os.path.exists(image_path):
+    except HTTPException as e:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        # Handle other exceptions
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing image: {str(e)}"
+        )
+
+@router.post("/images/process", response_model=List[ImageJobResponse], status_code=status.HTTP_202_ACCEPTED)
+async def process_images(
+    request: BatchProcessRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Queue several uploaded images for feature extraction, one job each.
+    
+    Args:
+        request: Image IDs to process
+        current_user: Current user
+        
+    Returns:
+        The queued jobs, in request order
+    """
+    try:
+        if not 0 < len(request.image_ids) <= settings.JOB_BATCH_MAX_IMAGES:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Image not found"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Provide between 1 and {settings.JOB_BATCH_MAX_IMAGES} image IDs"
             )
-        
-        # Get feature extractor
-        feature_extractor = get_feature_extractor()
-        
-        # Extract features
-        features = feature_extractor.extract_clothing_features(image_path)
-        
-        return {
-            "features_extracted": True,
-            "vector_dimension": features.shape[0],
-            "message": "Image processed successfully"
-        }
+        jobs = await _submit_jobs(request.image_ids, current_user)
+        return [_job_response(job) for job in jobs]
         
     except HTTPException as e:
         # Re-raise HTTP exceptions
@@ -143,5 +196,50 @@ async def process_image(
         # Handle other exceptions
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing image: {str(e)}"
+            detail=f"Error processing images: {str(e)}"
+        )
+
+@router.get("/images/jobs/{job_id}", response_model=ImageJobResponse)
+async def get_processing_job(
+    job_id: str,
+    include_embedding: bool = Query(False),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get the status and result of a processing job.
+    
+    Args:
+        job_id: Job ID
+        include_embedding: Include the extracted feature vector (optional)
+        current_user: Current user
+        
+    Returns:
+        The job
+    """
+    job = await _get_own_job(job_id, current_user)
+    return _job_response(job, include_embedding)
+
+@router.delete("/images/jobs/{job_id}", response_model=ImageJobResponse)
+async def cancel_processing_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Cancel a processing job. A job that is already running finishes, but
+    its result is discarded.
+    
+    Args:
+        job_id: Job ID
+        current_user: Current user
+        
+    Returns:
+        The updated job
+    """
+    job = await _get_own_job(job_id, current_user)
+    if job.status in FINISHED_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job already {job.status}"
         )
+    job = await run_in_threadpool(get_job_queue().cancel, job_id)
+    return _job_response(job)
@@ -0,0 +1,453 @@
+"""
+Content-addressed store for uploaded images.
+
+Images are keyed by the SHA-256 of their bytes, so an image uploaded many
+times is stored once and concurrent uploads never collide. Files live in
+two levels of 256 shard directories:
+
+    UPLOAD_FOLDER/originals/ab/cd/abcd...ef.jpg   the uploaded file
+    UPLOAD_FOLDER/derived/ab/cd/abcd...ef.jpg     a small resized copy
+
+The derivative is written at ingest and used for re-processing instead of
+the original. Images are referenced by SearchHistory.image_path, and a
+garbage collection sweep removes unreferenced images after a grace period.
+
+Usage (from the backend directory):
+    python -m app.services.image_store gc
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from fastapi import UploadFile
+from PIL import Image
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import stage_timer
+from app.db.database import SessionLocal
+from app.db.models import SearchHistory
+from app.services.uploads import UploadInfo, iter_upload, sniff_image_type
+
+logger = logging.getLogger(__name__)
+
+# File extension per sniffed image type
+EXTENSIONS = {"jpeg": "jpg", "png": "png", "webp": "webp", "gif": "gif", "bmp": "bmp"}
+
+IMAGE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}\.(jpg|png|webp|gif|bmp)$")
+
+# Uploads written by the old flat layout: {timestamp}_{filename}
+LEGACY_IMAGE_ID_PATTERN = re.compile(r"^[0-9]+_[^/\\]+$")
+
+@dataclass
+class StoredImage:
+    image_id: str
+    path: Path
+    # False when identical content was already stored
+    created: bool
+    info: Optional[UploadInfo] = None
+
+@dataclass
+class ShardEntry:
+    """Files on disk for one image"""
+    original: Optional[os.stat_result] = None
+    derivative: Optional[os.stat_result] = None
+    mtime: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return sum(stat.st_size for stat in (self.original, self.derivative) if stat is not None)
+
+@dataclass
+class GCStats:
+    scanned: int = 0
+    referenced: int = 0
+    deleted: int = 0
+    originals_dropped: int = 0
+    temp_files_deleted: int = 0
+    bytes_freed: int = 0
+
+def make_image_id(digest: str, image_type: str) -> str:
+    """Build an image ID from a SHA-256 hex digest and image type"""
+    return f"{digest}.{EXTENSIONS[image_type]}"
+
+class ImageStore:
+    def __init__(
+        self,
+        root: Union[str, Path],
+        derivative_size: int = 336,
+        derivative_quality: int = 90,
+    ):
+        self.root = Path(root)
+        self.originals = self.root / "originals"
+        self.derived = self.root / "derived"
+        self.temp = self.root / "tmp"
+        self.derivative_size = derivative_size
+        self.derivative_quality = derivative_quality
+        for directory in (self.originals, self.derived, self.temp):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def _shard(self, base: Path, image_id: str) -> Path:
+        return base / image_id[:2] / image_id[2:4] / image_id
+
+    def original_path(self, image_id: str) -> Path:
+        return self._shard(self.originals, image_id)
+
+    def derivative_path(self, image_id: str) -> Path:
+        # Always a JPEG, whatever the extension of the original
+        return self._shard(self.derived, image_id)
+
+    def resolve(self, image_id: str) -> Optional[Path]:
+        """
+        Get the original file of an image, or its derivative if the
+        original has been dropped.
+
+        Args:
+            image_id: Image ID
+
+        Returns:
+            Path to the image, or None if the ID is invalid or unknown
+        """
+        if IMAGE_ID_PATTERN.match(image_id):
+            for path in (self.original_path(image_id), self.derivative_path(image_id)):
+                if path.is_file():
+                    return path
+            return None
+        if LEGACY_IMAGE_ID_PATTERN.match(image_id):
+            path = self.root / image_id
+            return path if path.is_file() else None
+        return None
+
+    def processing_path(self, image_id: str) -> Optional[Path]:
+        """
+        Get the file to extract features from: the derivative if there is
+        one, otherwise the original.
+
+        Args:
+            image_id: Image ID
+
+        Returns:
+            Path to the image, or None if the ID is invalid or unknown
+        """
+        if IMAGE_ID_PATTERN.match(image_id):
+            derivative = self.derivative_path(image_id)
+            if derivative.is_file():
+                return derivative
+        return self.resolve(image_id)
+
+    def exists(self, image_id: str) -> bool:
+        return self.resolve(image_id) is not None
+
+    @stage_timer("upload_write")
+    async def put_upload(self, file: UploadFile) -> StoredImage:
+        """
+        Stream an upload into the store, hashing it as it is written.
+
+        The file is validated chunk by chunk (see iter_upload) and written
+        to a temporary file, which is moved into place once complete.
+
+        Args:
+            file: Uploaded file
+
+        Returns:
+            The stored image
+        """
+        info = UploadInfo(image_type="", width=0, height=0)
+        digest = hashlib.sha256()
+        fd, temp_name = tempfile.mkstemp(dir=self.temp, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in iter_upload(file, info):
+                    digest.update(chunk)
+                    await run_in_threadpool(f.write, chunk)
+            image_id = make_image_id(digest.hexdigest(), info.image_type)
+            created = await run_in_threadpool(self._commit, Path(temp_name), image_id)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
+
+        logger.debug(f"Stored upload {image_id}: {info.size} bytes, peak buffer {info.peak_buffer_bytes} bytes")
+        return StoredImage(image_id, self.original_path(image_id), created, info)
+
+    def put_bytes(self, content: Union[bytes, bytearray], image_id: Optional[str] = None) -> StoredImage:
+        """
+        Store an image that is already in memory.
+
+        Args:
+            content: Image file bytes
+            image_id: ID from image_id_for, if already computed
+
+        Returns:
+            The stored image
+        """
+        image_id = image_id or self.image_id_for(content)
+        path = self.original_path(image_id)
+        if path.is_file():
+            # Same content is already stored
+            os.utime(path)
+            return StoredImage(image_id, path, False)
+        fd, temp_name = tempfile.mkstemp(dir=self.temp, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            created = self._commit(Path(temp_name), image_id)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
+        return StoredImage(image_id, self.original_path(image_id), created)
+
+    def image_id_for(self, content: Union[bytes, bytearray]) -> str:
+        """
+        Compute the ID an image would be stored under.
+
+        Raises:
+            ValueError: If the content is not an accepted image type
+        """
+        image_type = sniff_image_type(bytes(content[:12]))
+        if image_type is None:
+            raise ValueError("Unsupported image type")
+        return make_image_id(hashlib.sha256(content).hexdigest(), image_type)
+
+    def _commit(self, temp_path: Path, image_id: str) -> bool:
+        """Move a complete temporary file into place and write its derivative"""
+        path = self.original_path(image_id)
+        if path.is_file():
+            # Same content is already stored
+            temp_path.unlink(missing_ok=True)
+            os.utime(path)
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, path)
+        try:
+            self._write_derivative(path, image_id)
+        except Exception as e:
+            # Processing falls back to the original
+            logger.warning(f"Could not create derivative for {image_id}: {e}")
+        return True
+
+    @stage_timer("derivative")
+    def _write_derivative(self, original: Path, image_id: str) -> None:
+        """Write a downscaled JPEG copy, large enough for CLIP preprocessing"""
+        size = (self.derivative_size, self.derivative_size)
+        with Image.open(original) as image:
+            # Let the JPEG decoder downscale while decoding
+            image.draft("RGB", size)
+            image = image.convert("RGB")
+            image.thumbnail(size, Image.LANCZOS)
+            derivative = self.derivative_path(image_id)
+            derivative.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_name = tempfile.mkstemp(dir=self.temp, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format="JPEG", quality=self.derivative_quality)
+            os.replace(temp_name, derivative)
+
+    def delete(self, image_id: str, keep_derivative: bool = False) -> int:
+        """
+        Remove an image from the store.
+
+        Args:
+            image_id: Image ID
+            keep_derivative: Only drop the original
+
+        Returns:
+            Number of bytes freed
+        """
+        paths = [self.original_path(image_id) if IMAGE_ID_PATTERN.match(image_id) else self.root / image_id]
+        if not keep_derivative and IMAGE_ID_PATTERN.match(image_id):
+            paths.append(self.derivative_path(image_id))
+        freed = 0
+        for path in paths:
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def iter_shards(self) -> Iterator[Dict[str, ShardEntry]]:
+        """Yield the images of each leaf shard directory, originals and derivatives together"""
+        def subdirectories(path: Path) -> List[str]:
+            if not path.is_dir():
+                return []
+            return [entry.name for entry in os.scandir(path) if entry.is_dir()]
+
+        for level1 in sorted(set(subdirectories(self.originals)) | set(subdirectories(self.derived))):
+            level2_names = set(subdirectories(self.originals / level1)) | set(subdirectories(self.derived / level1))
+            for level2 in sorted(level2_names):
+                images: Dict[str, ShardEntry] = {}
+                for kind, base in (("original", self.originals), ("derivative", self.derived)):
+                    directory = base / level1 / level2
+                    if not directory.is_dir():
+                        continue
+                    for entry in os.scandir(directory):
+                        if entry.is_file() and IMAGE_ID_PATTERN.match(entry.name):
+                            shard_entry = images.setdefault(entry.name, ShardEntry())
+                            stat = entry.stat()
+                            setattr(shard_entry, kind, stat)
+                            shard_entry.mtime = max(shard_entry.mtime, stat.st_mtime)
+                yield images
+
+    def iter_legacy(self, batch_size: int = 1000) -> Iterator[Dict[str, ShardEntry]]:
+        """Yield files left in the old flat layout, in batches"""
+        batch: Dict[str, ShardEntry] = {}
+        for entry in os.scandir(self.root):
+            if entry.is_file() and LEGACY_IMAGE_ID_PATTERN.match(entry.name):
+                stat = entry.stat()
+                batch[entry.name] = ShardEntry(original=stat, mtime=stat.st_mtime)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = {}
+        if batch:
+            yield batch
+
+    def disk_usage(self) -> Dict[str, int]:
+        """Count files and bytes per area of the store"""
+        usage = {}
+        for name, base in (("originals", self.originals), ("derived", self.derived)):
+            files = size = 0
+            for directory, _, filenames in os.walk(base):
+                for filename in filenames:
+                    files += 1
+                    size += os.path.getsize(os.path.join(directory, filename))
+            usage[f"{name}_files"] = files
+            usage[f"{name}_bytes"] = size
+        return usage
+
+def reference_counts(db: Session, image_ids: Iterable[str]) -> Dict[str, int]:
+    """
+    Count the searches that reference each image.
+
+    Args:
+        db: Database session
+        image_ids: Image IDs
+
+    Returns:
+        Reference count per image ID (zero counts omitted)
+    """
+    image_ids = list(image_ids)
+    if not image_ids:
+        return {}
+    rows = db.execute(
+        select(SearchHistory.image_path, func.count(SearchHistory.id))
+        .where(SearchHistory.image_path.in_(image_ids))
+        .group_by(SearchHistory.image_path)
+    )
+    return {image_path: count for image_path, count in rows}
+
+def collect_garbage(
+    store: ImageStore,
+    db: Session,
+    retention_hours: float,
+    original_retention_days: Optional[float] = None,
+    dry_run: bool = False,
+) -> GCStats:
+    """
+    Sweep the store, one shard directory at a time.
+
+    Images that no search references are deleted once they are older than
+    `retention_hours`. Referenced images are kept, but when
+    `original_retention_days` is set their originals are dropped after that
+    long, keeping only the derivative. Abandoned temporary files are removed
+    as well.
+
+    Args:
+        store: Image store
+        db: Database session
+        retention_hours: Grace period for unreferenced images
+        original_retention_days: Age after which referenced originals are dropped (optional)
+        dry_run: Only count what would be removed
+
+    Returns:
+        Sweep statistics
+    """
+    stats = GCStats()
+    now = time.time()
+    unreferenced_cutoff = now - retention_hours * 3600
+    original_cutoff = now - original_retention_days * 86400 if original_retention_days is not None else None
+
+    def sweep(images: Dict[str, ShardEntry]) -> None:
+        stats.scanned += len(images)
+        candidates = {image_id: entry for image_id, entry in images.items() if entry.mtime < unreferenced_cutoff}
+        counts = reference_counts(db, candidates)
+        for image_id, entry in candidates.items():
+            if counts.get(image_id):
+                stats.referenced += 1
+                if (
+                    original_cutoff is not None
+                    and entry.original is not None
+                    and entry.derivative is not None
+                    and entry.original.st_mtime < original_cutoff
+                ):
+                    stats.originals_dropped += 1
+                    stats.bytes_freed += entry.original.st_size
+                    if not dry_run:
+                        store.delete(image_id, keep_derivative=True)
+                continue
+            stats.deleted += 1
+            stats.bytes_freed += entry.size
+            if not dry_run:
+                store.delete(image_id)
+
+    for images in store.iter_shards():
+        sweep(images)
+    for images in store.iter_legacy():
+        sweep(images)
+
+    # Temporary files of uploads that never completed
+    for entry in os.scandir(store.temp):
+        if entry.is_file() and entry.stat().st_mtime < now - 3600:
+            stats.temp_files_deleted += 1
+            if not dry_run:
+                os.unlink(entry.path)
+
+    return stats
+
+# Create a singleton instance
+_image_store = None
+
+def get_image_store() -> ImageStore:
+    """
+    Get or create the upload image store.
+
+    Returns:
+        ImageStore instance
+    """
+    global _image_store
+    if _image_store is None:
+        _image_store = ImageStore(
+            settings.UPLOAD_FOLDER,
+            derivative_size=settings.UPLOAD_DERIVATIVE_SIZE,
+            derivative_quality=settings.UPLOAD_DERIVATIVE_QUALITY,
+        )
+    return _image_store
+
+def main() -> None:
+    if sys.argv[1:] not in (["gc"], ["gc", "--dry-run"]):
+        print(__doc__)
+        sys.exit(1)
+    db = SessionLocal()
+    try:
+        stats = collect_garbage(
+            get_image_store(),
+            db,
+            retention_hours=settings.UPLOAD_RETENTION_HOURS,
+            original_retention_days=settings.UPLOAD_ORIGINAL_RETENTION_DAYS,
+            dry_run="--dry-run" in sys.argv,
+        )
+    finally:
+        db.close()
+    print(json.dumps(asdict(stats), indent=2))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
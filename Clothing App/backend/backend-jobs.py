@@ -0,0 +1,421 @@
+"""
+Background jobs for image processing.
+
+Jobs are rows in the image_jobs table, so they survive restarts and can
+be run by worker threads inside the API process or by a separate worker
+process sharing the database:
+
+Usage (from the backend directory):
+    JOB_WORKERS=0 uvicorn main:app       # API only submits jobs
+    python -m app.services.jobs --workers 2
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import case, func, or_, select, update
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import ImageJob
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room"""
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for failures that retrying cannot fix"""
+
+def process_image(image_id: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Extract features from a stored image.
+
+    Args:
+        image_id: Image ID in the upload store
+
+    Returns:
+        Feature vector and result details
+    """
+    # Imported here so a worker process only loads the model when it runs a job
+    from app.ml.feature_extractor import get_feature_extractor
+    from app.services.image_store import get_image_store
+
+    image_path = get_image_store().processing_path(image_id)
+    if image_path is None:
+        raise PermanentJobError("Image not found")
+    features = get_feature_extractor().extract_clothing_features(image_path)
+    return features, {"vector_dimension": int(features.shape[0])}
+
+class JobQueue:
+    """
+    Database-backed job queue with a pool of worker threads.
+
+    Workers claim due jobs with a conditional update, so any number of
+    threads and processes can share the table. A claimed job records its
+    owner (host and pid) and a lease the owning process renews while it
+    runs; a running job whose lease expired belonged to a process that died
+    and is queued again by the next claim, or failed if it has no attempts
+    left. Failed jobs are retried with exponential backoff up to their max
+    attempts. Queued jobs can be cancelled outright; running jobs finish,
+    but their result is discarded.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[str], Tuple[np.ndarray, Dict[str, Any]]] = process_image,
+        workers: int = settings.JOB_WORKERS,
+        max_queue_size: int = settings.JOB_QUEUE_SIZE,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        retry_backoff: float = settings.JOB_RETRY_BACKOFF,
+        poll_interval: float = settings.JOB_POLL_INTERVAL,
+        lease_seconds: float = settings.JOB_LEASE_SECONDS,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        # Set in start(), so workers forked by serve.py each get their own
+        self.owner = ""
+        # Released once per submitted job, so idle workers wake up at once
+        self._wakeup = threading.Semaphore(0)
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._heartbeat: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.counts = {SUCCEEDED: 0, FAILED: 0, CANCELLED: 0, "retried": 0}
+        # (seconds queued, seconds running) of recent jobs run by this process
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=1000)
+
+    def start(self) -> None:
+        """Start the worker threads and the thread renewing their leases"""
+        if self._threads or self.workers <= 0:
+            return
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop_event.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._heartbeat = threading.Thread(target=self._renew_leases, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers after their current job"""
+        self._stop_event.set()
+        for _ in self._threads:
+            self._wakeup.release()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout)
+            self._heartbeat = None
+
+    def submit(self, image_ids: List[str], user_id: Optional[int] = None) -> List[ImageJob]:
+        """
+        Queue one processing job per image.
+
+        Args:
+            image_ids: Image IDs in the upload store
+            user_id: ID of the user submitting the jobs
+
+        Returns:
+            The created jobs
+
+        Raises:
+            QueueFullError: If the jobs do not fit in the queue
+        """
+        db = SessionLocal()
+        try:
+            queued = db.execute(select(func.count(ImageJob.id)).where(ImageJob.status == QUEUED)).scalar()
+            if queued + len(image_ids) > self.max_queue_size:
+                raise QueueFullError(f"Job queue is full ({queued} queued)")
+            now = datetime.utcnow()
+            jobs = [
+                ImageJob(
+                    id=uuid.uuid4().hex,
+                    user_id=user_id,
+                    image_id=image_id,
+                    status=QUEUED,
+                    attempts=0,
+                    max_attempts=self.max_attempts,
+                    cancel_requested=False,
+                    run_after=now,
+                    created_at=now,
+                )
+                for image_id in image_ids
+            ]
+            db.add_all(jobs)
+            db.commit()
+            for job in jobs:
+                db.refresh(job)
+                db.expunge(job)
+        finally:
+            db.close()
+        for _ in jobs:
+            self._wakeup.release()
+        return jobs
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        db = SessionLocal()
+        try:
+            job = db.get(ImageJob, job_id)
+            if job is not None:
+                db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def cancel(self, job_id: str) -> Optional[ImageJob]:
+        """
+        Cancel a job. Queued jobs are cancelled immediately; a running job
+        is marked and its result discarded when it finishes.
+
+        Returns:
+            The updated job, or None if it does not exist
+        """
+        db = SessionLocal()
+        try:
+            cancelled = db.execute(
+                update(ImageJob)
+                .where(ImageJob.id == job_id, ImageJob.status == QUEUED)
+                .values(status=CANCELLED, cancel_requested=True, finished_at=datetime.utcnow())
+            ).rowcount
+            db.execute(
+                update(ImageJob)
+                .where(ImageJob.id == job_id, ImageJob.status == RUNNING)
+                .values(cancel_requested=True)
+            )
+            db.commit()
+        finally:
+            db.close()
+        if cancelled:
+            with self._lock:
+                self.counts[CANCELLED] += 1
+        return self.get(job_id)
+
+    def _renew_leases(self) -> None:
+        """Extend the leases of the jobs this process runs, a third of a lease at a time"""
+        while not self._stop_event.wait(self.lease_seconds / 3):
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(ImageJob)
+                    .where(ImageJob.owner == self.owner, ImageJob.status == RUNNING)
+                    .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Could not renew job leases: {e}")
+            finally:
+                db.close()
+
+    def _claim(self) -> Optional[str]:
+        """Claim the next due job, returning its ID"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            # Running jobs whose owner stopped renewing the lease were interrupted
+            # (rows without a lease predate leases). They are queued again, unless
+            # they used up their attempts: a job that kills its worker (out of
+            # memory on a huge image, a native crash) would crash-loop workers
+            out_of_attempts = ImageJob.attempts >= ImageJob.max_attempts
+            expired = db.execute(
+                update(ImageJob)
+                .where(
+                    ImageJob.status == RUNNING,
+                    or_(ImageJob.lease_expires_at < now, ImageJob.lease_expires_at.is_(None)),
+                )
+                .values(
+                    status=case((out_of_attempts, FAILED), else_=QUEUED),
+                    error=case((out_of_attempts, "Worker lost while running the job"), else_=ImageJob.error),
+                    finished_at=case((out_of_attempts, now), else_=None),
+                    owner=None,
+                    lease_expires_at=None,
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if expired:
+                logger.info(f"Requeued or failed {expired} jobs with an expired lease")
+
+            candidates = db.execute(
+                select(ImageJob.id)
+                .where(ImageJob.status == QUEUED, ImageJob.run_after <= now)
+                .order_by(ImageJob.run_after, ImageJob.created_at)
+                .limit(self.workers + 1)
+            ).scalars().all()
+            for job_id in candidates:
+                claimed = db.execute(
+                    update(ImageJob)
+                    .where(ImageJob.id == job_id, ImageJob.status == QUEUED)
+                    .values(
+                        status=RUNNING,
+                        attempts=ImageJob.attempts + 1,
+                        started_at=now,
+                        owner=self.owner,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    )
+                ).rowcount
+                db.commit()
+                if claimed:
+                    return job_id
+            return None
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                job_id = self._claim()
+            except Exception as e:
+                logger.error(f"Could not claim a job: {e}")
+                job_id = None
+            if job_id is None:
+                self._wakeup.acquire(timeout=self.poll_interval)
+                continue
+            self._execute(job_id)
+
+    def _execute(self, job_id: str) -> None:
+        db = SessionLocal()
+        try:
+            job = db.get(ImageJob, job_id)
+            error: Optional[Exception] = None
+            try:
+                embedding, result = self.handler(job.image_id)
+            except Exception as e:
+                error = e
+
+            finished_at = datetime.utcnow()
+            db.refresh(job)
+            if job.owner != self.owner or job.status != RUNNING:
+                # The lease expired and another worker requeued or claimed the job
+                logger.warning(f"Job {job_id} lost its lease while running; discarding the result")
+                return
+            if job.cancel_requested:
+                job.status = CANCELLED
+                job.finished_at = finished_at
+            elif error is None:
+                job.status = SUCCEEDED
+                job.embedding = json.dumps(embedding.tolist())
+                job.result = result
+                job.error = None
+                job.finished_at = finished_at
+            elif isinstance(error, PermanentJobError) or job.attempts >= job.max_attempts:
+                job.status = FAILED
+                job.error = str(error)
+                job.finished_at = finished_at
+            else:
+                # Retry later with exponential backoff
+                job.status = QUEUED
+                job.owner = None
+                job.lease_expires_at = None
+                job.error = str(error)
+                job.run_after = finished_at + timedelta(seconds=self.retry_backoff * 2 ** (job.attempts - 1))
+            db.commit()
+
+            with self._lock:
+                if job.status == QUEUED:
+                    self.counts["retried"] += 1
+                else:
+                    self.counts[job.status] += 1
+                if job.status == SUCCEEDED:
+                    self._latencies.append((
+                        (job.started_at - job.created_at).total_seconds(),
+                        (finished_at - job.started_at).total_seconds(),
+                    ))
+            if error is not None:
+                logger.warning(f"Job {job_id} attempt {job.attempts} failed: {error}")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error running job {job_id}: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth, outcome counts and recent job latency"""
+        db = SessionLocal()
+        try:
+            by_status = dict(
+                db.execute(
+                    select(ImageJob.status, func.count(ImageJob.id))
+                    .where(ImageJob.status.in_([QUEUED, RUNNING]))
+                    .group_by(ImageJob.status)
+                ).all()
+            )
+        finally:
+            db.close()
+
+        with self._lock:
+            latencies = list(self._latencies)
+            counts = dict(self.counts)
+        stats = {
+            "workers": len(self._threads),
+            "queued": by_status.get(QUEUED, 0),
+            "running": by_status.get(RUNNING, 0),
+            **counts,
+        }
+        if latencies:
+            waits, runs = (np.array(values) * 1000 for values in zip(*latencies))
+            stats.update({
+                "wait_p50_ms": float(np.percentile(waits, 50)),
+                "wait_p95_ms": float(np.percentile(waits, 95)),
+                "run_p50_ms": float(np.percentile(runs, 50)),
+                "run_p95_ms": float(np.percentile(runs, 95)),
+            })
+        return stats
+
+# Create a singleton instance
+_job_queue = None
+
+def get_job_queue() -> JobQueue:
+    """
+    Get or create the job queue.
+
+    Returns:
+        JobQueue instance
+    """
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue()
+    return _job_queue
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=max(1, settings.JOB_WORKERS))
+    args = parser.parse_args()
+
+    job_queue = JobQueue(workers=args.workers)
+    job_queue.start()
+    logger.info(f"Processing jobs with {args.workers} workers")
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(json.dumps(job_queue.stats()))
+    except KeyboardInterrupt:
+        job_queue.stop()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,11 +1,18 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import auth, images, products
-from app.core.config import settings
-from app.db.database import engine, Base
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from app.core.config import ensure_directories, settings
+from app.core.metrics import render_metrics
+from app.core.middleware import BodySizeLimitMiddleware, MetricsMiddleware, ProfilingMiddleware
+from app.core.profiling import PROFILE_ROUTES_PREFIX, list_profiles, profile_artifact_path, require_profile_access
+from app.core.security import auth_cache_stats, get_password_hasher
+from app.db.database import init_db
+from app.services.admission import get_admission_controller
+from app.services.ecommerce import get_ecommerce_service
+from app.services.image_store import get_image_store
+from app.services.jobs import get_job_queue
+from app.services.search_history import get_search_history_writer
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -13,13 +20,30 @@ app = FastAPI(
     version="0.1.0",
 )
 
-# Set up CORS
+# Reject oversized request bodies before they are read; a batch search
+# carries up to SEARCH_BATCH_MAX_IMAGES files, each checked by read_upload
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_size=settings.MAX_CONTENT_LENGTH + settings.UPLOAD_FORM_OVERHEAD,
+    path_limits={
+        "/api/products/search/batch": settings.MAX_CONTENT_LENGTH * settings.SEARCH_BATCH_MAX_IMAGES + settings.UPLOAD_FORM_OVERHEAD,
+    },
+)
+
+# Profile sampled and debug-flagged requests
+app.add_middleware(ProfilingMiddleware)
+
+# Record request latency, including early rejections
+app.add_middleware(MetricsMiddleware)
+
+# Set up CORS (added last so it also wraps early rejections)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After", "X-Profile-Id"],
 )
 
 # Include API routers
@@ -27,10 +51,77 @@ app.include_router(auth.router, prefix="/api", tags=["authentication"])
 app.include_router(images.router, prefix="/api", tags=["images"])
 app.include_router(products.router, prefix="/api", tags=["products"])
 
+@app.on_event("startup")
+def prepare_storage():
+    # Runs before the other startup handlers; a no-op in workers forked by serve.py
+    ensure_directories()
+    init_db()
+
+@app.on_event("startup")
+def start_background_writers():
+    get_search_history_writer()
+    get_job_queue().start()
+
+@app.on_event("shutdown")
+def stop_background_writers():
+    # Flush queued search history before the process exits
+    get_search_history_writer().stop()
+    get_job_queue().stop()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await get_ecommerce_service().close()
+
+@app.on_event("shutdown")
+def stop_worker_pools():
+    get_admission_controller().shutdown()
+    get_password_hasher().shutdown()
+
 @app.get("/")
 def root():
     return {"message": "Welcome to the Clothing Recognition API"}
 
+@app.get("/uploads/{image_id}")
+def get_uploaded_image(image_id: str):
+    # Content-addressed images never change, so they can be cached indefinitely
+    path = get_image_store().resolve(image_id)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    return FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/metrics")
+def metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/stats/cache")
+def cache_stats():
+    return {"ecommerce": get_ecommerce_service().cache_stats(), "auth": auth_cache_stats()}
+
+@app.get("/stats/jobs")
+def job_stats():
+    return get_job_queue().stats()
+
+@app.get("/stats/admission")
+def admission_stats():
+    return get_admission_controller().stats()
+
+@app.get("/stats/auth")
+def auth_stats():
+    return {"password_hashing": get_password_hasher().stats()}
+
+@app.get(PROFILE_ROUTES_PREFIX, dependencies=[Depends(require_profile_access)])
+def profiles():
+    return list_profiles()
+
+@app.get(PROFILE_ROUTES_PREFIX + "/{profile_id}/{artifact}", dependencies=[Depends(require_profile_access)])
+def profile_artifact(profile_id: str, artifact: str):
+    # "json" is the summary, "folded" the sampled stacks, and *.trace.json torch traces
+    path = profile_artifact_path(profile_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    media_type = "text/plain" if artifact == "folded" else "application/json"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
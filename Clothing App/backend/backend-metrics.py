@@ -0,0 +1,281 @@
+"""
+Lightweight metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are kept in process, each behind its own
+lock, and rendered by /metrics. Recording a value costs a lock and a
+bisect, so timers can sit on the hot path of every search.
+
+Usage:
+    with stage_timer("decode"):
+        image = decode_image(content)
+
+    @stage_timer("encode")
+    def encode_images(...): ...
+"""
+import abc
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# Seconds, from sub-millisecond stages up to slow e-commerce calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+class Metric(abc.ABC):
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """(name suffix, label names, label values, value) of every sample"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+class _ValueMetric(Metric):
+    """
+    One value per label set, optionally read from a callback when metrics
+    are rendered: the callback returns a number, or a dictionary mapping
+    label value tuples to numbers.
+    """
+    # Appended to the metric name, in the TYPE line too
+    suffix = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], object]] = None,
+    ):
+        super().__init__(name + self.suffix, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                result = self.callback()
+            except Exception:
+                return []
+            if isinstance(result, dict):
+                return [("", self.labelnames, key, value) for key, value in result.items()]
+            return [("", (), (), result)]
+        with self._lock:
+            values = list(self._values.items())
+        return [("", self.labelnames, key, value) for key, value in values]
+
+class Counter(_ValueMetric):
+    """Monotonically increasing count, optionally per label set"""
+    type_name = "counter"
+    # Counters are exposed with the _total suffix
+    suffix = "_total"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+class Gauge(_ValueMetric):
+    """Value that goes up and down, set directly or read from a callback"""
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last is +Inf), sum]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        samples = []
+        names = self.labelnames + ("le",)
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(("_bucket", names, key + (_format_value(bound),), cumulative))
+            samples.append(("_count", self.labelnames, key, cumulative))
+            samples.append(("_sum", self.labelnames, key, total))
+        return samples
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    callback: Optional[Callable[[], object]] = None,
+) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames, callback))
+
+def gauge(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    callback: Optional[Callable[[], object]] = None,
+) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, callback))
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+STAGE_SECONDS = histogram("stage_duration_seconds", "Time spent in each stage of image search", ["stage"])
+REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "HTTP request latency by endpoint", ["method", "endpoint", "status"]
+)
+BATCH_SIZE = histogram("batch_size", "Items per batched operation", ["operation"], buckets=SIZE_BUCKETS)
+
+class stage_timer:
+    """
+    Record the duration of a stage in stage_duration_seconds, as a
+    context manager or a decorator. Does nothing when METRICS_ENABLED is off.
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self) -> "stage_timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if settings.METRICS_ENABLED:
+            STAGE_SECONDS.observe(time.perf_counter() - self.start, stage=self.stage)
+
+    def __call__(self, func: Callable) -> Callable:
+        stage = self.stage
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+def observe_batch(operation: str, size: int) -> None:
+    """Record the number of items in a batched operation"""
+    if settings.METRICS_ENABLED:
+        BATCH_SIZE.observe(size, operation=operation)
+
+# Caches by name, each with a function returning TTLCache-style stats
+_cache_stats: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+def register_cache(name: str, stats: Callable[[], Dict[str, float]]) -> None:
+    """
+    Expose a cache's stats (size, hits, stale_hits, misses, loads and
+    load_errors, whichever it has) as metrics labelled with its name.
+    """
+    _cache_stats[name] = stats
+
+def _cache_stat(stat: str) -> Callable[[], Dict[LabelValues, float]]:
+    def collect() -> Dict[LabelValues, float]:
+        values = {}
+        for name, stats in list(_cache_stats.items()):
+            value = stats().get(stat)
+            if value is not None:
+                values[(name,)] = value
+        return values
+    return collect
+
+gauge("cache_entries", "Entries held in each cache", ["cache"], callback=_cache_stat("size"))
+for _stat in ("hits", "stale_hits", "misses", "loads", "load_errors"):
+    counter(f"cache_{_stat}", f"Cache {_stat.replace('_', ' ')} by cache", ["cache"], callback=_cache_stat(_stat))
+
+def render_metrics() -> str:
+    """Render all metrics in the Prometheus text format"""
+    return REGISTRY.render()
@@ -0,0 +1,150 @@
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import REQUEST_SECONDS
+from app.core.profiling import PROFILE_ROUTES_PREFIX, profile_request, should_profile
+
+logger = logging.getLogger(__name__)
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies larger than a limit before they are read.
+
+    A declared Content-Length over the limit is answered with 413 straight
+    away. Bodies without one (chunked uploads) are counted as they arrive,
+    and reading stops with a 413 as soon as the limit is crossed, so an
+    oversized upload is never spooled in full. Routes taking several files
+    get their own limit in `path_limits`, keyed by the full request path.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_body_size = self.path_limits.get(scope["path"], self.max_body_size)
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_body_size:
+            response = JSONResponse(
+                {"detail": self._detail(max_body_size)},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=self._detail(max_body_size),
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    def _detail(max_body_size: int) -> str:
+        return f"Request body exceeds maximum limit of {max_body_size / (1024 * 1024):.1f}MB"
+
+class MetricsMiddleware:
+    """
+    Record the latency of every HTTP request by method, endpoint and
+    status. Endpoints are labelled with the name of the route function,
+    as resolved by the router, so path parameters do not multiply series.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched endpoint in the shared scope
+            endpoint = scope.get("endpoint")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                endpoint=getattr(endpoint, "__name__", "unmatched"),
+                status=str(status_code),
+            )
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of requests (PROFILE_SAMPLE_RATE), and any request
+    whose debug header carries PROFILE_TOKEN. A profiled response carries
+    an X-Profile-Id header naming the stored profile. Other requests only
+    pay for the sampling decision.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (settings.PROFILE_TOKEN or settings.PROFILE_SAMPLE_RATE > 0):
+            await self.app(scope, receive, send)
+            return
+
+        # Downloads carry the debug header too, but must not profile (and prune) themselves
+        if scope["path"].startswith(PROFILE_ROUTES_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        reason = should_profile(dict(scope["headers"]), random.random)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Unbound if profiling fails to start, in which case the error is raised as is
+        profile = None
+        try:
+            with profile_request(scope["method"], scope["path"], reason) as profile:
+                async def send_with_profile_id(message: Message) -> None:
+                    if message["type"] == "http.response.start":
+                        profile.status_code = message["status"]
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (b"x-profile-id", profile.id.encode())
+                        ]
+                    await send(message)
+
+                await self.app(scope, receive, send_with_profile_id)
+        finally:
+            # Stored for failed requests too, without a status if none was sent.
+            # The response may already be sent, so a failed save is only logged
+            if profile is not None:
+                try:
+                    await run_in_threadpool(profile.save)
+                except Exception as e:
+                    logger.error(f"Error saving profile {profile.id}: {str(e)}")
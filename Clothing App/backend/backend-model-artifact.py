@@ -0,0 +1,209 @@
+"""
+Local, memory-mapped CLIP model artifact.
+
+`clip.load` downloads the checkpoint on first use and deserializes it into
+freshly allocated memory in every process. Exporting the model once
+writes its float32 weights to MODEL_PATH as a torch checkpoint, with a
+manifest holding the model configuration and the file's SHA-256:
+
+    MODEL_PATH/clip-ViT-B-32.pt     the weights
+    MODEL_PATH/clip-ViT-B-32.json   the manifest
+
+Loading builds the model without allocating weights and assigns the
+tensors of the memory-mapped checkpoint to it, so no network access is
+needed, loading does not copy the weights, and processes using the same
+artifact share its read-only pages through the page cache. On CUDA the
+weights are copied to the GPU as usual.
+
+Usage (from the backend directory):
+    python -m app.ml.model_artifact export [--model ViT-B/32]
+    python -m app.ml.model_artifact verify
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+# Version of the artifact layout, recorded in the manifest
+ARTIFACT_FORMAT = "torch-mmap-v1"
+
+class ModelArtifactError(Exception):
+    """Raised when the model artifact is missing, incomplete or corrupt"""
+
+def artifact_paths(model_name: str, directory: Optional[Path] = None) -> Tuple[Path, Path]:
+    """Weights and manifest paths of a model's artifact"""
+    directory = Path(directory or settings.MODEL_PATH)
+    # A model name like "ViT-B/32", or a checkpoint path as clip.load accepts
+    name = Path(model_name).stem if os.path.isfile(model_name) else model_name
+    slug = re.sub(r"[^A-Za-z0-9._-]", "-", name)
+    return directory / f"clip-{slug}.pt", directory / f"clip-{slug}.json"
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def clip_config(state_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """CLIP constructor arguments for a state dict, as clip.model.build_model infers them"""
+    if "visual.proj" not in state_dict:
+        raise ModelArtifactError("Only ViT CLIP models can be exported")
+    vision_patch_size = state_dict["visual.conv1.weight"].shape[-1]
+    grid_size = round((state_dict["visual.positional_embedding"].shape[0] - 1) ** 0.5)
+    transformer_width = state_dict["ln_final.weight"].shape[0]
+    return {
+        "embed_dim": state_dict["text_projection"].shape[1],
+        "image_resolution": vision_patch_size * grid_size,
+        "vision_layers": len([k for k in state_dict if k.startswith("visual.") and k.endswith(".attn.in_proj_weight")]),
+        "vision_width": state_dict["visual.conv1.weight"].shape[0],
+        "vision_patch_size": vision_patch_size,
+        "context_length": state_dict["positional_embedding"].shape[0],
+        "vocab_size": state_dict["token_embedding.weight"].shape[0],
+        "transformer_width": transformer_width,
+        "transformer_heads": transformer_width // 64,
+        "transformer_layers": len({k.split(".")[2] for k in state_dict if k.startswith("transformer.resblocks")}),
+    }
+
+def export_clip(model_name: str, directory: Optional[Path] = None, download_root: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write a CLIP model's artifact, downloading the checkpoint if needed.
+
+    Args:
+        model_name: Name from clip.available_models() or a checkpoint path
+        directory: Destination directory (default: MODEL_PATH)
+        download_root: Where clip.load keeps downloaded checkpoints (default: MODEL_PATH)
+
+    Returns:
+        The manifest
+    """
+    import clip
+    import torch
+
+    weights_path, manifest_path = artifact_paths(model_name, directory)
+    weights_path.parent.mkdir(parents=True, exist_ok=True)
+    model, _ = clip.load(model_name, device="cpu", download_root=download_root or str(settings.MODEL_PATH))
+    state_dict = {key: tensor.float().contiguous() for key, tensor in model.state_dict().items()}
+
+    # Written under temporary names, the manifest last, so a reader never sees a partial artifact
+    temporary = weights_path.with_suffix(".pt.tmp")
+    torch.save(state_dict, temporary)
+    os.replace(temporary, weights_path)
+    manifest = {
+        "model": model_name,
+        "format": ARTIFACT_FORMAT,
+        "weights": weights_path.name,
+        "bytes": weights_path.stat().st_size,
+        "sha256": file_sha256(weights_path),
+        "dtype": "float32",
+        "config": clip_config(state_dict),
+        "torch_version": torch.__version__,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    temporary = manifest_path.with_suffix(".json.tmp")
+    temporary.write_text(json.dumps(manifest, indent=2))
+    os.replace(temporary, manifest_path)
+    return manifest
+
+def read_manifest(model_name: str, directory: Optional[Path] = None, verify: bool = True) -> Dict[str, Any]:
+    """
+    Read and check a model's manifest against its weights file.
+
+    Raises:
+        ModelArtifactError: The artifact is missing, or does not match its manifest
+    """
+    weights_path, manifest_path = artifact_paths(model_name, directory)
+    if not manifest_path.is_file() or not weights_path.is_file():
+        raise ModelArtifactError(
+            f"No artifact for {model_name} in {weights_path.parent}; "
+            "run `python -m app.ml.model_artifact export` where the checkpoint can be downloaded"
+        )
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ModelArtifactError(f"{manifest_path} has format {manifest.get('format')!r}, expected {ARTIFACT_FORMAT!r}")
+    if weights_path.stat().st_size != manifest["bytes"]:
+        raise ModelArtifactError(f"{weights_path} is {weights_path.stat().st_size} bytes, expected {manifest['bytes']}")
+    if verify and file_sha256(weights_path) != manifest["sha256"]:
+        raise ModelArtifactError(f"{weights_path} does not match the checksum in {manifest_path}")
+    return manifest
+
+def artifact_exists(model_name: str, directory: Optional[Path] = None) -> bool:
+    weights_path, manifest_path = artifact_paths(model_name, directory)
+    return weights_path.is_file() and manifest_path.is_file()
+
+def load_clip_artifact(model_name: str, device: str, directory: Optional[Path] = None, verify: bool = True):
+    """
+    Load a CLIP model from its artifact without copying the weights.
+
+    Args:
+        model_name: Name the artifact was exported under
+        device: "cpu" or "cuda"
+        directory: Artifact directory (default: MODEL_PATH)
+        verify: Check the weights against the manifest's SHA-256 first
+
+    Returns:
+        The model in evaluation mode
+    """
+    import torch
+    from clip.model import CLIP, convert_weights
+
+    manifest = read_manifest(model_name, directory, verify)
+    weights_path, _ = artifact_paths(model_name, directory)
+    state_dict = torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
+
+    # Parameters on the meta device take no memory; assign=True makes the mapped tensors the parameters
+    with torch.device("meta"):
+        model = CLIP(**manifest["config"])
+    model.load_state_dict(state_dict, assign=True)
+    # The text transformer's causal mask is a plain attribute, created on the meta device above
+    attn_mask = model.build_attention_mask()
+    for block in model.transformer.resblocks:
+        block.attn_mask = attn_mask
+
+    if device != "cpu":
+        model = model.to(device)
+        # Half precision on the GPU, as clip.load does
+        convert_weights(model)
+    return model.eval()
+
+def load_clip(device: str):
+    """
+    The CLIP model for feature extraction: from the artifact in MODEL_PATH
+    when there is one, otherwise through clip.load, which downloads the
+    checkpoint to MODEL_PATH unless MODEL_OFFLINE is set.
+    """
+    if artifact_exists(settings.CLIP_MODEL):
+        return load_clip_artifact(settings.CLIP_MODEL, device, verify=settings.MODEL_VERIFY_CHECKSUM)
+    if settings.MODEL_OFFLINE:
+        # Raises with instructions
+        read_manifest(settings.CLIP_MODEL)
+
+    import clip
+    model, _ = clip.load(settings.CLIP_MODEL, device=device, download_root=str(settings.MODEL_PATH))
+    return model.eval()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "verify"])
+    parser.add_argument("--model", default=settings.CLIP_MODEL, help="CLIP model name or checkpoint path")
+    parser.add_argument("--directory", type=Path, default=settings.MODEL_PATH)
+    parser.add_argument("--download-root", help="Where clip.load keeps downloaded checkpoints (default: MODEL_PATH)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            manifest = export_clip(args.model, args.directory, args.download_root)
+        else:
+            manifest = read_manifest(args.model, args.directory, verify=True)
+    except ModelArtifactError as e:
+        raise SystemExit(str(e))
+    print(json.dumps(manifest, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Float, Text, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, DateTime, Float, Text, JSON
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -19,17 +19,22 @@ class SearchHistory(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    image_path = Column(String)
+    image_path = Column(String, index=True)  # Image ID in the upload store
     search_date = Column(DateTime, default=datetime.utcnow)
     results = relationship("SearchResult", back_populates="search")
     
     user = relationship("User", back_populates="searches")
+    
+    __table_args__ = (
+        # Serves per-user history pages ordered by (search_date, id)
+        Index("ix_search_history_user_date_id", "user_id", "search_date", "id"),
+    )
 
 class SearchResult(Base):
     __tablename__ = "search_results"
     
     id = Column(Integer, primary_key=True, index=True)
-    search_id = Column(Integer, ForeignKey("search_history.id"))
+    search_id = Column(Integer, ForeignKey("search_history.id"), index=True)
     product_id = Column(String, index=True)
     similarity_score = Column(Float)
     result_data = Column(JSON)  # Store product details (brand, model, price, etc.)
@@ -50,5 +55,33 @@ class Product(Base):
     image_url = Column(String)
     product_url = Column(String)
     feature_vector = Column(Text)  # Serialized feature vector for FAISS
+    content_hash = Column(String(64))  # Hash of the upstream product data, for catalog sync
+    source_updated_at = Column(DateTime)  # updated_at reported by the e-commerce API
+    last_synced_at = Column(DateTime, index=True)  # Start of the last sync run that saw this product
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ImageJob(Base):
+    __tablename__ = "image_jobs"
+    
+    id = Column(String(32), primary_key=True)  # UUID hex
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    image_id = Column(String, index=True)  # Image ID in the upload store
+    status = Column(String(16), default="queued")  # queued, running, succeeded, failed, cancelled
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    cancel_requested = Column(Boolean, default=False)
+    owner = Column(String)  # host:pid of the process running the job
+    lease_expires_at = Column(DateTime)  # Requeued if still running after this (its owner died)
+    error = Column(Text)
+    embedding = Column(Text)  # Serialized feature vector
+    result = Column(JSON)
+    run_after = Column(DateTime, default=datetime.utcnow)  # Not picked up before this (retry backoff)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    __table_args__ = (
+        # Serves workers claiming the next due job
+        Index("ix_image_jobs_status_run_after", "status", "run_after"),
+    )
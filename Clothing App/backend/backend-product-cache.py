@@ -0,0 +1,170 @@
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Any, Optional, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import counter, stage_timer
+from app.db.models import Product
+from app.services.ecommerce import get_ecommerce_service
+
+PRODUCT_LOOKUPS = counter("product_lookups", "Products hydrated for search results by source", ["source"])
+
+class ProductCache:
+    """
+    Read-through, size-bounded cache of product metadata used to hydrate
+    search matches. Lookups go cache -> database -> e-commerce API, and each
+    backing store is hit at most once per batch of product IDs.
+    """
+
+    def __init__(self, max_size: int = settings.PRODUCT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, product_id: int) -> Optional[Dict[str, Any]]:
+        """Get a cached product, marking it as recently used"""
+        with self._lock:
+            product = self._entries.get(product_id)
+            if product is not None:
+                self._entries.move_to_end(product_id)
+            return product
+
+    def put(self, product_id: int, product: Dict[str, Any]) -> None:
+        """Add a product to the cache, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[product_id] = product
+            self._entries.move_to_end(product_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, product_id: Optional[int] = None) -> None:
+        """Drop one product from the cache, or all of them if no ID is given"""
+        with self._lock:
+            if product_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(product_id, None)
+
+    async def get_many(self, db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Get metadata for several products.
+
+        Args:
+            db: Database session
+            product_ids: Product IDs as stored in the vector index
+
+        Returns:
+            Dictionary mapping product ID to product metadata. Products that
+            could not be found anywhere are left out.
+        """
+        products: Dict[int, Dict[str, Any]] = {}
+        async for found in self.iter_many(db, product_ids):
+            products.update(found)
+        return products
+
+    async def iter_many(self, db: AsyncSession, product_ids: Iterable[int]) -> AsyncIterator[Dict[int, Dict[str, Any]]]:
+        """
+        Get metadata for several products, one backing store at a time, so
+        cached products can be used before the slower lookups finish.
+
+        Args:
+            db: Database session
+            product_ids: Product IDs as stored in the vector index
+
+        Yields:
+            Dictionaries mapping product ID to product metadata: cached
+            products first, then those loaded from the database, then those
+            fetched from the e-commerce API. Empty stages are skipped.
+        """
+        cached: Dict[int, Dict[str, Any]] = {}
+        missing: List[int] = []
+
+        for product_id in dict.fromkeys(product_ids):
+            product = self.get(product_id)
+            if product is not None:
+                cached[product_id] = product
+            else:
+                missing.append(product_id)
+
+        if cached:
+            PRODUCT_LOOKUPS.inc(len(cached), source="cache")
+            yield cached
+        if not missing:
+            return
+
+        # Load every missing product from the database in a single query
+        loaded: Dict[int, Dict[str, Any]] = {}
+        with stage_timer("hydrate_db"):
+            result = await db.execute(select(Product).where(Product.id.in_(missing)))
+            for product in result.scalars().all():
+                loaded[product.id] = self._from_db(product)
+                self.put(product.id, loaded[product.id])
+
+        if loaded:
+            PRODUCT_LOOKUPS.inc(len(loaded), source="database")
+            yield loaded
+        missing = [pid for pid in missing if pid not in loaded]
+        if not missing:
+            return
+
+        # Fall back to one batched e-commerce lookup for the rest
+        fetched: Dict[int, Dict[str, Any]] = {}
+        external_ids = {f"clothing_{pid}": pid for pid in missing}
+        ecommerce_service = get_ecommerce_service()
+        with stage_timer("hydrate_ecommerce"):
+            fetch_result = await ecommerce_service.get_multiple_products(list(external_ids))
+        for product_data in fetch_result.products:
+            product_id = external_ids.get(product_data.get("id"))
+            if product_id is None:
+                continue
+            fetched[product_id] = self._from_api(product_id, product_data)
+            self.put(product_id, fetched[product_id])
+
+        if len(fetched) < len(missing):
+            PRODUCT_LOOKUPS.inc(len(missing) - len(fetched), source="missing")
+        if fetched:
+            PRODUCT_LOOKUPS.inc(len(fetched), source="ecommerce")
+            yield fetched
+
+    @staticmethod
+    def _from_db(product: Product) -> Dict[str, Any]:
+        """Convert a database product to cached metadata"""
+        return {
+            "product_id": str(product.id),
+            "brand": product.brand,
+            "name": product.name,
+            "category": product.category,
+            "description": product.description,
+            "price": product.price,
+            "currency": product.currency,
+            "image_url": product.image_url,
+            "product_url": product.product_url,
+        }
+
+    @staticmethod
+    def _from_api(product_id: int, product_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert an e-commerce API product to cached metadata"""
+        return {
+            "product_id": str(product_id),
+            "brand": product_data.get("brand", ""),
+            "name": product_data.get("name", ""),
+            "category": product_data.get("category", ""),
+            "description": product_data.get("description", ""),
+            "price": product_data.get("price", 0.0),
+            "currency": product_data.get("currency", "USD"),
+            "image_url": product_data.get("image_url", ""),
+            "product_url": product_data.get("product_url", ""),
+        }
+
+# Singleton instance of the product cache
+_product_cache = None
+
+def get_product_cache() -> ProductCache:
+    """Get singleton instance of ProductCache"""
+    global _product_cache
+    if _product_cache is None:
+        _product_cache = ProductCache()
+    return _product_cache
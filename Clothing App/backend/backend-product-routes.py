@@ -1,17 +1,32 @@
 import os
 import json
-from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+import time
+import base64
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+import numpy as np
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, status, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
 from app.core.config import settings
-from app.db.database import get_db
+from app.db.database import AsyncSessionLocal, get_async_db
 from app.db.models import User, SearchHistory, SearchResult, Product
 from app.core.security import get_current_user, get_current_user_optional
 from app.ml.feature_extractor import get_feature_extractor
+from app.ml.image_processor import ImageSource, decode_image, load_image
 from app.ml.vector_search import get_vector_search
+from app.services.admission import get_admission_controller, request_priority
+from app.services.catalog import get_catalog_store
 from app.services.ecommerce import get_ecommerce_service
+from app.services.image_store import get_image_store
+from app.services.product_cache import get_product_cache
+from app.services.search_history import get_search_history_writer
+from app.services.uploads import read_upload
 
 router = APIRouter()
 
@@ -31,15 +46,142 @@ class ProductMatch(BaseModel):
 class SearchResponse(BaseModel):
     """Response model for search endpoint"""
     search_id: Optional[int] = None
+    image_id: Optional[str] = None
     matches: List[ProductMatch]
     message: str
 
+class BatchSearchResponse(BaseModel):
+    """Response model for batch search endpoint"""
+    results: List[SearchResponse]
+    image_count: int
+
+class RegionMatches(BaseModel):
+    """Model for the matches of one garment region"""
+    box: List[int]  # left, top, right, bottom in pixels of the searched image
+    score: float
+    matches: List[ProductMatch]
+
+class RegionSearchResponse(BaseModel):
+    """Response model for region search endpoint"""
+    image_id: Optional[str] = None
+    image_width: int
+    image_height: int
+    regions: List[RegionMatches]
+    cost_ms: Dict[str, float]
+    message: str
+
+async def _match_products_batch(
+    features: np.ndarray,
+    limit: int,
+    threshold: float,
+    db: AsyncSession,
+) -> List[List[ProductMatch]]:
+    """
+    Find and hydrate the products most similar to each of several images,
+    with one vector search and one product lookup for the whole batch.
+    
+    Args:
+        features: Feature vectors of the query images, one per row
+        limit: Maximum number of results per image
+        threshold: Similarity threshold (0-1)
+        db: Database session
+        
+    Returns:
+        Matched products in ranking order, one list per image
+    """
+    # Search for similar products
+    vector_search = get_vector_search()
+    matches_per_image = vector_search.search_batch(features, k=limit)
+    
+    # Filter by threshold
+    matches_per_image = [
+        [(pid, score) for pid, score in matches if score >= threshold]
+        for matches in matches_per_image
+    ]
+    
+    # Get product details (cache, then one database query, then one e-commerce call)
+    product_cache = get_product_cache()
+    products = await product_cache.get_many(
+        db,
+        [product_id for matches in matches_per_image for product_id, _ in matches]
+    )
+    
+    # Keep the ranking order of the vector search
+    return [
+        [
+            ProductMatch(similarity_score=similarity_score, **products[product_id])
+            for product_id, similarity_score in matches
+            if product_id in products
+        ]
+        for matches in matches_per_image
+    ]
+
+async def _match_products(
+    features: np.ndarray,
+    limit: int,
+    threshold: float,
+    db: AsyncSession,
+) -> List[ProductMatch]:
+    """
+    Find and hydrate the products most similar to an image.
+    
+    Args:
+        features: Feature vector of the query image
+        limit: Maximum number of results
+        threshold: Similarity threshold (0-1)
+        db: Database session
+        
+    Returns:
+        Matched products in ranking order
+    """
+    return (await _match_products_batch(features.reshape(1, -1), limit, threshold, db))[0]
+
+def _search_response(
+    product_matches: List[ProductMatch],
+    limit: int,
+    search_id: Optional[int] = None,
+    image_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build a search response, suggesting products when nothing matched"""
+    # For MVP, if no matches are found, return sample products
+    if not product_matches:
+        sample_products = get_catalog_store().head(limit)
+        
+        for product in sample_products:
+            product_match = ProductMatch(
+                product_id=product.get("id", ""),
+                similarity_score=0.5,  # Default similarity
+                brand=product.get("brand", ""),
+                name=product.get("name", ""),
+                category=product.get("category", ""),
+                description=product.get("description", ""),
+                price=product.get("price", 0.0),
+                currency=product.get("currency", "USD"),
+                image_url=product.get("image_url", ""),
+                product_url=product.get("product_url", "")
+            )
+            product_matches.append(product_match)
+        
+        return {
+            "search_id": search_id,
+            "image_id": image_id,
+            "matches": product_matches,
+            "message": "No exact matches found. Showing suggested products."
+        }
+    
+    return {
+        "search_id": search_id,
+        "image_id": image_id,
+        "matches": product_matches,
+        "message": f"Found {len(product_matches)} matching products"
+    }
+
 @router.get("/products/search/{image_id}", response_model=SearchResponse)
 async def search_products_by_image(
     image_id: str,
     limit: int = Query(5, ge=1, le=20),
     threshold: float = Query(0.5, ge=0, le=1.0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional),
 ):
     """
@@ -56,140 +198,482 @@ async def search_products_by_image(
         Search results with matched products
     """
     try:
-        # Check if image exists
-        image_path = settings.UPLOAD_FOLDER / image_id
-        if not os.path.exists(image_path):
+        # Check if image exists, and use its resized copy for extraction
+        image_path = get_image_store().processing_path(image_id)
+        if image_path is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Image not found"
             )
         
-        # Get feature extractor and vector search
+        # Extract features from the image, once admitted to the worker pool
         feature_extractor = get_feature_extractor()
-        vector_search = get_vector_search()
+        features = await get_admission_controller().run(
+            feature_extractor.extract_clothing_features,
+            image_path,
+            priority=request_priority(current_user is not None)
+        )
         
-        # Extract features from the image
-        features = feature_extractor.extract_clothing_features(image_path)
+        product_matches = await _match_products(features, limit, threshold, db)
         
-        # Search for similar products
-        matches = vector_search.search(features, k=limit)
+        # Queue search results for recording if user is logged in.
+        # History is written in the background, so no search ID is known yet.
+        if current_user:
+            search_history_writer = get_search_history_writer()
+            await search_history_writer.record(
+                current_user.id,
+                image_id,
+                [match.dict() for match in product_matches]
+            )
+        
+        return _search_response(product_matches, limit, image_id=image_id)
         
-        # Filter by threshold
-        matches = [(pid, score) for pid, score in matches if score >= threshold]
+    except HTTPException as e:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        # Handle other exceptions
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching products: {str(e)}"
+        )
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _ranking(matches: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+    """Product IDs and scores of vector search matches, in ranking order"""
+    return [
+        {"product_id": str(product_id), "similarity_score": similarity_score}
+        for product_id, similarity_score in matches
+    ]
+
+@router.get("/products/search/{image_id}/stream")
+async def stream_products_by_image(
+    image_id: str,
+    limit: int = Query(5, ge=1, le=20),
+    threshold: float = Query(0.5, ge=0, le=1.0),
+    refine: bool = Query(False),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    """
+    Search for products similar to an uploaded image, streaming results as
+    server-sent events as soon as each stage finishes.
+    
+    Events, in order:
+        matches: product IDs and scores from the vector search
+        product: one ProductMatch per event, cached products first, then
+            those loaded from the database, then the e-commerce API
+        refined: (only with refine) product IDs and scores re-ranked with
+            a feature vector fused from augmented views. Products not sent
+            yet are sent as product events first.
+        done: the final SearchResponse
+        error: replaces the remaining events if a later stage fails
+    
+    Args:
+        image_id: Image ID (filename)
+        limit: Maximum number of results (1-20)
+        threshold: Similarity threshold (0-1)
+        refine: Re-rank with augmented views after the first results (optional)
+        current_user: Current user (optional)
         
-        # Get product details
-        ecommerce_service = get_ecommerce_service()
-        product_matches = []
+    Returns:
+        Stream of server-sent events
+    """
+    try:
+        # Check if image exists, and use its resized copy for extraction
+        image_path = get_image_store().processing_path(image_id)
+        if image_path is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Image not found"
+            )
         
-        for product_id, similarity_score in matches:
-            # Get product from database
-            product = db.query(Product).filter(Product.id == product_id).first()
-            
-            if product:
-                # Use database product
-                product_match = ProductMatch(
-                    product_id=str(product.id),
-                    similarity_score=similarity_score,
-                    brand=product.brand,
-                    name=product.name,
-                    category=product.category,
-                    description=product.description,
-                    price=product.price,
-                    currency=product.currency,
-                    image_url=product.image_url,
-                    product_url=product.product_url
-                )
-            else:
-                # Fallback to e-commerce API
-                product_data = ecommerce_service.get_product_by_id(f"clothing_{product_id}")
-                if product_data:
-                    product_match = ProductMatch(
-                        product_id=str(product_id),
-                        similarity_score=similarity_score,
-                        brand=product_data.get("brand", ""),
-                        name=product_data.get("name", ""),
-                        category=product_data.get("category", ""),
-                        description=product_data.get("description", ""),
-                        price=product_data.get("price", 0.0),
-                        currency=product_data.get("currency", "USD"),
-                        image_url=product_data.get("image_url", ""),
-                        product_url=product_data.get("product_url", "")
+        # Extract features and search before streaming, so errors get a status code
+        feature_extractor = get_feature_extractor()
+        admission_controller = get_admission_controller()
+        priority = request_priority(current_user is not None)
+        features = await admission_controller.run(
+            feature_extractor.extract_clothing_features,
+            image_path,
+            priority=priority
+        )
+        
+        vector_search = get_vector_search()
+        matches = [(pid, score) for pid, score in vector_search.search(features, k=limit) if score >= threshold]
+        
+    except HTTPException as e:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        # Handle other exceptions
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching products: {str(e)}"
+        )
+    
+    async def events() -> AsyncIterator[str]:
+        yield _sse_event("matches", {"image_id": image_id, "matches": _ranking(matches)})
+        try:
+            product_cache = get_product_cache()
+            products: Dict[int, Dict[str, Any]] = {}
+            # The request's session is closed once the response starts, so use our own
+            async with AsyncSessionLocal() as db:
+                async for found in product_cache.iter_many(db, [pid for pid, _ in matches]):
+                    products.update(found)
+                    for product_id, similarity_score in matches:
+                        if product_id in found:
+                            yield _sse_event("product", ProductMatch(similarity_score=similarity_score, **found[product_id]).dict())
+                
+                final_matches = matches
+                if refine:
+                    fused_features = await admission_controller.run(
+                        feature_extractor.extract_fused_clothing_features,
+                        image_path,
+                        priority=priority
                     )
-                else:
-                    # Skip if product not found
-                    continue
+                    final_matches = [
+                        (pid, score)
+                        for pid, score in vector_search.search(fused_features, k=limit)
+                        if score >= threshold
+                    ]
+                    searched = {pid for pid, _ in matches}
+                    new_ids = [pid for pid, _ in final_matches if pid not in searched]
+                    async for found in product_cache.iter_many(db, new_ids):
+                        products.update(found)
+                        for product_id, similarity_score in final_matches:
+                            if product_id in found:
+                                yield _sse_event("product", ProductMatch(similarity_score=similarity_score, **found[product_id]).dict())
+                    yield _sse_event("refined", {"image_id": image_id, "matches": _ranking(final_matches)})
             
-            product_matches.append(product_match)
-        
-        # Record search results if user is logged in
-        search_id = None
-        if current_user:
-            # Find search history or create new
-            search_history = db.query(SearchHistory).filter(
-                SearchHistory.user_id == current_user.id,
-                SearchHistory.image_path == os.path.basename(image_path)
-            ).first()
+            product_matches = [
+                ProductMatch(similarity_score=similarity_score, **products[product_id])
+                for product_id, similarity_score in final_matches
+                if product_id in products
+            ]
             
-            if not search_history:
-                search_history = SearchHistory(
-                    user_id=current_user.id,
-                    image_path=os.path.basename(image_path)
+            # Queue search results for recording if user is logged in
+            if current_user:
+                search_history_writer = get_search_history_writer()
+                await search_history_writer.record(
+                    current_user.id,
+                    image_id,
+                    [match.dict() for match in product_matches]
                 )
-                db.add(search_history)
-                db.commit()
-                db.refresh(search_history)
             
-            search_id = search_history.id
+            response = SearchResponse(**_search_response(product_matches, limit, image_id=image_id))
+            yield _sse_event("done", response.dict())
             
-            # Record search results
-            for match in product_matches:
-                search_result = SearchResult(
-                    search_id=search_id,
-                    product_id=match.product_id,
-                    similarity_score=match.similarity_score,
-                    result_data={
-                        "brand": match.brand,
-                        "name": match.name,
-                        "price": match.price,
-                        "currency": match.currency,
-                        "image_url": match.image_url,
-                        "product_url": match.product_url
-                    }
+        except Exception as e:
+            # The status code is already sent, so report the error as an event
+            detail = e.detail if isinstance(e, HTTPException) else f"Error searching products: {str(e)}"
+            yield _sse_event("error", {"detail": detail})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _persist_search(
+    file_content: bytes,
+    image_id: str,
+    user_id: Optional[int],
+    product_matches: List[ProductMatch],
+) -> None:
+    """Save a one-shot search image and queue its history after the response"""
+    await run_in_threadpool(get_image_store().put_bytes, file_content, image_id)
+    if user_id is not None:
+        await get_search_history_writer().record(
+            user_id,
+            image_id,
+            [match.dict() for match in product_matches]
+        )
+
+@router.post("/products/search", response_model=SearchResponse)
+async def search_products_by_upload(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    limit: int = Query(5, ge=1, le=20),
+    threshold: float = Query(0.5, ge=0, le=1.0),
+    save_image: bool = Query(False),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    """
+    Upload an image and search for similar products in one request.
+    The image is decoded and embedded in memory. It is only written to
+    disk, after the response, when save_image is set, and only saved
+    searches are recorded in the search history.
+    
+    Args:
+        background_tasks: Tasks run after the response is sent
+        file: Image file to search with
+        limit: Maximum number of results (1-20)
+        threshold: Similarity threshold (0-1)
+        save_image: Keep the image and record the search (optional)
+        db: Database session
+        current_user: Current user (optional)
+        
+    Returns:
+        Search results with matched products
+    """
+    try:
+        # Read the spooled upload in chunks, checking type, dimensions and size as it is read
+        file_content, _ = await read_upload(file)
+        
+        # Decode the image in memory, off the event loop
+        try:
+            image = await run_in_threadpool(decode_image, file_content)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File is not a valid image"
+            )
+        
+        # Extract features from the image, once admitted to the worker pool
+        feature_extractor = get_feature_extractor()
+        features = await get_admission_controller().run(
+            feature_extractor.extract_clothing_features,
+            image,
+            priority=request_priority(current_user is not None)
+        )
+        
+        product_matches = await _match_products(features, limit, threshold, db)
+        
+        # Optionally keep the image, off the response path
+        image_id = None
+        if save_image:
+            # Hashing the whole upload would block the event loop
+            image_id = await run_in_threadpool(get_image_store().image_id_for, file_content)
+            background_tasks.add_task(
+                _persist_search,
+                file_content,
+                image_id,
+                current_user.id if current_user else None,
+                list(product_matches)
+            )
+        
+        return _search_response(product_matches, limit, image_id=image_id)
+        
+    except HTTPException as e:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        # Handle other exceptions
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching products: {str(e)}"
+        )
+
+@router.post("/products/search/batch", response_model=BatchSearchResponse)
+async def search_products_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    image_ids: Optional[List[str]] = Form(None),
+    limit: int = Query(5, ge=1, le=20),
+    threshold: float = Query(0.5, ge=0, le=1.0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    """
+    Search for products similar to several images in one request.
+    The images are prepared in parallel and embedded in one batched forward
+    pass, then searched with one vector index query and hydrated with one
+    product lookup. Searches by image ID are recorded in the search history.
+    Each file may be up to MAX_CONTENT_LENGTH, and the request body up to
+    that times SEARCH_BATCH_MAX_IMAGES.
+    
+    Args:
+        files: Image files to search with (optional)
+        image_ids: IDs of uploaded images to search with (optional)
+        limit: Maximum number of results per image (1-20)
+        threshold: Similarity threshold (0-1)
+        db: Database session
+        current_user: Current user (optional)
+        
+    Returns:
+        One search result per image, image IDs first, then files, in the
+        order they were sent
+    """
+    try:
+        files = files or []
+        image_ids = image_ids or []
+        image_count = len(image_ids) + len(files)
+        if image_count == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No images given"
+            )
+        if image_count > settings.SEARCH_BATCH_MAX_IMAGES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {settings.SEARCH_BATCH_MAX_IMAGES} images per batch"
+            )
+        
+        # Use the resized copies of stored images
+        image_store = get_image_store()
+        images: List[ImageSource] = []
+        for image_id in image_ids:
+            image_path = image_store.processing_path(image_id)
+            if image_path is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Image not found: {image_id}"
                 )
-                db.add(search_result)
-            
-            db.commit()
+            images.append(image_path)
         
-        # For MVP, if no matches are found, return sample products
-        if not product_matches:
-            ecommerce_service = get_ecommerce_service()
-            sample_products = ecommerce_service._get_mock_products()[:limit]
-            
-            for product in sample_products:
-                product_match = ProductMatch(
-                    product_id=product.get("id", ""),
-                    similarity_score=0.5,  # Default similarity
-                    brand=product.get("brand", ""),
-                    name=product.get("name", ""),
-                    category=product.get("category", ""),
-                    description=product.get("description", ""),
-                    price=product.get("price", 0.0),
-                    currency=product.get("currency", "USD"),
-                    image_url=product.get("image_url", ""),
-                    product_url=product.get("product_url", "")
+        # Read the uploads in chunks with the usual checks, then decode them in parallel
+        file_contents = [(await read_upload(file))[0] for file in files]
+        try:
+            images.extend(await asyncio.gather(*(
+                run_in_threadpool(decode_image, file_content)
+                for file_content in file_contents
+            )))
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File is not a valid image"
+            )
+        del file_contents
+        
+        # Extract features from all images, once admitted to the worker pool
+        feature_extractor = get_feature_extractor()
+        features = await get_admission_controller().run(
+            feature_extractor.extract_clothing_features_batch,
+            images,
+            priority=request_priority(current_user is not None)
+        )
+        
+        matches_per_image = await _match_products_batch(features, limit, threshold, db)
+        
+        # Queue the searches of stored images for recording if user is logged in
+        if current_user:
+            search_history_writer = get_search_history_writer()
+            for image_id, product_matches in zip(image_ids, matches_per_image):
+                await search_history_writer.record(
+                    current_user.id,
+                    image_id,
+                    [match.dict() for match in product_matches]
                 )
-                product_matches.append(product_match)
-            
-            return {
-                "search_id": search_id,
-                "matches": product_matches,
-                "message": "No exact matches found. Showing suggested products."
-            }
         
+        result_image_ids = image_ids + [None] * len(files)
         return {
-            "search_id": search_id,
-            "matches": product_matches,
-            "message": f"Found {len(product_matches)} matching products"
+            "results": [
+                _search_response(product_matches, limit, image_id=image_id)
+                for image_id, product_matches in zip(result_image_ids, matches_per_image)
+            ],
+            "image_count": image_count,
+        }
+        
+    except HTTPException as e:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        # Handle other exceptions
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching products: {str(e)}"
+        )
+
+@router.post("/products/search/regions", response_model=RegionSearchResponse)
+async def search_products_by_region(
+    file: Optional[UploadFile] = File(None),
+    image_id: Optional[str] = Form(None),
+    limit: int = Query(5, ge=1, le=20),
+    threshold: float = Query(0.5, ge=0, le=1.0),
+    max_regions: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    """
+    Search for products matching each garment in an image, such as the
+    top, trousers and shoes of an outfit. Garment regions are proposed by
+    app.ml.region_proposal, embedded in one batched forward pass, searched
+    with one vector index query and hydrated with one product lookup.
+    Searches by image ID are recorded in the search history.
+    
+    Args:
+        file: Image file to search with (optional)
+        image_id: ID of an uploaded image to search with (optional)
+        limit: Maximum number of results per region (1-20)
+        threshold: Similarity threshold (0-1)
+        max_regions: Maximum number of regions (default and at most REGION_MAX)
+        db: Database session
+        current_user: Current user (optional)
+        
+    Returns:
+        Matches per region, largest region first, and the time spent on
+        proposal, embedding and search in ms, with embedding and search
+        per region
+    """
+    try:
+        if (file is None) == (image_id is None):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Give either a file or an image ID"
+            )
+        
+        if image_id is not None:
+            # Use the resized copy of a stored image
+            image_path = get_image_store().processing_path(image_id)
+            if image_path is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Image not found"
+                )
+            image = await run_in_threadpool(load_image, image_path)
+        else:
+            # Read the image in chunks with the usual checks, then decode it in memory off the event loop
+            file_content, _ = await read_upload(file)
+            try:
+                image = await run_in_threadpool(decode_image, file_content)
+            except Exception:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="File is not a valid image"
+                )
+            del file_content
+        
+        # Find and embed the garments, once admitted to the worker pool
+        feature_extractor = get_feature_extractor()
+        regions, features, seconds = await get_admission_controller().run(
+            feature_extractor.extract_region_features,
+            image,
+            min(max_regions or settings.REGION_MAX, settings.REGION_MAX),
+            priority=request_priority(current_user is not None)
+        )
+        
+        start = time.perf_counter()
+        matches_per_region = await _match_products_batch(features, limit, threshold, db)
+        seconds["search"] = time.perf_counter() - start
+        
+        # Queue the search for recording if user is logged in, with the
+        # matches of all regions, each product once
+        if current_user and image_id is not None:
+            recorded = {}
+            for product_matches in matches_per_region:
+                for match in product_matches:
+                    recorded.setdefault(match.product_id, match.dict())
+            await get_search_history_writer().record(
+                current_user.id,
+                image_id,
+                list(recorded.values())
+            )
+        
+        cost_ms = {stage: elapsed * 1000 for stage, elapsed in seconds.items()}
+        cost_ms["per_region"] = (cost_ms["embedding"] + cost_ms["search"]) / len(regions)
+        match_count = sum(len(product_matches) for product_matches in matches_per_region)
+        return {
+            "image_id": image_id,
+            "image_width": image.width,
+            "image_height": image.height,
+            "regions": [
+                {"box": list(region.box), "score": region.score, "matches": product_matches}
+                for region, product_matches in zip(regions, matches_per_region)
+            ],
+            "cost_ms": cost_ms,
+            "message": f"Found {match_count} matching products in {len(regions)} regions",
         }
         
     except HTTPException as e:
@@ -202,6 +686,101 @@ async def search_products_by_image(
             detail=f"Error searching products: {str(e)}"
         )
 
+class SearchHistoryItem(BaseModel):
+    """Model for a search history item"""
+    id: int
+    image_path: str
+    search_date: str
+    result_count: int
+
+def _encode_history_cursor(search: SearchHistory) -> str:
+    """Encode the keyset position (search_date, id) of a history row"""
+    value = f"{search.search_date.isoformat()}|{search.id}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+def _decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor created by _encode_history_cursor"""
+    try:
+        search_date, search_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(search_date), int(search_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+@router.get("/products/history", response_model=List[SearchHistoryItem])
+async def get_search_history(
+    response: Response,
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get search history for the current user, newest first.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    
+    Args:
+        limit: Maximum number of results
+        cursor: Cursor returned by the previous page (optional)
+        db: Database session
+        current_user: Current user
+        
+    Returns:
+        List of search history items
+    """
+    try:
+        # Get one page of the user's search history, seeking past the cursor
+        query = select(SearchHistory).where(
+            SearchHistory.user_id == current_user.id
+        )
+        if cursor:
+            search_date, search_id = _decode_history_cursor(cursor)
+            query = query.where(or_(
+                SearchHistory.search_date < search_date,
+                and_(SearchHistory.search_date == search_date, SearchHistory.id < search_id)
+            ))
+        result = await db.execute(query.order_by(
+            SearchHistory.search_date.desc(), SearchHistory.id.desc()
+        ).limit(limit))
+        searches = result.scalars().all()
+        
+        # Count results for the whole page in one grouped query
+        result_counts = {}
+        if searches:
+            result = await db.execute(select(
+                SearchResult.search_id, func.count(SearchResult.id)
+            ).where(
+                SearchResult.search_id.in_([search.id for search in searches])
+            ).group_by(SearchResult.search_id))
+            result_counts = dict(result.all())
+        
+        # Format response
+        history_items = [
+            SearchHistoryItem(
+                id=search.id,
+                image_path=search.image_path,
+                search_date=search.search_date.isoformat(),
+                result_count=result_counts.get(search.id, 0)
+            )
+            for search in searches
+        ]
+        
+        if len(searches) == limit:
+            response.headers["X-Next-Cursor"] = _encode_history_cursor(searches[-1])
+        
+        return history_items
+        
+    except HTTPException as e:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting search history: {str(e)}"
+        )
+
 class ProductDetails(BaseModel):
     """Model for product details"""
     id: str
@@ -217,7 +796,7 @@ class ProductDetails(BaseModel):
 @router.get("/products/{product_id}", response_model=ProductDetails)
 async def get_product_details(
     product_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Get details for a specific product.
@@ -235,16 +814,18 @@ async def get_product_details(
         
         # Check if product ID is numeric
         if product_id.isdigit():
-            product = db.query(Product).filter(Product.id == int(product_id)).first()
+            result = await db.execute(select(Product).where(Product.id == int(product_id)))
+            product = result.scalars().first()
         
         # If not found, check by external ID
         if not product:
-            product = db.query(Product).filter(Product.external_id == product_id).first()
+            result = await db.execute(select(Product).where(Product.external_id == product_id))
+            product = result.scalars().first()
         
         # If still not found, try e-commerce API
         if not product:
             ecommerce_service = get_ecommerce_service()
-            product_data = ecommerce_service.get_product_by_id(product_id)
+            product_data = await ecommerce_service.get_product_by_id(product_id)
             
             if product_data:
                 return ProductDetails(
@@ -286,57 +867,3 @@ async def get_product_details(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error getting product details: {str(e)}"
         )
-
-class SearchHistoryItem(BaseModel):
-    """Model for a search history item"""
-    id: int
-    image_path: str
-    search_date: str
-    result_count: int
-
-@router.get("/products/history", response_model=List[SearchHistoryItem])
-async def get_search_history(
-    limit: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
-    """
-    Get search history for the current user.
-    
-    Args:
-        limit: Maximum number of results
-        db: Database session
-        current_user: Current user
-        
-    Returns:
-        List of search history items
-    """
-    try:
-        # Get user's search history
-        searches = db.query(SearchHistory).filter(
-            SearchHistory.user_id == current_user.id
-        ).order_by(SearchHistory.search_date.desc()).limit(limit).all()
-        
-        # Format response
-        history_items = []
-        for search in searches:
-            # Count results
-            result_count = db.query(SearchResult).filter(
-                SearchResult.search_id == search.id
-            ).count()
-            
-            # Add to response
-            history_items.append(SearchHistoryItem(
-                id=search.id,
-                image_path=search.image_path,
-                search_date=search.search_date.isoformat(),
-                result_count=result_count
-            ))
-        
-        return history_items
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error getting search history: {str(e)}"
-        )
@@ -0,0 +1,268 @@
+"""
+Opt-in profiling of individual requests.
+
+A profiled request runs with a stack sampler: a thread that records the
+Python stacks of the request's threads every PROFILE_INTERVAL seconds.
+Those are the event loop thread and any worker thread running
+work for the request via `follow_thread`. Samples are stored as
+folded stacks (one "frame;frame;frame count" line per stack), which
+flamegraph.pl and speedscope render as a flame graph. Time the event
+loop spends waiting on I/O shows up under its selector.
+
+Code that runs torch wraps itself in `torch_profile(label)` to record
+operator timings with torch.profiler; each recording is stored as a
+Chrome trace next to the stacks, and the top operators are listed in the
+profile summary.
+
+Outside of a profiled request, `follow_thread` and `torch_profile` cost
+a context variable lookup.
+"""
+import functools
+import hmac
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Top torch operators kept in the summary, by total CPU time
+TORCH_TOP_OPERATORS = 30
+
+# Path of the routes listing and downloading profiles
+PROFILE_ROUTES_PREFIX = "/debug/profiles"
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+class StackSampler:
+    """Sample the stacks of a set of threads at a fixed interval"""
+
+    def __init__(self, thread_ids: Set[int], interval: float):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident in list(self.thread_ids):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+class RequestProfile:
+    """Stacks and torch operator timings recorded for one request"""
+
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = datetime.utcnow()
+        self.status_code: Optional[int] = None
+        self.duration = 0.0
+        self.threads: Set[int] = {threading.get_ident()}
+        self.sampler = StackSampler(self.threads, settings.PROFILE_INTERVAL)
+        self.torch_traces: List[Dict[str, Any]] = []
+
+    def artifact_path(self, name: str) -> Path:
+        return settings.PROFILE_DIR / f"{self.id}.{name}"
+
+    def save(self) -> None:
+        """Write the folded stacks and summary, then prune old profiles"""
+        settings.PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(self.artifact_path("folded"), "w") as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        summary = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "started_at": self.started_at.isoformat(),
+            "status_code": self.status_code,
+            "duration_ms": self.duration * 1000,
+            "samples": self.sampler.samples,
+            "interval_ms": self.sampler.interval * 1000,
+            "torch": self.torch_traces,
+            "artifacts": ["folded"] + [trace["artifact"] for trace in self.torch_traces],
+        }
+        # The summary is written last, so listed profiles are complete
+        self.artifact_path("json").write_text(json.dumps(summary, indent=2))
+        prune_profiles()
+
+_active_profile: ContextVar[Optional[RequestProfile]] = ContextVar("active_profile", default=None)
+
+# torch.profiler supports one recording per process at a time
+_torch_profiler_lock = threading.Lock()
+
+@contextmanager
+def profile_request(method: str, path: str, reason: str) -> Iterator[RequestProfile]:
+    """Profile the code run inside the block, and store the result"""
+    profile = RequestProfile(method, path, reason)
+    token = _active_profile.set(profile)
+    profile.sampler.start()
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.duration = time.perf_counter() - start
+        profile.sampler.stop()
+        _active_profile.reset(token)
+
+def follow_thread(func: Callable) -> Callable:
+    """
+    Wrap a function about to be handed to a worker thread so that, during
+    a profiled request, the thread is sampled and the profile stays active
+    there. Returns the function unchanged otherwise.
+    """
+    profile = _active_profile.get()
+    if profile is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        token = _active_profile.set(profile)
+        profile.threads.add(ident)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.threads.discard(ident)
+            _active_profile.reset(token)
+    return wrapper
+
+@contextmanager
+def torch_profile(label: str) -> Iterator[None]:
+    """
+    Record torch operator timings for the block when the current request
+    is being profiled. Skipped when another recording is in progress.
+    """
+    profile = _active_profile.get()
+    if profile is None or not _torch_profiler_lock.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        import torch
+        from torch.profiler import ProfilerActivity
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        with torch.profiler.profile(activities=activities, record_shapes=True) as recording:
+            yield
+
+        # Runs on the request path, so a failure to store the recording (a full
+        # disk, an unwritable PROFILE_DIR) is only logged
+        try:
+            artifact = f"{label}-{len(profile.torch_traces)}.trace.json"
+            settings.PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            recording.export_chrome_trace(str(profile.artifact_path(artifact)))
+            operators = sorted(recording.key_averages(), key=lambda event: -event.cpu_time_total)
+            profile.torch_traces.append({
+                "label": label,
+                "artifact": artifact,
+                "operators": [
+                    {
+                        "name": event.key,
+                        "calls": event.count,
+                        "cpu_total_ms": event.cpu_time_total / 1000,
+                        "self_cpu_ms": event.self_cpu_time_total / 1000,
+                    }
+                    for event in operators[:TORCH_TOP_OPERATORS]
+                ],
+            })
+        except Exception as e:
+            logger.error(f"Error storing torch trace {label!r} of profile {profile.id}: {str(e)}")
+    finally:
+        _torch_profiler_lock.release()
+
+def should_profile(headers: Dict[bytes, bytes], sample: Callable[[], float]) -> Optional[str]:
+    """
+    Why a request should be profiled ("header" or "sampled"), or None.
+    The debug header must carry PROFILE_TOKEN; sampling draws from
+    `sample` only when PROFILE_SAMPLE_RATE is set.
+    """
+    if settings.PROFILE_TOKEN:
+        value = headers.get(settings.PROFILE_HEADER.lower().encode("latin-1"))
+        if value is not None and hmac.compare_digest(value, settings.PROFILE_TOKEN.encode()):
+            return "header"
+    if settings.PROFILE_SAMPLE_RATE > 0 and sample() < settings.PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+def _summary_paths() -> List[Path]:
+    """Summary files of stored profiles, newest first"""
+    if not settings.PROFILE_DIR.exists():
+        return []
+    summaries = [path for path in settings.PROFILE_DIR.glob("*.json") if _PROFILE_ID.match(path.stem)]
+    return sorted(summaries, key=lambda path: path.stat().st_mtime, reverse=True)
+
+def prune_profiles() -> None:
+    """Delete the oldest profiles beyond PROFILE_MAX_STORED"""
+    for summary in _summary_paths()[settings.PROFILE_MAX_STORED:]:
+        for path in settings.PROFILE_DIR.glob(f"{summary.stem}.*"):
+            path.unlink(missing_ok=True)
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Summaries of stored profiles, newest first, without operator tables"""
+    profiles = []
+    for path in _summary_paths():
+        try:
+            summary = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        summary.pop("torch", None)
+        profiles.append(summary)
+    return profiles
+
+def profile_artifact_path(profile_id: str, artifact: str) -> Optional[Path]:
+    """Path of a stored artifact ("json", "folded" or a torch trace), if it exists"""
+    if not _PROFILE_ID.match(profile_id) or "/" in artifact or artifact.startswith("."):
+        return None
+    path = settings.PROFILE_DIR / f"{profile_id}.{artifact}"
+    return path if path.is_file() else None
+
+def require_profile_access(request: Request) -> None:
+    """
+    Dependency for the profile download routes: the debug header must carry
+    PROFILE_TOKEN. The routes do not exist while no token is configured.
+    """
+    if not settings.PROFILE_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    token = request.headers.get(settings.PROFILE_HEADER)
+    if token is None or not hmac.compare_digest(token.encode(), settings.PROFILE_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
@@ -0,0 +1,260 @@
+"""
+Region proposal: boxes likely to hold separate garments.
+
+An outfit photo embedded as a whole gives one blended vector that matches
+none of its garments well. A proposer instead returns several boxes,
+which are cropped and embedded one by one. Proposers are registered by
+name and chosen with REGION_PROPOSER:
+
+  center     the centre 60% of the image, one region (the single-garment
+             crop extract_region_of_interest takes)
+  saliency   the foreground, told apart from the colour along the image
+             border, split into separate items and, within an item such
+             as a person, into bands of distinct colour (top, trousers)
+
+Both run on the CPU in milliseconds, the saliency proposer on a
+thumbnail. It suits product and outfit photos against a plain
+background; when the border is too busy to tell the background from it,
+it falls back to the centre crop. A detector can be plugged in with
+register_region_proposer.
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.core.metrics import observe_batch, stage_timer
+from app.ml.image_processor import center_crop_box
+
+# Approximate longest side of the thumbnail the saliency proposer works on
+THUMBNAIL_SIZE = 128
+
+# Min colour distance from the background for a pixel to be foreground
+FOREGROUND_DISTANCE = 40.0
+
+# Above this median distance of border pixels from their median colour,
+# the background is not uniform enough to separate the foreground from
+BUSY_BORDER_DISTANCE = 30.0
+
+# Min colour distance between two bands of an item to split it between them
+BAND_SPLIT_DISTANCE = 45.0
+
+# Min band height as a fraction of the item's height
+MIN_BAND_FRACTION = 0.15
+
+# Padding around each box as a fraction of its size
+BOX_PADDING = 0.05
+
+# Largest items considered; smaller ones are ignored
+MAX_COMPONENTS = 32
+
+@dataclass
+class Region:
+    """A proposed garment region"""
+    box: Tuple[int, int, int, int]  # left, top, right, bottom in image pixels
+    score: float  # Share of the foreground it covers, or detector confidence
+
+# A proposer takes an RGB image and the max number of regions, and returns
+# regions by descending score
+RegionProposer = Callable[[Image.Image, int], List[Region]]
+
+_proposers: Dict[str, RegionProposer] = {}
+
+def register_region_proposer(name: str, proposer: RegionProposer) -> None:
+    """Make a proposer available under a name for REGION_PROPOSER"""
+    _proposers[name] = proposer
+
+def get_region_proposer(name: Optional[str] = None) -> RegionProposer:
+    """
+    Get a registered proposer, by default the one REGION_PROPOSER names.
+
+    Raises:
+        ValueError: No proposer is registered under the name
+    """
+    name = name or settings.REGION_PROPOSER
+    if name not in _proposers:
+        raise ValueError(f"Unknown region proposer {name!r}, expected one of {sorted(_proposers)}")
+    return _proposers[name]
+
+@stage_timer("region_proposal")
+def propose_regions(image: Image.Image, max_regions: Optional[int] = None) -> List[Region]:
+    """
+    Propose garment regions in an image with the configured proposer.
+
+    Args:
+        image: RGB image
+        max_regions: Max regions returned (default: REGION_MAX)
+
+    Returns:
+        At least one region, by descending score
+    """
+    max_regions = max_regions or settings.REGION_MAX
+    regions = get_region_proposer()(image, max_regions)[:max_regions]
+    if not regions:
+        regions = center_proposer(image, max_regions)
+    observe_batch("regions", len(regions))
+    return regions
+
+def center_proposer(image: Image.Image, max_regions: int) -> List[Region]:
+    """The centre crop as the only region"""
+    return [Region(box=center_crop_box(*image.size), score=1.0)]
+
+def _dilate(mask: np.ndarray, size: int) -> np.ndarray:
+    """Set every pixel within a size x size square of a set pixel"""
+    height, width = mask.shape
+    padded = np.pad(mask, size // 2)
+    result = np.zeros_like(mask)
+    for dy in range(size):
+        for dx in range(size):
+            result |= padded[dy:dy + height, dx:dx + width]
+    return result
+
+def _erode(mask: np.ndarray, size: int) -> np.ndarray:
+    """Keep the pixels whose size x size square is all set"""
+    return ~_dilate(~mask, size)
+
+def _label_components(mask: np.ndarray) -> List[np.ndarray]:
+    """
+    Masks of the largest connected components of a boolean mask, largest
+    first. Runs of set pixels in each row are joined to the runs they touch
+    in the row above, so the Python loops are over runs, not pixels.
+    """
+    runs: List[Tuple[int, int, int]] = []  # row, start, end
+    parent: List[int] = []
+
+    def find(run: int) -> int:
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    above: List[int] = []
+    for y, row in enumerate(mask):
+        edges = np.flatnonzero(np.diff(np.concatenate([[False], row, [False]]).astype(np.int8)))
+        current = []
+        for start, end in zip(edges[::2], edges[1::2]):
+            run = len(runs)
+            runs.append((y, int(start), int(end)))
+            parent.append(run)
+            for other in above:
+                _, other_start, other_end = runs[other]
+                if other_start < end and start < other_end:
+                    parent[find(run)] = find(other)
+            current.append(run)
+        above = current
+
+    groups: Dict[int, List[int]] = {}
+    areas: Dict[int, int] = {}
+    for run, (_, start, end) in enumerate(runs):
+        root = find(run)
+        groups.setdefault(root, []).append(run)
+        areas[root] = areas.get(root, 0) + end - start
+
+    components = []
+    for root in sorted(groups, key=lambda root: -areas[root])[:MAX_COMPONENTS]:
+        component = np.zeros_like(mask, dtype=bool)
+        for run in groups[root]:
+            y, start, end = runs[run]
+            component[y, start:end] = True
+        components.append(component)
+    return components
+
+def _split_bands(component: np.ndarray, pixels: np.ndarray) -> List[np.ndarray]:
+    """
+    Split an item into horizontal bands of distinct colour, so a person
+    wearing a top and trousers gives one region for each.
+    """
+    rows = np.flatnonzero(component.any(axis=1))
+    top, bottom = rows[0], rows[-1] + 1
+    height = bottom - top
+    min_band = max(2, int(height * MIN_BAND_FRACTION))
+    if height < 2 * min_band:
+        return [component]
+
+    # Mean colour of the item in each row, smoothed over a window wider than
+    # a typical stripe so patterns do not split a garment
+    counts = component[top:bottom].sum(axis=1)
+    sums = (pixels[top:bottom] * component[top:bottom, :, None]).sum(axis=1)
+    row_colours = sums / np.maximum(counts, 1)[:, None]
+    kernel = np.ones(max(1, min_band // 2)) / max(1, min_band // 2)
+    smoothed = np.stack([np.convolve(row_colours[:, c], kernel, mode="same") for c in range(3)], axis=1)
+
+    # Distance between the mean colours of the min_band rows above and
+    # below each possible cut, from prefix sums
+    prefix = np.concatenate([np.zeros((1, 3)), np.cumsum(smoothed, axis=0)])
+    positions = np.arange(min_band, height - min_band + 1)
+    above = (prefix[positions] - prefix[positions - min_band]) / min_band
+    below = (prefix[positions + min_band] - prefix[positions]) / min_band
+    distances = np.linalg.norm(above - below, axis=1)
+
+    # Cut where the colours differ most, while that is enough and every
+    # band keeps a min height
+    cuts = [0, height]
+    while True:
+        allowed = np.ones(len(positions), dtype=bool)
+        for cut in cuts:
+            allowed &= np.abs(positions - cut) >= min_band
+        candidates = np.where(allowed, distances, 0.0)
+        best = int(np.argmax(candidates))
+        if candidates[best] <= BAND_SPLIT_DISTANCE:
+            break
+        cuts = sorted(cuts + [int(positions[best])])
+
+    bands = []
+    for start, end in zip(cuts, cuts[1:]):
+        band = np.zeros_like(component)
+        band[top + start:top + end] = component[top + start:top + end]
+        bands.append(band)
+    return bands
+
+def saliency_proposer(image: Image.Image, max_regions: int) -> List[Region]:
+    """Garments as foreground items and colour bands, see the module docstring"""
+    # Averaging blocks of pixels, the cheapest way to shrink an image in PIL
+    factor = max(1, max(image.size) // THUMBNAIL_SIZE)
+    pixels = np.asarray(image.reduce(factor), dtype=np.float32)
+    height, width = pixels.shape[:2]
+
+    # The background colour is taken from the border
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    background = np.median(border, axis=0)
+    if np.median(np.linalg.norm(border - background, axis=1)) > BUSY_BORDER_DISTANCE:
+        return []
+
+    # Foreground mask, with specks removed and small gaps closed
+    distance = np.linalg.norm(pixels - background, axis=2)
+    foreground = distance > FOREGROUND_DISTANCE
+    foreground = _dilate(_erode(foreground, 3), 3)
+    foreground = _erode(_dilate(foreground, 5), 5)
+    foreground_area = foreground.sum()
+    if foreground_area == 0:
+        return []
+
+    min_area = settings.REGION_MIN_AREA * height * width
+    parts = []
+    for component in _label_components(foreground):
+        if component.sum() < min_area:
+            break
+        parts.extend(band for band in _split_bands(component, pixels) if band.sum() >= min_area)
+
+    # Boxes in image pixels, padded and clipped to the image
+    scale_x, scale_y = image.width / width, image.height / height
+    regions = []
+    for part in parts:
+        rows = np.flatnonzero(part.any(axis=1))
+        columns = np.flatnonzero(part.any(axis=0))
+        pad_x = (columns[-1] + 1 - columns[0]) * BOX_PADDING
+        pad_y = (rows[-1] + 1 - rows[0]) * BOX_PADDING
+        box = (
+            max(0, int((columns[0] - pad_x) * scale_x)),
+            max(0, int((rows[0] - pad_y) * scale_y)),
+            min(image.width, int(np.ceil((columns[-1] + 1 + pad_x) * scale_x))),
+            min(image.height, int(np.ceil((rows[-1] + 1 + pad_y) * scale_y))),
+        )
+        regions.append(Region(box=box, score=float(part.sum() / foreground_area)))
+    regions.sort(key=lambda region: -region.score)
+    return regions[:max_regions]
+
+register_region_proposer("center", center_proposer)
+register_region_proposer("saliency", saliency_proposer)
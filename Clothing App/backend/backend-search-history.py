@@ -0,0 +1,241 @@
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import counter, observe_batch, stage_timer
+from app.db.database import SessionLocal
+from app.db.models import SearchHistory, SearchResult
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DROPPED = counter("search_history_dropped", "Searches not recorded, by reason", ["reason"])
+
+# Errors caused by the records themselves (a dangling reference, a value the
+# column rejects, a malformed match), as opposed to the database being unavailable
+RECORD_ERRORS = (IntegrityError, DataError, KeyError, TypeError)
+
+class SearchHistoryWriter:
+    """
+    Write-behind recorder for user search history.
+    Searches are queued in memory and written by a background thread in
+    batches, so the request that produced them does not wait on the database.
+    A batch rejected because of its records is split in halves and
+    retried, so a bad record only loses itself. A batch that fails for
+    other reasons (the database is down) is retried whole with backoff,
+    then dropped.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = settings.HISTORY_QUEUE_SIZE,
+        batch_size: int = settings.HISTORY_BATCH_SIZE,
+        flush_interval: float = settings.HISTORY_FLUSH_INTERVAL,
+        enqueue_timeout: float = settings.HISTORY_ENQUEUE_TIMEOUT,
+        write_retries: int = settings.HISTORY_WRITE_RETRIES,
+        retry_backoff: float = settings.HISTORY_RETRY_BACKOFF,
+    ):
+        """
+        Args:
+            max_queue_size: Maximum number of searches waiting to be written
+            batch_size: Number of searches that triggers a flush
+            flush_interval: Maximum seconds a search waits before being flushed
+            enqueue_timeout: Seconds a request waits for room in a full queue
+                before its search is dropped
+            write_retries: Retries of a batch the database failed to write
+            retry_backoff: Seconds before the first retry, doubled per retry
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+        self.dropped = 0
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the background writer thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="search-history-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the writer thread after flushing everything still queued"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    async def record(self, user_id: int, image_path: str, matches: List[Dict[str, Any]]) -> bool:
+        """
+        Queue a search and its matches for recording.
+
+        Args:
+            user_id: ID of the user who searched
+            image_path: Image ID (filename) that was searched
+            matches: Matched products as dictionaries of ProductMatch fields
+
+        Returns:
+            True if the search was queued, False if it was dropped
+        """
+        record = {"user_id": user_id, "image_path": image_path, "matches": matches}
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            pass
+
+        # Apply backpressure: wait for room off the event loop, then give up
+        try:
+            await run_in_threadpool(self._queue.put, record, True, self.enqueue_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            HISTORY_DROPPED.inc(reason="queue_full")
+            logger.warning(f"Search history queue full, dropped search for user {user_id}")
+            return False
+
+    def _run(self) -> None:
+        """Collect queued searches into batches and flush them"""
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+
+        # Drain whatever is left on shutdown
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _collect_batch(self) -> List[Dict[str, Any]]:
+        """Wait until a batch is full or the flush interval has passed"""
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    @stage_timer("history_flush")
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        """Write a batch of searches, dropping only the records that cannot be written"""
+        observe_batch("history_flush", len(batch))
+        for attempt in range(self.write_retries + 1):
+            try:
+                self._write(batch)
+                return
+            except RECORD_ERRORS:
+                self._write_halves(batch)
+                return
+            except Exception as e:
+                if attempt == self.write_retries:
+                    HISTORY_DROPPED.inc(len(batch), reason="database_error")
+                    logger.error(f"Dropped {len(batch)} searches after {attempt + 1} attempts: {str(e)}")
+                    return
+                logger.warning(f"Error recording {len(batch)} searches, retrying: {str(e)}")
+                # Cut short on shutdown, which still drains the queue
+                self._stop_event.wait(self.retry_backoff * 2 ** attempt)
+
+    def _write_halves(self, batch: List[Dict[str, Any]]) -> None:
+        """Bisect a batch with bad records; each half is its own transaction"""
+        if len(batch) == 1:
+            HISTORY_DROPPED.inc(reason="invalid_record")
+            logger.error(f"Dropped invalid search for user {batch[0]['user_id']}")
+            return
+        middle = len(batch) // 2
+        for half in (batch[:middle], batch[middle:]):
+            try:
+                self._write(half)
+            except RECORD_ERRORS:
+                self._write_halves(half)
+            except Exception as e:
+                HISTORY_DROPPED.inc(len(half), reason="database_error")
+                logger.error(f"Dropped {len(half)} searches: {str(e)}")
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        """Write a batch of searches with bulk inserts, in one transaction"""
+        db = SessionLocal()
+        try:
+            # Find existing history rows for the batch in one query
+            user_ids = {record["user_id"] for record in batch}
+            image_paths = {record["image_path"] for record in batch}
+            history_ids: Dict[Tuple[int, str], int] = {}
+            rows = db.query(SearchHistory.id, SearchHistory.user_id, SearchHistory.image_path).filter(
+                SearchHistory.user_id.in_(user_ids),
+                SearchHistory.image_path.in_(image_paths),
+            ).all()
+            for history_id, user_id, image_path in rows:
+                history_ids.setdefault((user_id, image_path), history_id)
+
+            # Create the missing history rows
+            new_histories = []
+            for record in batch:
+                key = (record["user_id"], record["image_path"])
+                if key not in history_ids:
+                    history_ids[key] = None
+                    new_histories.append({"user_id": key[0], "image_path": key[1]})
+            if new_histories:
+                db.bulk_insert_mappings(SearchHistory, new_histories, return_defaults=True)
+                for history in new_histories:
+                    history_ids[(history["user_id"], history["image_path"])] = history["id"]
+
+            # Record search results
+            results = []
+            for record in batch:
+                search_id = history_ids[(record["user_id"], record["image_path"])]
+                for match in record["matches"]:
+                    results.append({
+                        "search_id": search_id,
+                        "product_id": match["product_id"],
+                        "similarity_score": match["similarity_score"],
+                        "result_data": {
+                            "brand": match["brand"],
+                            "name": match["name"],
+                            "price": match["price"],
+                            "currency": match["currency"],
+                            "image_url": match["image_url"],
+                            "product_url": match["product_url"]
+                        }
+                    })
+            if results:
+                db.bulk_insert_mappings(SearchResult, results)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+# Singleton instance of the search history writer
+_search_history_writer = None
+
+def get_search_history_writer() -> SearchHistoryWriter:
+    """Get singleton instance of SearchHistoryWriter"""
+    global _search_history_writer
+    if _search_history_writer is None:
+        _search_history_writer = SearchHistoryWriter()
+        _search_history_writer.start()
+    return _search_history_writer
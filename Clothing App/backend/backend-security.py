@@ -1,22 +1,78 @@
+import secrets
+import time
 from datetime import datetime, timedelta
-from typing import Any, Optional, Union
+from typing import Any, Dict, Optional, Union
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import ValidationError
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.db.database import get_db
+from app.core.metrics import register_cache
+from app.db.database import get_async_db
 from app.db.models import User
+from app.services.admission import AdmissionController
+from app.services.cache import TTLCache
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with other rounds are upgraded on the next successful login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS)
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+
+# Verified tokens (token -> user ID) and user snapshots (user ID -> fields
+# the routes read), so most authenticated requests skip the JWT decode and
+# the user query. Entries are never served stale.
+_token_cache = TTLCache(max_size=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL, stale_ttl=0)
+_user_cache = TTLCache(max_size=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL, stale_ttl=0)
+
+register_cache("auth_tokens", _token_cache.stats)
+register_cache("auth_users", _user_cache.stats)
+
+def invalidate_user(user_id: Optional[int] = None) -> None:
+    """
+    Drop a cached user, or all of them if no ID is given. Tokens of the
+    user stay cached but their next use reloads the user.
+
+    The caches are per process: workers forked by serve.py each hold their
+    own, so a change committed through one worker reaches the others when
+    their entry expires, within AUTH_CACHE_TTL.
+    """
+    _user_cache.invalidate(user_id)
+
+# Session.info key of the users deactivated or deleted in the current transaction
+_CHANGED_USERS_KEY = "auth_changed_user_ids"
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context: Any) -> None:
+    # Collected at flush and dropped from the cache only after the commit, so a
+    # request in between cannot cache the user as still active again
+    user_ids = session.info.setdefault(_CHANGED_USERS_KEY, set())
+    for target in session.dirty:
+        if isinstance(target, User) and any(not value for value in inspect(target).attrs.is_active.history.added):
+            user_ids.add(target.id)
+    user_ids.update(target.id for target in session.deleted if isinstance(target, User))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session) -> None:
+    # Deactivation takes effect on the next request, not when the cache expires
+    for user_id in session.info.pop(_CHANGED_USERS_KEY, ()):
+        invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session: Session) -> None:
+    session.info.pop(_CHANGED_USERS_KEY, None)
+
+def auth_cache_stats() -> Dict[str, Any]:
+    """Get token and user cache statistics for monitoring"""
+    return {"tokens": _token_cache.stats(), "users": _user_cache.stats()}
 
 # JWT token utilities
 def create_access_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -35,43 +91,118 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+# Hash of a random password, checked for unknown emails so they take as long as known ones
+_dummy_hash: Optional[str] = None
+
+def _dummy_verify(password: str) -> bool:
+    global _dummy_hash
+    if _dummy_hash is None:
+        # Hashing costs the same as verifying, so even the first call is not faster
+        _dummy_hash = get_password_hash(secrets.token_hex(16))
+        return False
+    pwd_context.verify(password, _dummy_hash)
+    return False
+
+# Dedicated, bounded pool for bcrypt, so a burst of logins cannot take
+# every worker thread and core away from searches
+_password_hasher = None
+
+def get_password_hasher() -> AdmissionController:
+    """
+    Get or create the password hashing pool.
+    
+    Returns:
+        AdmissionController instance
+    """
+    global _password_hasher
+    if _password_hasher is None:
+        _password_hasher = AdmissionController(
+            max_concurrency=settings.PASSWORD_HASH_CONCURRENCY,
+            max_queue=settings.PASSWORD_HASH_QUEUE_SIZE,
+            deadline=settings.PASSWORD_HASH_DEADLINE,
+            name="password_hashing",
+        )
+    return _password_hasher
+
+async def hash_password(password: str) -> str:
+    """
+    Hash a password on the password hashing pool.
+    
+    Raises:
+        HTTPException: 503 with Retry-After when the pool is saturated
+    """
+    return await get_password_hasher().run(get_password_hash, password)
+
 # User authentication utilities
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    user = db.query(User).filter(User.email == email).first()
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
+    password_hasher = get_password_hasher()
     if not user:
+        # Do the same work as for a wrong password, so response times do not reveal emails
+        await password_hasher.run(_dummy_verify, password)
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await password_hasher.run(pwd_context.verify_and_update, password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        # The hash was made with other parameters, store it with the current ones
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
+async def _verify_token(token: str) -> Optional[int]:
+    """Decode a token, returning its user ID, or None if it is invalid"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except (JWTError, ValidationError):
+        return None
+    user_id = payload.get("sub")
+    if user_id is None or not user_id.isdigit():
+        return None
+    # Cache the token until the cache TTL or its own expiry, whichever is first
+    ttl = min(settings.AUTH_CACHE_TTL, payload.get("exp", 0) - time.time())
+    if ttl > 0:
+        _token_cache.set(token, int(user_id), ttl)
+    return int(user_id)
+
+async def _load_user_snapshot(db: AsyncSession, user_id: int) -> Optional[Dict[str, Any]]:
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalars().first()
+    if user is None:
+        return None
+    return {"id": user.id, "email": user.email, "is_active": user.is_active, "created_at": user.created_at}
+
 # Dependency for getting current user from token
 async def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        user_id: str = payload.get("sub")
+    user_id = _token_cache.get_fresh(token)
+    if user_id is None:
+        user_id = await _verify_token(token)
         if user_id is None:
             raise credentials_exception
-    except (JWTError, ValidationError):
-        raise credentials_exception
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+    snapshot = await _user_cache.get_or_load(user_id, lambda: _load_user_snapshot(db, user_id))
+    if snapshot is None:
         raise credentials_exception
-    if not user.is_active:
+    if not snapshot["is_active"]:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return user
+    # A detached copy per request, so routes cannot change the cached snapshot
+    return User(**snapshot)
 
 # Optional dependency for getting current user (allows anonymous users)
 async def get_current_user_optional(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+    db: AsyncSession = Depends(get_async_db), token: Optional[str] = Depends(oauth2_scheme_optional)
 ) -> Optional[User]:
+    # Anonymous requests carry no token at all
+    if not token:
+        return None
     try:
         return await get_current_user(db, token)
     except HTTPException:
@@ -0,0 +1,144 @@
+"""
+Serve the API from several worker processes sharing one copy of the model.
+
+The master process imports the app, creates the directories and schema,
+loads the CLIP weights and the vector index, then binds the listening
+socket and forks the workers. Each worker runs uvicorn on the inherited
+socket. The weights and index stay in memory pages shared copy-on-write,
+so an extra worker costs its own heap rather than another copy of the
+model. Workers that exit are replaced; SIGTERM or SIGINT stops them all.
+
+CUDA cannot be used across fork, so on a GPU host the model is loaded by
+each worker instead (the index is still preloaded). With --no-preload,
+every worker loads everything itself on first use, as `uvicorn --workers`
+does; the weights are still shared if they come from the memory-mapped
+model artifact (see app.ml.model_artifact).
+
+Usage (from the backend directory):
+    python serve.py --workers 4 --port 8000
+    python serve.py --workers 4 --no-preload
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+import uvicorn
+
+from app.core.config import ensure_directories, settings
+from app.db.database import engine, init_db
+
+def prepare_storage() -> None:
+    """Create the directories and schema once, for all workers"""
+    ensure_directories()
+    init_db()
+    # Pooled connections must not be shared with the workers
+    engine.dispose()
+
+def preload() -> None:
+    """Load the vector index and the model before forking"""
+    from app.ml.vector_search import get_vector_search
+    get_vector_search()
+
+    import torch
+    if torch.cuda.is_available():
+        print("CUDA cannot be shared across fork; each worker loads the model")
+    else:
+        from app.ml.feature_extractor import get_feature_extractor
+        get_feature_extractor()
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(app, sock: socket.socket, args: argparse.Namespace) -> None:
+    """Serve requests on the inherited socket until uvicorn is told to stop"""
+    # Default signal handling; uvicorn installs its own for graceful shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    # Split the cores between workers instead of each using all of them
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(args.torch_threads)
+    else:
+        os.environ["OMP_NUM_THREADS"] = str(args.torch_threads)
+
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_graceful_shutdown=args.graceful_timeout)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS)
+    parser.add_argument("--no-preload", action="store_true", help="Load the model and index in each worker instead")
+    parser.add_argument("--torch-threads", type=int, help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="Seconds a worker waits for open requests on shutdown")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    args.torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    # Imported before forking so the workers share it; the ML modules load in preload() or on first use
+    from main import app
+
+    prepare_storage()
+    if not args.no_preload:
+        start = time.perf_counter()
+        preload()
+        print(f"Preloaded the model and index in {time.perf_counter() - start:.1f}s")
+    # Keep the garbage collector from writing to (and so copying) the master's objects
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    workers: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                run_worker(app, sock, args)
+                code = 0
+            finally:
+                os._exit(code)
+        workers[pid] = index
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(args.workers):
+        spawn(index)
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers (master {os.getpid()})")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = workers.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"Worker {pid} exited with status {status}, restarting")
+            time.sleep(1)
+            spawn(index)
+    sock.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.admission import PRIORITY_ANONYMOUS, PRIORITY_AUTHENTICATED, AdmissionController
+
+def make_controller(**kwargs):
+    options = {"max_concurrency": 1, "max_queue": 4, "deadline": 5.0, "name": "test"}
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+async def settle():
+    """Let queued tasks reach their wait for a slot"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def run_with_busy_worker(controller, scenario):
+    """Run a scenario while a blocked job holds every worker slot"""
+    gate = threading.Event()
+
+    async def run():
+        busy = [
+            asyncio.ensure_future(controller.run(gate.wait))
+            for _ in range(controller.max_concurrency)
+        ]
+        await settle()
+        try:
+            return await scenario(gate)
+        finally:
+            gate.set()
+            await asyncio.gather(*busy)
+
+    try:
+        return asyncio.run(run())
+    finally:
+        controller.shutdown()
+
+def test_runs_immediately_below_the_concurrency_limit():
+    controller = make_controller(max_concurrency=2)
+    try:
+        assert asyncio.run(controller.run(sum, [1, 2, 3])) == 6
+    finally:
+        controller.shutdown()
+    assert controller.stats()["admitted"] == 1
+    assert controller.stats()["active"] == 0
+
+def test_waiters_are_served_by_lane_then_arrival():
+    controller = make_controller()
+    order = []
+
+    async def scenario(gate):
+        tasks = [
+            asyncio.ensure_future(controller.run(order.append, name, priority=priority))
+            for name, priority in [
+                ("anonymous 1", PRIORITY_ANONYMOUS),
+                ("authenticated", PRIORITY_AUTHENTICATED),
+                ("anonymous 2", PRIORITY_ANONYMOUS),
+            ]
+        ]
+        await settle()
+        assert controller.queue_depth == 3
+        gate.set()
+        await asyncio.gather(*tasks)
+
+    run_with_busy_worker(controller, scenario)
+    assert order == ["authenticated", "anonymous 1", "anonymous 2"]
+
+def test_full_anonymous_lane_is_rejected_with_429():
+    controller = make_controller(max_anonymous_queue=1)
+
+    async def scenario(gate):
+        queued = asyncio.ensure_future(controller.run(len, "a"))
+        await settle()
+        with pytest.raises(HTTPException) as rejected:
+            await controller.run(len, "b")
+        # Authenticated requests still queue
+        authenticated = asyncio.ensure_future(controller.run(len, "c", priority=PRIORITY_AUTHENTICATED))
+        await settle()
+        assert controller.queue_depth == 2
+        gate.set()
+        await asyncio.gather(queued, authenticated)
+        return rejected.value
+
+    error = run_with_busy_worker(controller, scenario)
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert controller.rejected == 1
+
+def test_full_queue_is_rejected_with_503():
+    controller = make_controller(max_queue=1)
+
+    async def scenario(gate):
+        queued = asyncio.ensure_future(controller.run(len, "a", priority=PRIORITY_AUTHENTICATED))
+        await settle()
+        with pytest.raises(HTTPException) as rejected:
+            await controller.run(len, "b", priority=PRIORITY_AUTHENTICATED)
+        gate.set()
+        await queued
+        return rejected.value
+
+    error = run_with_busy_worker(controller, scenario)
+    assert error.status_code == 503
+    assert "Retry-After" in error.headers
+
+def test_authenticated_request_takes_the_place_of_the_newest_anonymous_one():
+    controller = make_controller(max_queue=2)
+
+    async def scenario(gate):
+        oldest = asyncio.ensure_future(controller.run(len, "a"))
+        newest = asyncio.ensure_future(controller.run(len, "b"))
+        await settle()
+        authenticated = asyncio.ensure_future(controller.run(len, "cc", priority=PRIORITY_AUTHENTICATED))
+        await settle()
+        gate.set()
+        return await asyncio.gather(oldest, newest, authenticated, return_exceptions=True)
+
+    oldest, newest, authenticated = run_with_busy_worker(controller, scenario)
+    assert oldest == 1
+    assert isinstance(newest, HTTPException) and newest.status_code == 503
+    assert authenticated == 2
+    assert controller.preempted == 1
+
+def test_waiter_times_out_at_its_deadline():
+    controller = make_controller()
+
+    async def scenario(gate):
+        with pytest.raises(HTTPException) as timed_out:
+            await controller.run(len, "a", deadline=0.01)
+        return timed_out.value
+
+    error = run_with_busy_worker(controller, scenario)
+    assert error.status_code == 503
+    assert error.detail == "Request timed out waiting for capacity"
+    assert controller.timed_out == 1
+    assert controller.queue_depth == 0
+
+def test_cancelled_waiter_leaves_the_queue():
+    controller = make_controller()
+
+    async def scenario(gate):
+        waiter = asyncio.ensure_future(controller.run(len, "a"))
+        await settle()
+        waiter.cancel()
+        await settle()
+        assert controller.queue_depth == 0
+        # The slot goes to the next request rather than the cancelled one
+        follower = asyncio.ensure_future(controller.run(len, "bb"))
+        await settle()
+        gate.set()
+        return await follower
+
+    assert run_with_busy_worker(controller, scenario) == 2
+    assert controller.stats()["active"] == 0
@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+
+from app.core.config import settings
+from app.ml.vector_search import VectorSearch
+from benchmarks.ann_eval import build_parser, main
+
+def test_runs_against_an_index_saved_by_vector_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_PATH", tmp_path)
+    vector_search = VectorSearch(vector_dim=32)
+    rng = np.random.default_rng(0)
+    # Product IDs that are not positions, as in a real catalog
+    vector_search.apply_delta({1000 + 7 * i: rng.standard_normal(32) for i in range(300)}, [])
+    vector_search.save_index()
+
+    output = tmp_path / "results.json"
+    args = build_parser().parse_args([
+        "--index", str(vector_search.index_path),
+        "--queries", "20", "--single-queries", "5", "--k", "5",
+        "--hnsw-m", "8", "--ef-search", "16",
+        "--ivf-nlist", "--pq-m", "--pca-dims", "16",
+        "--output", str(output),
+    ])
+    main(args)
+
+    results = json.loads(output.read_text())
+    assert results["vectors"] == 280
+    assert results["dimension"] == 32
+    assert results["results"][0]["index"] == "Flat"
+    assert results["results"][0]["recall@5"] == 1.0
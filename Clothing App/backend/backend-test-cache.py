@@ -0,0 +1,46 @@
+import asyncio
+
+from app.services.cache import TTLCache
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert len(calls) == 1
+
+def test_waiter_loads_again_when_the_leading_caller_is_cancelled():
+    cache = TTLCache()
+    started = None
+
+    async def slow_loader():
+        started.set()
+        await asyncio.sleep(10)
+        return "leader"
+
+    async def fast_loader():
+        return "waiter"
+
+    async def run():
+        nonlocal started
+        started = asyncio.Event()
+        leader = asyncio.ensure_future(cache.get_or_load("key", slow_loader))
+        await started.wait()
+        waiter = asyncio.ensure_future(cache.get_or_load("key", fast_loader))
+        # Let the waiter collapse onto the leader's load before cancelling it
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.gather(leader, waiter, return_exceptions=True)
+
+    leader_result, waiter_result = asyncio.run(run())
+    assert isinstance(leader_result, asyncio.CancelledError)
+    assert waiter_result == "waiter"
+    assert cache.peek("key") == "waiter"
@@ -0,0 +1,9 @@
+import os
+import tempfile
+from pathlib import Path
+
+# Scratch storage, set before the app's modules read their settings
+_workdir = Path(tempfile.mkdtemp(prefix="clothing_app_tests_"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir / 'tests.db'}")
+os.environ.setdefault("UPLOAD_FOLDER", str(_workdir / "uploads"))
+os.environ.setdefault("VECTOR_INDEX_PATH", str(_workdir / "vector_index"))
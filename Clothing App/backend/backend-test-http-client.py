@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.http_client import CircuitBreaker, CircuitOpenError, ResilientHttpClient
+
+def open_breaker(failure_threshold=2, reset_timeout=30.0):
+    breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+    for _ in range(failure_threshold):
+        breaker.record_failure()
+    return breaker
+
+def wait_out(breaker):
+    """Move the breaker's clock past its reset timeout"""
+    breaker.opened_at -= breaker.reset_timeout
+    breaker.trial_started_at -= breaker.reset_timeout
+
+def make_client(handler, breaker, max_retries=0):
+    client = ResilientHttpClient("http://upstream", max_retries=max_retries, backoff_base=0.0, breaker=breaker)
+    client._client = httpx.AsyncClient(base_url="http://upstream", transport=httpx.MockTransport(handler))
+    return client
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+def test_lets_one_trial_through_after_the_reset_timeout():
+    breaker = open_breaker()
+    wait_out(breaker)
+
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+def test_failed_trial_reopens():
+    breaker = open_breaker()
+    wait_out(breaker)
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+def test_trial_without_an_outcome_is_replaced_after_the_reset_timeout():
+    breaker = open_breaker()
+    wait_out(breaker)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    wait_out(breaker)
+    assert breaker.allow_request()
+
+def test_client_retries_transport_errors_then_opens():
+    attempts = []
+
+    def refuse(request):
+        attempts.append(request)
+        raise httpx.ConnectError("refused", request=request)
+
+    client = make_client(refuse, CircuitBreaker(failure_threshold=1), max_retries=2)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client.get("/products"))
+    assert len(attempts) == 3
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.get("/products"))
+
+def test_client_returns_non_retryable_errors_as_successes():
+    client = make_client(lambda request: httpx.Response(404), CircuitBreaker(failure_threshold=1))
+    assert asyncio.run(client.get("/products/1")).status_code == 404
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+def test_cancelled_trial_releases_the_circuit():
+    async def hang(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200)
+
+    breaker = open_breaker()
+    wait_out(breaker)
+    client = make_client(hang, breaker)
+
+    async def cancel_trial():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.get("/products"), 0.01)
+
+    asyncio.run(cancel_trial())
+    assert breaker.state == CircuitBreaker.OPEN
+    # The next request becomes the trial without waiting out the timeout again
+    assert breaker.allow_request()
+
+def test_trial_failing_before_the_upstream_releases_the_circuit():
+    def invalid(request):
+        raise httpx.DecodingError("bad response")
+
+    breaker = open_breaker()
+    wait_out(breaker)
+    client = make_client(invalid, breaker)
+
+    with pytest.raises(httpx.DecodingError):
+        asyncio.run(client.get("/products"))
+    assert breaker.allow_request()
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import delete, update
+
+from app.db.database import SessionLocal, init_db
+from app.db.models import ImageJob
+from app.services.jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, PermanentJobError
+
+@pytest.fixture(autouse=True)
+def empty_job_table():
+    init_db()
+    db = SessionLocal()
+    try:
+        db.execute(delete(ImageJob))
+        db.commit()
+    finally:
+        db.close()
+
+def succeed(image_id):
+    return np.ones(4, dtype=np.float32), {"vector_dimension": 4}
+
+def make_queue(handler=succeed, owner="test:1", **kwargs):
+    """A queue driven by the test through _claim and _execute, without threads"""
+    options = {"workers": 1, "max_attempts": 3, "retry_backoff": 0.0, "lease_seconds": 30.0}
+    options.update(kwargs)
+    queue = JobQueue(handler=handler, **options)
+    queue.owner = owner
+    return queue
+
+def expire_lease(job_id):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(ImageJob)
+            .where(ImageJob.id == job_id)
+            .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def test_claimed_job_succeeds():
+    queue = make_queue()
+    job = queue.submit(["a.jpg"])[0]
+
+    assert queue._claim() == job.id
+    running = queue.get(job.id)
+    assert running.status == RUNNING
+    assert running.owner == "test:1"
+    assert running.lease_expires_at > datetime.utcnow()
+
+    queue._execute(job.id)
+    finished = queue.get(job.id)
+    assert finished.status == SUCCEEDED
+    assert finished.result == {"vector_dimension": 4}
+    assert queue._claim() is None
+
+def test_failing_job_is_retried_until_it_runs_out_of_attempts():
+    def fail(image_id):
+        raise RuntimeError("model unavailable")
+
+    queue = make_queue(fail, max_attempts=2)
+    job = queue.submit(["a.jpg"])[0]
+
+    queue._execute(queue._claim())
+    retried = queue.get(job.id)
+    assert retried.status == QUEUED
+    assert retried.attempts == 1
+    assert retried.owner is None
+
+    queue._execute(queue._claim())
+    failed = queue.get(job.id)
+    assert failed.status == FAILED
+    assert failed.attempts == 2
+    assert failed.error == "model unavailable"
+    assert queue.counts["retried"] == 1
+    assert queue.counts[FAILED] == 1
+
+def test_permanent_error_fails_without_retrying():
+    def missing(image_id):
+        raise PermanentJobError("Image not found")
+
+    queue = make_queue(missing)
+    job = queue.submit(["a.jpg"])[0]
+    queue._execute(queue._claim())
+
+    failed = queue.get(job.id)
+    assert failed.status == FAILED
+    assert failed.attempts == 1
+
+def test_cancel_while_running_discards_the_result():
+    job_ids = []
+
+    def cancelled_midway(image_id):
+        queue.cancel(job_ids[0])
+        return succeed(image_id)
+
+    queue = make_queue(cancelled_midway)
+    job_ids.append(queue.submit(["a.jpg"])[0].id)
+    queue._execute(queue._claim())
+
+    cancelled = queue.get(job_ids[0])
+    assert cancelled.status == CANCELLED
+    assert cancelled.embedding is None
+
+def test_cancel_of_queued_job_is_immediate():
+    queue = make_queue()
+    job = queue.submit(["a.jpg"])[0]
+
+    assert queue.cancel(job.id).status == CANCELLED
+    assert queue._claim() is None
+
+def test_live_lease_is_not_taken_by_another_worker():
+    first, second = make_queue(owner="host:1"), make_queue(owner="host:2")
+    job = first.submit(["a.jpg"])[0]
+
+    assert first._claim() == job.id
+    assert second._claim() is None
+    assert first.get(job.id).owner == "host:1"
+
+def test_expired_lease_is_requeued_and_the_old_result_discarded():
+    first, second = make_queue(owner="host:1"), make_queue(owner="host:2")
+    job = first.submit(["a.jpg"])[0]
+    assert first._claim() == job.id
+
+    # The first worker stalls past its lease; the second one takes the job over
+    expire_lease(job.id)
+    assert second._claim() == job.id
+    taken_over = second.get(job.id)
+    assert taken_over.owner == "host:2"
+    assert taken_over.attempts == 2
+
+    first._execute(job.id)
+    assert first.get(job.id).status == RUNNING
+    assert first.counts[SUCCEEDED] == 0
+
+    second._execute(job.id)
+    assert second.get(job.id).status == SUCCEEDED
+
+def test_expired_lease_without_attempts_left_fails_the_job():
+    queue = make_queue(max_attempts=1)
+    job = queue.submit(["a.jpg"])[0]
+    assert queue._claim() == job.id
+
+    # The worker died running the job, on its last attempt
+    expire_lease(job.id)
+    assert queue._claim() is None
+
+    failed = queue.get(job.id)
+    assert failed.status == FAILED
+    assert failed.error == "Worker lost while running the job"
+    assert failed.finished_at is not None
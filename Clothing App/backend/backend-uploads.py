@@ -0,0 +1,171 @@
+import io
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Tuple, Union
+
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, UnidentifiedImageError
+
+from app.core.config import settings
+from app.core.metrics import stage_timer
+
+# Magic bytes of the accepted image formats: (offset, signature, type)
+IMAGE_SIGNATURES = [
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (8, b"WEBP", "webp"),
+    (0, b"BM", "bmp"),
+]
+
+@dataclass
+class UploadInfo:
+    """What was learned about an upload while reading it"""
+    image_type: str
+    width: int
+    height: int
+    size: int = 0
+    # Most upload bytes held in memory at once by this module
+    peak_buffer_bytes: int = 0
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """
+    Identify an image format from its magic bytes.
+
+    Args:
+        header: First bytes of the file
+
+    Returns:
+        Image type, or None if it is not an accepted format
+    """
+    for offset, signature, image_type in IMAGE_SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            if image_type == "webp" and header[:4] != b"RIFF":
+                continue
+            return image_type
+    return None
+
+def read_image_size(header: Union[bytes, bytearray]) -> Optional[Tuple[int, int]]:
+    """
+    Read image dimensions from the start of a file without decoding pixels.
+
+    Args:
+        header: First bytes of the file
+
+    Returns:
+        (width, height), or None if the header is incomplete
+
+    Raises:
+        Image.DecompressionBombError: If PIL refuses the dimensions outright
+    """
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            return image.size
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+
+def _reject(status_code: int, detail: str) -> HTTPException:
+    return HTTPException(status_code=status_code, detail=detail)
+
+async def iter_upload(file: UploadFile, info: Optional[UploadInfo] = None) -> AsyncIterator[bytes]:
+    """
+    Read an uploaded image in chunks, validating it before the rest is read.
+
+    The type is sniffed from the first chunk and the dimensions are read
+    from the header before the rest of the file is read, and the size limit
+    is checked chunk by chunk. The file has already been received, though:
+    Starlette parses the whole multipart form, spooling files over 1MB to
+    disk, before the route runs. So these checks bound what is copied into
+    memory or the upload store, not what is received; only
+    BodySizeLimitMiddleware rejects a request while it arrives.
+
+    Args:
+        file: Uploaded file
+        info: UploadInfo to fill in, for callers that need the details
+
+    Yields:
+        File chunks, starting with the buffered header
+
+    Raises:
+        HTTPException: 413 if the file is too large, 415 if it is not an
+            accepted image type, 400 if its header or dimensions are invalid
+    """
+    chunk_size = settings.UPLOAD_CHUNK_SIZE
+    max_size = settings.MAX_CONTENT_LENGTH
+    too_large = _reject(
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        f"File size exceeds maximum limit of {max_size / (1024 * 1024)}MB"
+    )
+    too_many_pixels = _reject(
+        status.HTTP_400_BAD_REQUEST,
+        f"Image exceeds maximum of {settings.MAX_IMAGE_PIXELS} pixels"
+    )
+
+    # Buffer just enough of the file to identify it and read its dimensions
+    header = bytearray()
+    image_type = None
+    image_size = None
+    while image_size is None:
+        chunk = await file.read(chunk_size)
+        header.extend(chunk)
+        if len(header) > max_size:
+            raise too_large
+        if len(header) < 12 and chunk:
+            continue
+        if image_type is None:
+            image_type = sniff_image_type(bytes(header[:12]))
+            if image_type is None:
+                raise _reject(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "File must be a JPEG, PNG, WebP, GIF or BMP image")
+        try:
+            image_size = read_image_size(header)
+        except Image.DecompressionBombError:
+            raise too_many_pixels
+        if image_size is None and (not chunk or len(header) >= settings.UPLOAD_HEADER_LIMIT):
+            raise _reject(status.HTTP_400_BAD_REQUEST, "File is not a valid image")
+
+    width, height = image_size
+    if min(width, height) < settings.MIN_IMAGE_SIZE:
+        raise _reject(
+            status.HTTP_400_BAD_REQUEST,
+            f"Image must be at least {settings.MIN_IMAGE_SIZE}x{settings.MIN_IMAGE_SIZE} pixels"
+        )
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        raise too_many_pixels
+
+    if info is None:
+        info = UploadInfo(image_type=image_type, width=width, height=height)
+    else:
+        info.image_type, info.width, info.height = image_type, width, height
+    info.size = len(header)
+    info.peak_buffer_bytes = len(header)
+    yield header
+    del header
+
+    # Stream the rest, enforcing the size limit as it arrives
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        info.size += len(chunk)
+        if info.size > max_size:
+            raise too_large
+        info.peak_buffer_bytes = max(info.peak_buffer_bytes, len(chunk))
+        yield chunk
+
+@stage_timer("upload_read")
+async def read_upload(file: UploadFile) -> Tuple[bytearray, UploadInfo]:
+    """
+    Read an uploaded image into memory, for callers that decode it directly.
+
+    Args:
+        file: Uploaded file
+
+    Returns:
+        File contents and the upload details
+    """
+    content = bytearray()
+    info = UploadInfo(image_type="", width=0, height=0)
+    async for chunk in iter_upload(file, info):
+        content.extend(chunk)
+    info.peak_buffer_bytes = len(content)
+    return content, info
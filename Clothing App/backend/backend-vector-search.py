@@ -1,15 +1,19 @@
 import os
 import json
+import threading
+import time
 import numpy as np
-import faiss
 from typing import List, Dict, Tuple, Any, Optional
 from pathlib import Path
 import pickle
 
 from app.core.config import settings
+from app.core.metrics import gauge, observe_batch, stage_timer
 from app.db.models import Product
 from sqlalchemy.orm import Session
 
+# faiss is imported by the methods that use it, so importing the app stays fast
+
 class VectorSearch:
     def __init__(self, vector_dim: int = 512):
         """
@@ -20,25 +24,48 @@ class VectorSearch:
         """
         self.vector_dim = vector_dim
         self.index = None
-        self.product_ids = []
         self.index_path = settings.VECTOR_INDEX_PATH / "product_index.faiss"
-        self.product_ids_path = settings.VECTOR_INDEX_PATH / "product_ids.pkl"
+        self.product_ids_path = settings.VECTOR_INDEX_PATH / "product_ids.pkl"  # Legacy indexes only
+        
+        # Identity of the index file last loaded or saved by this process, so an
+        # index saved by another process (a catalog sync) is noticed and reloaded
+        self._file_version: Optional[Tuple[int, int]] = None
+        self._next_reload_check = 0.0
+        self._reload_lock = threading.Lock()
         
         # Load index if it exists
         self.load_index()
     
+    @property
+    def product_ids(self) -> List[int]:
+        """Product IDs currently in the index"""
+        import faiss
+        
+        if self.index is None or self.index.ntotal == 0:
+            return []
+        return faiss.vector_to_array(self.index.id_map).tolist()
+    
     def load_index(self) -> None:
         """Load the FAISS index from disk if it exists"""
-        if os.path.exists(self.index_path) and os.path.exists(self.product_ids_path):
+        import faiss
+        
+        if os.path.exists(self.index_path):
             try:
+                self._file_version = self._read_file_version()
                 # Load FAISS index
-                self.index = faiss.read_index(str(self.index_path))
+                index = faiss.read_index(str(self.index_path))
                 
-                # Load product IDs
-                with open(self.product_ids_path, 'rb') as f:
-                    self.product_ids = pickle.load(f)
+                if not isinstance(index, faiss.IndexIDMap2):
+                    # Older indexes kept product IDs in a separate pickle, by position
+                    with open(self.product_ids_path, 'rb') as f:
+                        legacy_ids = pickle.load(f)
+                    vectors = index.reconstruct_n(0, index.ntotal)
+                    self.create_empty_index()
+                    self.index.add_with_ids(vectors, np.array(legacy_ids, dtype=np.int64))
+                else:
+                    self.index = index
                     
-                print(f"Loaded FAISS index with {len(self.product_ids)} products")
+                print(f"Loaded FAISS index with {self.index.ntotal} products")
             except Exception as e:
                 print(f"Error loading index: {e}")
                 self.create_empty_index()
@@ -47,24 +74,62 @@ class VectorSearch:
     
     def create_empty_index(self) -> None:
         """Create a new empty FAISS index"""
-        self.index = faiss.IndexFlatIP(self.vector_dim)  # Inner product (cosine similarity for normalized vectors)
-        self.product_ids = []
+        import faiss
+        
+        # Inner product (cosine similarity for normalized vectors), keyed by product ID
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.vector_dim))
         print("Created new empty FAISS index")
     
     def save_index(self) -> None:
         """Save the FAISS index to disk"""
+        import faiss
+        
         if self.index is not None:
             os.makedirs(settings.VECTOR_INDEX_PATH, exist_ok=True)
             
-            # Save FAISS index
-            faiss.write_index(self.index, str(self.index_path))
-            
-            # Save product IDs
-            with open(self.product_ids_path, 'wb') as f:
-                pickle.dump(self.product_ids, f)
+            # Save FAISS index (product IDs are stored inside it), under a temporary
+            # name so processes reloading it never read a partial file
+            temp_path = self.index_path.with_suffix(".tmp")
+            faiss.write_index(self.index, str(temp_path))
+            os.replace(temp_path, self.index_path)
+            self._file_version = self._read_file_version()
                 
-            print(f"Saved FAISS index with {len(self.product_ids)} products")
-    
+            print(f"Saved FAISS index with {self.index.ntotal} products")
+
+    def _read_file_version(self) -> Optional[Tuple[int, int]]:
+        """Inode and modification time of the index file, which change whenever it is saved"""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the index if another process saved it since this one loaded
+        it, checking the file at most every VECTOR_INDEX_RELOAD_INTERVAL
+        seconds. Cached product metadata is dropped with it, since the
+        process that saved the index may also have changed the products.
+
+        Returns:
+            True if the index was reloaded
+        """
+        now = time.monotonic()
+        if now < self._next_reload_check or not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_reload_check = now + settings.VECTOR_INDEX_RELOAD_INTERVAL
+            version = self._read_file_version()
+            if version is None or version == self._file_version:
+                return False
+            self.load_index()
+        finally:
+            self._reload_lock.release()
+
+        from app.services.product_cache import get_product_cache
+        get_product_cache().invalidate()
+        return True
+
     def add_product(self, product_id: int, feature_vector: np.ndarray) -> None:
         """
         Add a product feature vector to the index.
@@ -80,45 +145,43 @@ class VectorSearch:
         vector = feature_vector.reshape(1, -1).astype(np.float32)
         
         # Add to index
-        self.index.add(vector)
-        self.product_ids.append(product_id)
+        self.index.add_with_ids(vector, np.array([product_id], dtype=np.int64))
     
     def remove_product(self, product_id: int) -> bool:
         """
         Remove a product from the index.
-        In FAISS we can't directly remove vectors, so we rebuild the index.
         
         Args:
             product_id: Product ID to remove
             
         Returns:
-            True if successful, False otherwise
+            True if the product was in the index, False otherwise
         """
-        if product_id not in self.product_ids:
-            return False
-        
-        # Get all vectors except the one to remove
-        indices_to_keep = [i for i, pid in enumerate(self.product_ids) if pid != product_id]
-        if not indices_to_keep:
-            self.create_empty_index()
-            return True
-        
         if self.index is None or self.index.ntotal == 0:
             return False
         
-        # Get vectors to keep
-        vectors_to_keep = np.vstack([self.index.reconstruct(i) for i in indices_to_keep])
-        product_ids_to_keep = [self.product_ids[i] for i in indices_to_keep]
+        return self.index.remove_ids(np.array([product_id], dtype=np.int64)) > 0
+    
+    def apply_delta(self, upserts: Dict[int, np.ndarray], removals: List[int]) -> None:
+        """
+        Apply changed and removed products to the index without rebuilding it.
         
-        # Create new index
-        new_index = faiss.IndexFlatIP(self.vector_dim)
-        new_index.add(vectors_to_keep)
+        Args:
+            upserts: New or re-embedded feature vectors by product ID
+            removals: IDs of products to remove
+        """
+        if self.index is None:
+            self.create_empty_index()
         
-        # Update index and product IDs
-        self.index = new_index
-        self.product_ids = product_ids_to_keep
+        # Drop removed products and the old vectors of re-embedded ones
+        stale_ids = set(removals) | set(upserts)
+        if stale_ids and self.index.ntotal > 0:
+            self.index.remove_ids(np.array(sorted(stale_ids), dtype=np.int64))
         
-        return True
+        if upserts:
+            ids = np.array(list(upserts), dtype=np.int64)
+            vectors = np.vstack([v.reshape(1, -1) for v in upserts.values()]).astype(np.float32)
+            self.index.add_with_ids(vectors, ids)
     
     def search(self, query_vector: np.ndarray, k: int = 5) -> List[Tuple[int, float]]:
         """
@@ -131,22 +194,41 @@ class VectorSearch:
         Returns:
             List of (product_id, similarity_score) tuples
         """
+        return self.search_batch(query_vector.reshape(1, -1), k)[0]
+    
+    @stage_timer("vector_search")
+    def search_batch(self, query_vectors: np.ndarray, k: int = 5) -> List[List[Tuple[int, float]]]:
+        """
+        Search for similar products for several query vectors in one call.
+        
+        Args:
+            query_vectors: Query feature vectors with shape (N, vector_dim)
+            k: Number of results to return per query
+            
+        Returns:
+            One list of (product_id, similarity_score) tuples per query
+        """
+        self.reload_if_changed()
         if self.index is None or self.index.ntotal == 0:
-            return []
+            return [[] for _ in range(len(query_vectors))]
         
-        # Ensure the vector is a 2D array with shape (1, vector_dim)
-        vector = query_vector.reshape(1, -1).astype(np.float32)
+        observe_batch("vector_search", len(query_vectors))
+        
+        # Ensure the vectors are a contiguous float32 array with shape (N, vector_dim)
+        vectors = np.ascontiguousarray(query_vectors, dtype=np.float32).reshape(-1, self.vector_dim)
         
         # Search the index
-        scores, indices = self.index.search(vector, min(k, self.index.ntotal))
+        scores, ids = self.index.search(vectors, min(k, self.index.ntotal))
         
         # Return product IDs and scores
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.product_ids):
-                results.append((self.product_ids[idx], float(scores[0][i])))
-        
-        return results
+        return [
+            [
+                (int(product_id), float(score))
+                for product_id, score in zip(row_ids, row_scores)
+                if product_id != -1
+            ]
+            for row_ids, row_scores in zip(ids, scores)
+        ]
     
     def update_index_from_db(self, db: Session) -> None:
         """
@@ -161,13 +243,12 @@ class VectorSearch:
         # Create new index
         self.create_empty_index()
         
-        # Add each product to the index
-        for product in products:
-            # Deserialize feature vector from text
-            feature_vector = np.array(json.loads(product.feature_vector), dtype=np.float32)
-            
-            # Add to index
-            self.add_product(product.id, feature_vector)
+        # Add all products to the index in one batch
+        if products:
+            # Deserialize feature vectors from text
+            vectors = np.array([json.loads(product.feature_vector) for product in products], dtype=np.float32)
+            ids = np.array([product.id for product in products], dtype=np.int64)
+            self.index.add_with_ids(vectors, ids)
         
         # Save the index
         self.save_index()
@@ -177,6 +258,13 @@ class VectorSearch:
 # Singleton instance of the vector search
 _vector_search = None
 
+# Read at scrape time, without loading the index just for metrics
+gauge(
+    "vector_index_size",
+    "Vectors in the product index",
+    callback=lambda: _vector_search.index.ntotal if _vector_search is not None and _vector_search.index is not None else 0,
+)
+
 def get_vector_search() -> VectorSearch:
     """Get singleton instance of VectorSearch"""
     global _vector_search
@@ -156,6 +156,102 @@ const products = {
     return request(`/products/search/${imageId}?limit=${limit}&threshold=${threshold}`);
   },
   
+  /**
+   * Search for products similar to an uploaded image, receiving results
+   * as server-sent events as soon as each stage is ready
+   * @param {string} imageId - Image ID
+   * @param {object} options - Search options
+   * @param {function} onEvent - Called with (event, data) for each event
+   * @returns {Promise<object>} - Final search results
+   */
+  streamSearch: async (imageId, options = {}, onEvent = () => {}) => {
+    const { limit = 5, threshold = 0.5, refine = false } = options;
+    const url = `${API_BASE_URL}/products/search/${imageId}/stream?limit=${limit}&threshold=${threshold}&refine=${refine}`;
+    
+    let response;
+    try {
+      response = await fetch(url, { headers });
+    } catch (error) {
+      throw new ApiError(error.message || 'Network error', 0);
+    }
+    if (!response.ok) {
+      const data = await response.json().catch(() => ({}));
+      throw new ApiError(data.detail || 'An error occurred', response.status);
+    }
+    
+    // Parse events from the stream as they arrive
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const messages = buffer.split('\n\n');
+      buffer = messages.pop();
+      
+      for (const message of messages) {
+        let event = 'message';
+        let data = '';
+        message.split('\n').forEach((line) => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        const payload = JSON.parse(data);
+        if (event === 'error') {
+          throw new ApiError(payload.detail || 'An error occurred', 500);
+        }
+        if (event === 'done') {
+          result = payload;
+        }
+        onEvent(event, payload);
+      }
+    }
+    return result;
+  },
+  
+  /**
+   * Upload an image and search for products in one request
+   * @param {File} file - Image file
+   * @param {object} options - Search options
+   * @returns {Promise<object>} - Search results
+   */
+  searchByUpload: async (file, options = {}) => {
+    const { limit = 5, threshold = 0.5, saveImage = false } = options;
+    const formData = new FormData();
+    formData.append('file', file);
+    
+    return request(`/products/search?limit=${limit}&threshold=${threshold}&save_image=${saveImage}`, {
+      method: 'POST',
+      headers: {
+        // Don't include Content-Type for FormData
+      },
+      body: formData,
+    });
+  },
+  
+  /**
+   * Search for products similar to several images in one request
+   * @param {object} images - Image files and/or uploaded image IDs
+   * @param {object} options - Search options
+   * @returns {Promise<object>} - One search result per image, image IDs first
+   */
+  searchBatch: async ({ files = [], imageIds = [] }, options = {}) => {
+    const { limit = 5, threshold = 0.5 } = options;
+    const formData = new FormData();
+    imageIds.forEach((imageId) => formData.append('image_ids', imageId));
+    files.forEach((file) => formData.append('files', file));
+    
+    return request(`/products/search/batch?limit=${limit}&threshold=${threshold}`, {
+      method: 'POST',
+      headers: {
+        // Don't include Content-Type for FormData
+      },
+      body: formData,
+    });
+  },
+  
   /**
    * Get product details
    * @param {string} productId - Product ID
@@ -183,6 +279,9 @@ const api = {
   getUserProfile: auth.getUserProfile,
   uploadImage: images.uploadImage,
   searchByImage: products.searchByImage,
+  streamSearch: products.streamSearch,
+  searchByUpload: products.searchByUpload,
+  searchBatch: products.searchBatch,
   getProductDetails: products.getProductDetails,
   getSearchHistory: products.getSearchHistory,
 };